@@ -1,18 +1,31 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, simpledialog, filedialog
-import threading
+from tkinter import ttk, scrolledtext, messagebox
 import queue
 import json
 import os
-import requests
+import time
 import itertools
+import functools
+import threading
 from datetime import datetime
-import webbrowser
 import re
 
+import config
+from chat_engine import ChatEngine, Conversation, answer_from_event, assistant_message, parse_parameters
+from conversation_stats import estimate_tokens, estimate_tokens_for_chars
+from model_health import describe as describe_health
+from model_router import ModelRouter
+from perplexity_api import PerplexityAPI, import_requests
+from session_journal import SessionJournal, recover_sessions
+from conversation_store import ConversationStore
+from persistence import PersistenceWriter, common_prefix, write_json_atomic
+from snapshot_store import SnapshotStore
+from chat_loader import iter_chat_file
+from session_archive import ARCHIVE_SUFFIX, iter_archive, write_archive
+from exporters import EXPORT_FORMATS, export_all, export_session
+
 # --- Configuration ---
 API_KEY_GLOBAL = os.getenv('PERPLEXITY_API_KEY', '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')
-BASE_URL = "https://api.perplexity.ai"
 
 AVAILABLE_MODELS = [
     "sonar-small-online", "sonar-medium-online", "sonar-pro", "sonar-deep-research",
@@ -22,6 +35,7 @@ AVAILABLE_MODELS = [
     "codellama-70b-instruct", "mistral-7b-instruct", "mixtral-8x7b-instruct",
     "llama-3-8b-instruct", "llama-3-70b-instruct", "r1-1776",
     "pplx-7b-online", "pplx-70b-online", "pplx-7b-chat", "pplx-70b-chat",
+    config.AUTO_MODEL,  # picked per message by model_router
 ]
 
 CONVERSATION_TEMPLATES = {
@@ -33,86 +47,85 @@ CONVERSATION_TEMPLATES = {
     "Problem Solver": "You are a problem-solving expert. Break down complex problems into manageable steps.",
 }
 
-class PerplexityAPI:
-    def __init__(self, api_key: str):
-        if not api_key:
-            raise ValueError("API key cannot be empty.")
-        self.api_key = api_key
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        self.request_count = 0
-        self.last_request_time = None
+class UIScheduler:
+    """Coalesces and debounces UI bookkeeping onto the Tk event loop.
 
-    def _handle_response_error(self, response: requests.Response):
-        try:
-            error_data = response.json()
-            error_message = error_data.get("error", {}).get("message", response.text)
-        except json.JSONDecodeError:
-            error_message = response.text
-        
-        if response.status_code == 401:
-            error_message = "Invalid API key. Please check your API key and try again."
-        elif response.status_code == 429:
-            error_message = "Rate limit exceeded. Please wait a moment before trying again."
-        elif response.status_code == 500:
-            error_message = "Server error. Please try again later."
-        
-        raise requests.exceptions.HTTPError(
-            f"API request failed with status {response.status_code}: {error_message}",
-            response=response
-        )
+    Handlers that used to run on every keystroke, scroll event or stream
+    chunk are requested through here instead, so a burst of events results
+    in a single update.
+    """
 
-    def chat_completion(self, model, messages, stream=False, max_tokens=None, temperature=None,
-                        top_p=None, top_k=None, presence_penalty=None, frequency_penalty=None,
-                        timeout=60):
-        endpoint = f"{BASE_URL}/chat/completions"
-        payload = {"model": model, "messages": messages, "stream": stream}
-        
-        if max_tokens is not None: payload["max_tokens"] = max_tokens
-        if temperature is not None: payload["temperature"] = temperature
-        if top_p is not None: payload["top_p"] = top_p
-        if top_k is not None: payload["top_k"] = top_k
-        if presence_penalty is not None: payload["presence_penalty"] = presence_penalty
-        if frequency_penalty is not None: payload["frequency_penalty"] = frequency_penalty
-        
-        self.request_count += 1
-        self.last_request_time = datetime.now()
-        
-        try:
-            response = requests.post(endpoint, headers=self.headers, json=payload, stream=stream, timeout=timeout)
-            response.raise_for_status()
-            if stream:
-                return self._handle_streamed_response(response)
-            else:
-                return response.json()
-        except requests.exceptions.RequestException as e:
-            if hasattr(e, 'response') and e.response is not None:
-                self._handle_response_error(e.response)
-            raise
+    def __init__(self, widget):
+        self.widget = widget
+        self._jobs = {}
+
+    def coalesce(self, key, callback):
+        """Run callback once on the next idle pass, however often it is requested."""
+        if key not in self._jobs:
+            self._jobs[key] = self.widget.after_idle(self._run, key, callback)
+
+    def debounce(self, key, delay_ms, callback):
+        """Run callback delay_ms after the most recent request for key."""
+        self.cancel(key)
+        self._jobs[key] = self.widget.after(delay_ms, self._run, key, callback)
+
+    def cancel(self, key):
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            try:
+                self.widget.after_cancel(job)
+            except tk.TclError:
+                pass
+
+    def cancel_all(self):
+        for key in list(self._jobs):
+            self.cancel(key)
+
+    def pending(self, key) -> bool:
+        return key in self._jobs
+
+    def _run(self, key, callback):
+        self._jobs.pop(key, None)
+        callback()
+
+
+class ChatSession(Conversation):
+    """One conversation tab: a Conversation plus its transcript widget.
+
+    Every tab can have a request in flight at the same time.  While a tab
+    is not the one on screen, streamed text is collected in stream_backlog
+    instead of being inserted chunk by chunk, and is written in one insert
+    when the tab is focused or the answer completes or fails.
+    """
+
+    def __init__(self, session_id, model, template, system_prompt):
+        super().__init__(session_id, model, template, system_prompt)
+        self.history_display_ids = []  # message id of each history entry, in step with conversation_history
+        self.message_index = {}  # message id -> (start mark, end mark)
+        self.message_id_counter = itertools.count(1)
+        self.thinking_message_id = None
+        self.streaming_message_id = None
+        self.last_message_was_thinking = False
+        self.stream_backlog = {}  # message id -> chunks received while the tab was hidden
+        self.journal = SessionJournal(session_id)
+        self.stored_history = None  # last history written to the store (writer thread only)
+        self.loading = None  # progress message id while a saved chat streams in
+        self.hidden_messages = 0  # oldest messages left unrendered (see _render_history)
+        self.frame = None
+        self.chat_display = None
+
+    def append_message(self, message, display_id=None):
+        super().append_message(message)
+        self.history_display_ids.append(display_id)
+
+    def pop_message(self):
+        self.history_display_ids.pop()
+        return super().pop_message()
+
+    def clear(self):
+        super().clear()
+        self.history_display_ids = []
 
-    def _handle_streamed_response(self, response: requests.Response):
-        try:
-            for line in response.iter_lines():
-                if line:
-                    decoded_line = line.decode('utf-8')
-                    if decoded_line.startswith('data: '):
-                        json_str = decoded_line[len('data: '):]
-                        if json_str.strip() == "[DONE]":
-                            yield {"done": True}
-                            return
-                        try:
-                            chunk = json.loads(json_str)
-                            yield chunk
-                        except json.JSONDecodeError:
-                            print(f"Warning: Could not decode JSON chunk: {json_str}")
-        except Exception as e:
-            print(f"Error while processing stream: {e}")
-            yield {"error": str(e)}
-        finally:
-            response.close()
 
 class PerplexityGUI(tk.Tk):
     def __init__(self):
@@ -121,25 +134,101 @@ class PerplexityGUI(tk.Tk):
         self.geometry("1200x800")
         self.configure(bg="#2B2B2B")
         
-        self.api_client = None
-        self.conversation_history = []
         self.response_queue = queue.Queue()
-        self.last_message_was_thinking = False
         self.thinking_animation_job = None
         self.thinking_text_options = ["Thinking.", "Thinking..", "Thinking..."]
         self.thinking_text_cycle = itertools.cycle(self.thinking_text_options)
-        self.last_ai_response_content = ""
-        self.conversation_sessions = {}
-        self.current_session_id = "default"
+        self.active_session = None
+        self.chat_font_size = 13
         self.auto_save_enabled = True
+        self.ui_scheduler = UIScheduler(self)
+        # The engine owns the conversations and runs their requests; its
+        # events are applied on the Tk thread by _process_response_queue.
+        self.engine = ChatEngine(session_factory=ChatSession, source="gui", router=ModelRouter())
+        self.engine.subscribe(self.response_queue.put)
+        self.request_scheduler = self.engine.scheduler
+        self.conversation_sessions = self.engine.sessions  # session id -> ChatSession, one per tab
+        self.persistence = PersistenceWriter()
+        self.conversation_store = None  # opened by _finish_startup()
+        self.semantic_cache = None  # opened once enabled, after startup (see _start_semantic_cache)
+        self.semantic_index = None  # opened by the first search by meaning (see _update_semantic_index)
+        self.semantic_search = False  # last state of the search window's "By meaning" box
+        self.startup_finished = False
+        self._last_input_char_count = 0
+        self._last_message_count_text = None
+        self._last_scroll_text = None
+        self.source_urls = {}  # link tag -> URL of a rendered citation
+        self.source_link_counter = itertools.count(1)
+        self._model_health_job = None
         
         self._setup_styles()
         self._setup_menu()
         self._setup_widgets()
         self._load_api_key()
         self._load_settings()
+        # Everything else waits until the window has been drawn once.
+        self.bind("<Map>", self._on_first_map, add="+")
         self._schedule_auto_save()
 
+    def _on_first_map(self, event):
+        if event.widget is self and not self.startup_finished:
+            self.after(config.ADVANCED.get("startup_defer_ms", 50), self._finish_startup)
+
+    def _finish_startup(self):
+        """Second half of startup, run once the chat window is on screen."""
+        if self.startup_finished:
+            return
+        self.startup_finished = True
+        self._build_secondary_panels()
+        try:
+            self.conversation_store = ConversationStore()
+        except Exception as e:
+            print(f"Conversation store unavailable: {e}")
+        try:
+            from usage_ledger import UsageLedger
+            self.engine.ledger = UsageLedger()
+        except Exception as e:
+            print(f"Usage ledger unavailable: {e}")
+        self._recover_sessions()
+        self._start_semantic_cache()
+        # Sweep snapshot blobs orphaned by retention pruning, off the UI thread.
+        self.persistence.submit("snapshot_gc", SnapshotStore().gc)
+        # Import requests in the background so the first message doesn't pay for it.
+        threading.Thread(target=import_requests, name="pplx-warmup", daemon=True).start()
+
+    @property
+    def api_client(self):
+        return self.engine.api_client
+
+    @api_client.setter
+    def api_client(self, client):
+        self.engine.api_client = client
+
+    # The focused tab's state, under the names the rest of the class uses.
+    @property
+    def current_session_id(self):
+        return self.active_session.session_id
+
+    @property
+    def chat_display(self):
+        return self.active_session.chat_display
+
+    @property
+    def conversation_history(self):
+        return self.active_session.conversation_history
+
+    @conversation_history.setter
+    def conversation_history(self, history):
+        self.active_session.conversation_history = history
+
+    @property
+    def last_ai_response_content(self):
+        return self.active_session.last_ai_response_content
+
+    @last_ai_response_content.setter
+    def last_ai_response_content(self, content):
+        self.active_session.last_ai_response_content = content
+
     def _setup_styles(self):
         style = ttk.Style(self)
         style.theme_use('clam')
@@ -182,11 +271,18 @@ class PerplexityGUI(tk.Tk):
         
         file_menu = tk.Menu(menubar, tearoff=0, bg=self.text_bg, fg=self.text_fg)
         file_menu.add_command(label="New Conversation", command=self._new_conversation, accelerator="Ctrl+N")
+        file_menu.add_command(label="Close Conversation", command=self._close_session_tab, accelerator="Ctrl+W")
         file_menu.add_separator()
         file_menu.add_command(label="Save Chat", command=self._save_chat_history, accelerator="Ctrl+S")
         file_menu.add_command(label="Load Chat", command=self._load_chat_history, accelerator="Ctrl+O")
         file_menu.add_command(label="Export as Text", command=self._export_as_text, accelerator="Ctrl+E")
         file_menu.add_command(label="Export as HTML", command=self._export_as_html)
+        file_menu.add_command(label="Export as Markdown", command=lambda: self._export_conversation("md"))
+        file_menu.add_command(label="Export as JSONL", command=lambda: self._export_conversation("jsonl"))
+        export_all_menu = tk.Menu(file_menu, tearoff=0, bg=self.text_bg, fg=self.text_fg)
+        for fmt, label in EXPORT_FORMATS.items():
+            export_all_menu.add_command(label=label, command=lambda fmt=fmt: self._export_all_conversations(fmt))
+        file_menu.add_cascade(label="Export All Conversations", menu=export_all_menu)
         file_menu.add_separator()
         file_menu.add_command(label="Settings", command=self._show_settings)
         file_menu.add_separator()
@@ -198,18 +294,22 @@ class PerplexityGUI(tk.Tk):
         edit_menu.add_command(label="Clear Chat", command=self._clear_chat, accelerator="Ctrl+L")
         edit_menu.add_separator()
         edit_menu.add_command(label="Find in Chat", command=self._find_in_chat, accelerator="Ctrl+F")
+        edit_menu.add_command(label="Search All Conversations...", command=self._show_history_browser, accelerator="Ctrl+Shift+F")
         menubar.add_cascade(label="Edit", menu=edit_menu)
         
         tools_menu = tk.Menu(menubar, tearoff=0, bg=self.text_bg, fg=self.text_fg)
         tools_menu.add_command(label="Word Count", command=self._show_word_count)
         tools_menu.add_command(label="API Usage Stats", command=self._show_api_stats)
+        tools_menu.add_command(label="Usage & Costs", command=self._show_usage_costs)
+        tools_menu.add_command(label="Export Usage CSV...", command=self._export_usage_csv)
+        tools_menu.add_command(label="Clear Answer Cache", command=self._clear_semantic_cache)
         tools_menu.add_command(label="Validate API Key", command=self._validate_api_key)
         menubar.add_cascade(label="Tools", menu=tools_menu)
         
         help_menu = tk.Menu(menubar, tearoff=0, bg=self.text_bg, fg=self.text_fg)
         help_menu.add_command(label="About", command=self._show_about)
         help_menu.add_command(label="Keyboard Shortcuts", command=self._show_shortcuts)
-        help_menu.add_command(label="Perplexity API Docs", command=lambda: webbrowser.open("https://docs.perplexity.ai/"))
+        help_menu.add_command(label="Perplexity API Docs", command=self._open_api_docs)
         menubar.add_cascade(label="Help", menu=help_menu)
         
         self.config(menu=menubar)
@@ -217,9 +317,11 @@ class PerplexityGUI(tk.Tk):
         self.bind_all("<Control-s>", lambda event: self._save_chat_history())
         self.bind_all("<Control-o>", lambda event: self._load_chat_history())
         self.bind_all("<Control-n>", lambda event: self._new_conversation())
+        self.bind_all("<Control-w>", lambda event: self._close_session_tab())
         self.bind_all("<Control-l>", lambda event: self._clear_chat())
         self.bind_all("<Control-e>", lambda event: self._export_as_text())
         self.bind_all("<Control-f>", lambda event: self._find_in_chat())
+        self.bind_all("<Control-F>", lambda event: self._show_history_browser())
         self.bind_all("<Control-c>", lambda event: self._copy_last_response())
 
     def _create_labeled_frame(self, parent, text, **kwargs):
@@ -260,7 +362,11 @@ class PerplexityGUI(tk.Tk):
         self.model_var = tk.StringVar()
         self.model_dropdown = ttk.Combobox(model_frame, textvariable=self.model_var, values=AVAILABLE_MODELS, state="readonly", width=25, font=("Segoe UI", 9))
         if AVAILABLE_MODELS: self.model_dropdown.set(AVAILABLE_MODELS[6])
-        self.model_dropdown.pack(side=tk.LEFT, padx=(0,10))
+        self.model_dropdown.pack(side=tk.LEFT, padx=(0,5))
+        # Recent failures and response time of the selected model (see _refresh_model_health).
+        self.model_health_label = ttk.Label(model_frame, text="", style="TLabel", width=18)
+        self.model_health_label.pack(side=tk.LEFT, padx=(0,5))
+        self.model_var.trace_add("write", lambda *args: self._refresh_model_health())
         
         ttk.Label(model_frame, text="Template:", style="TLabel").pack(side=tk.LEFT, padx=(0,5))
         self.template_var = tk.StringVar()
@@ -294,15 +400,10 @@ class PerplexityGUI(tk.Tk):
         self.message_count_label = ttk.Label(nav_frame, text="Messages: 0", style="TLabel")
         self.message_count_label.pack(side=tk.LEFT, padx=(10,0))
 
-        # Chat display container
+        # Chat display container: one notebook tab per session
         chat_container = ttk.Frame(left_panel, style="Content.TFrame")
         chat_container.pack(expand=True, fill=tk.BOTH, padx=10, pady=(0,10))
 
-        self.chat_display = tk.Text(chat_container, wrap=tk.WORD, state=tk.DISABLED,
-                                   bg=self.text_bg, fg=self.text_fg, relief=tk.SOLID,
-                                   font=("Segoe UI", 13), insertbackground=self.text_fg,
-                                   padx=15, pady=15, borderwidth=1, selectbackground="#404040")
-        
         scroll_frame = ttk.Frame(chat_container, style="Content.TFrame")
         scroll_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(5,0))
         
@@ -311,22 +412,11 @@ class PerplexityGUI(tk.Tk):
         
         self.chat_scrollbar = ttk.Scrollbar(scroll_frame, orient="vertical", command=self._on_scroll)
         self.chat_scrollbar.pack(fill=tk.Y, expand=True)
-        
-        self.chat_display.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
-        
-        self.chat_display.config(yscrollcommand=self._on_text_scroll)
-        self.chat_scrollbar.config(command=self.chat_display.yview)
-        
-        self.chat_display.bind("<MouseWheel>", self._on_mousewheel)
-        self.chat_display.bind("<Button-4>", self._on_mousewheel)
-        self.chat_display.bind("<Button-5>", self._on_mousewheel)
-        
-        self._configure_chat_tags()
-        
-        self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, "🔧 Chat display initialized successfully!\n", "system")
-        self.chat_display.config(state=tk.DISABLED)
-        
+
+        self.session_notebook = ttk.Notebook(chat_container)
+        self.session_notebook.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.session_notebook.bind("<<NotebookTabChanged>>", self._on_session_tab_changed)
+
         main_paned_window.add(left_panel, weight=3)
 
         # Right Panel
@@ -343,68 +433,23 @@ class PerplexityGUI(tk.Tk):
         self.system_prompt_text.insert(tk.END, CONVERSATION_TEMPLATES["General Assistant"])
         self.system_prompt_text.pack(fill=tk.X)
 
-        # Parameters
-        params_labelframe = self._create_labeled_frame(right_panel_outer, text="Model Parameters", padding="5")
-        params_labelframe.pack(fill=tk.X, pady=(0,10))
-
-        params_container = ttk.Frame(params_labelframe, style="Content.TFrame")
-        params_container.pack(fill=tk.X, padx=5, pady=5)
-
-        param_fields = [
+        # The rest of the right panel is built by _build_secondary_panels()
+        # after the first frame; its variables exist from the start.
+        self.right_panel = right_panel_outer
+        self.param_fields = [
             ("Max Tokens:", "max_tokens_var", "512"), ("Temperature:", "temp_var", "0.7"),
             ("Top P:", "top_p_var", "0.9"), ("Top K:", "top_k_var", "0"),
             ("Presence Penalty:", "presence_penalty_var", "0.0"),
             ("Frequency Penalty:", "frequency_penalty_var", "0.1")
         ]
-
-        for i, (label_text, var_name, default_value) in enumerate(param_fields):
-            ttk.Label(params_container, text=label_text, style="TLabel").grid(row=i, column=0, sticky=tk.W, pady=2, padx=2)
+        for label_text, var_name, default_value in self.param_fields:
             setattr(self, var_name, tk.StringVar(value=default_value))
-            entry = ttk.Entry(params_container, textvariable=getattr(self, var_name), width=8, font=("Segoe UI", 9))
-            entry.grid(row=i, column=1, sticky="ew", pady=2, padx=2)
-        params_container.grid_columnconfigure(1, weight=1)
-
-        # Controls
-        controls_frame = self._create_labeled_frame(right_panel_outer, text="Controls", padding="5")
-        controls_frame.pack(fill=tk.X, pady=(0,10))
-        
         self.stream_var = tk.BooleanVar(value=True)
-        self.stream_check = ttk.Checkbutton(controls_frame, text="Stream Response", variable=self.stream_var, style="Control.TCheckbutton")
-        self.stream_check.pack(anchor=tk.W, pady=2)
-        
         self.auto_save_var = tk.BooleanVar(value=True)
-        self.auto_save_check = ttk.Checkbutton(controls_frame, text="Auto-save conversations", variable=self.auto_save_var, style="Control.TCheckbutton")
-        self.auto_save_check.pack(anchor=tk.W, pady=2)
-        
-        # Font size control
-        font_frame = ttk.Frame(controls_frame, style="Content.TFrame")
-        font_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Label(font_frame, text="Chat Font Size:", style="TLabel").pack(side=tk.LEFT)
+        self.semantic_cache_var = tk.BooleanVar(value=config.FEATURES.get("enable_semantic_cache", False))
+        self.semantic_cache_var.trace_add("write", lambda *args: self._start_semantic_cache())
         self.font_size_var = tk.StringVar(value="13")
-        font_size_combo = ttk.Combobox(font_frame, textvariable=self.font_size_var, values=["10", "11", "12", "13", "14", "15", "16", "18", "20"], 
-                                      state="readonly", width=5, font=("Segoe UI", 9))
-        font_size_combo.pack(side=tk.LEFT, padx=(5,5))
-        font_size_combo.bind("<<ComboboxSelected>>", self._on_font_size_change)
-        
-        ttk.Button(font_frame, text="Apply", command=self._apply_font_size, width=6).pack(side=tk.LEFT, padx=(5,0))
 
-        # Action buttons
-        actions_frame = self._create_labeled_frame(right_panel_outer, text="Actions", padding="5")
-        actions_frame.pack(fill=tk.X)
-        
-        self.copy_last_button = ttk.Button(actions_frame, text="Copy Last Response", command=self._copy_last_response)
-        self.copy_last_button.pack(fill=tk.X, pady=2)
-
-        self.regenerate_button = ttk.Button(actions_frame, text="Regenerate Response", command=self._regenerate_last_response)
-        self.regenerate_button.pack(fill=tk.X, pady=2)
-
-        self.clear_chat_button = ttk.Button(actions_frame, text="Clear Chat", command=self._clear_chat)
-        self.clear_chat_button.pack(fill=tk.X, pady=2)
-        
-        self.new_session_button = ttk.Button(actions_frame, text="New Session", command=self._new_conversation, style="Accent.TButton")
-        self.new_session_button.pack(fill=tk.X, pady=2)
-        
         main_paned_window.add(right_panel_outer, weight=1)
         
         def _set_paned_window_size():
@@ -428,7 +473,7 @@ class PerplexityGUI(tk.Tk):
         input_header.pack(fill=tk.X, pady=(0,5))
         
         ttk.Label(input_header, text="Your Message:", style="Header.TLabel").pack(side=tk.LEFT)
-        self.char_count_label = ttk.Label(input_header, text="0 characters", style="TLabel")
+        self.char_count_label = ttk.Label(input_header, text="0 chars, 0 words, ~0 tokens", style="TLabel")
         self.char_count_label.pack(side=tk.RIGHT)
 
         input_container = ttk.Frame(bottom_frame, style="TFrame")
@@ -440,7 +485,8 @@ class PerplexityGUI(tk.Tk):
         self.user_input.pack(side=tk.LEFT, expand=True, fill=tk.BOTH, padx=(0,10))
         self.user_input.bind("<Return>", self._on_send_message_enter)
         self.user_input.bind("<Shift-Return>", self._on_shift_enter)
-        self.user_input.bind("<KeyRelease>", self._update_char_count)
+        self.user_input.bind("<KeyRelease>", self._schedule_char_count)
+        self.user_input.bind("<<Paste>>", self._schedule_char_count, add="+")
         self.user_input.focus_set()
 
         button_container = ttk.Frame(input_container, style="TFrame")
@@ -449,19 +495,88 @@ class PerplexityGUI(tk.Tk):
         self.send_button = ttk.Button(button_container, text="Send\n(Ctrl+Enter)", command=self._on_send_message, style="Accent.TButton")
         self.send_button.pack(fill=tk.BOTH, expand=True)
         
+        self._create_session_tab()
+        self._add_message_to_display("", "🔧 Chat display initialized successfully!", "system")
+        
         self.after(100, self._process_response_queue)
 
-    def _configure_chat_tags(self):
-        self.chat_display.tag_configure("user", foreground=self.user_fg, font=("Segoe UI", 13, "bold"))
-        self.chat_display.tag_configure("assistant", foreground=self.assistant_fg, font=("Segoe UI", 13))
-        self.chat_display.tag_configure("system", foreground=self.system_fg, font=("Segoe UI", 11, "italic"))
-        self.chat_display.tag_configure("error", foreground=self.error_fg, font=("Segoe UI", 11, "bold"))
-        self.chat_display.tag_configure("thinking", foreground="#FFD54F", font=("Segoe UI", 12, "italic"))
-        self.chat_display.tag_configure("timestamp", foreground="#999999", font=("Segoe UI", 10))
-        self.chat_display.tag_configure("bold", font=("Segoe UI", 13, "bold"))
+    def _build_secondary_panels(self):
+        """Model parameters, controls and action buttons (right panel, below the system prompt)."""
+        # Parameters
+        params_labelframe = self._create_labeled_frame(self.right_panel, text="Model Parameters", padding="5")
+        params_labelframe.pack(fill=tk.X, pady=(0,10))
+
+        params_container = ttk.Frame(params_labelframe, style="Content.TFrame")
+        params_container.pack(fill=tk.X, padx=5, pady=5)
+
+        for i, (label_text, var_name, default_value) in enumerate(self.param_fields):
+            ttk.Label(params_container, text=label_text, style="TLabel").grid(row=i, column=0, sticky=tk.W, pady=2, padx=2)
+            entry = ttk.Entry(params_container, textvariable=getattr(self, var_name), width=8, font=("Segoe UI", 9))
+            entry.grid(row=i, column=1, sticky="ew", pady=2, padx=2)
+        params_container.grid_columnconfigure(1, weight=1)
+
+        # Controls
+        controls_frame = self._create_labeled_frame(self.right_panel, text="Controls", padding="5")
+        controls_frame.pack(fill=tk.X, pady=(0,10))
+        
+        self.stream_check = ttk.Checkbutton(controls_frame, text="Stream Response", variable=self.stream_var, style="Control.TCheckbutton")
+        self.stream_check.pack(anchor=tk.W, pady=2)
+        
+        self.auto_save_check = ttk.Checkbutton(controls_frame, text="Auto-save conversations", variable=self.auto_save_var, style="Control.TCheckbutton")
+        self.auto_save_check.pack(anchor=tk.W, pady=2)
+        
+        # Font size control
+        font_frame = ttk.Frame(controls_frame, style="Content.TFrame")
+        font_frame.pack(fill=tk.X, pady=5)
         
-        self.chat_display.tag_configure("user_bg", background="#1A2332", font=("Segoe UI", 13, "bold"))
-        self.chat_display.tag_configure("assistant_bg", background="#1A2B1A", font=("Segoe UI", 13))
+        ttk.Label(font_frame, text="Chat Font Size:", style="TLabel").pack(side=tk.LEFT)
+        font_size_combo = ttk.Combobox(font_frame, textvariable=self.font_size_var, values=["10", "11", "12", "13", "14", "15", "16", "18", "20"], 
+                                      state="readonly", width=5, font=("Segoe UI", 9))
+        font_size_combo.pack(side=tk.LEFT, padx=(5,5))
+        font_size_combo.bind("<<ComboboxSelected>>", self._on_font_size_change)
+        
+        ttk.Button(font_frame, text="Apply", command=self._apply_font_size, width=6).pack(side=tk.LEFT, padx=(5,0))
+
+        # Action buttons
+        actions_frame = self._create_labeled_frame(self.right_panel, text="Actions", padding="5")
+        actions_frame.pack(fill=tk.X)
+        
+        self.copy_last_button = ttk.Button(actions_frame, text="Copy Last Response", command=self._copy_last_response)
+        self.copy_last_button.pack(fill=tk.X, pady=2)
+
+        self.regenerate_button = ttk.Button(actions_frame, text="Regenerate Response", command=self._regenerate_last_response)
+        self.regenerate_button.pack(fill=tk.X, pady=2)
+
+        self.clear_chat_button = ttk.Button(actions_frame, text="Clear Chat", command=self._clear_chat)
+        self.clear_chat_button.pack(fill=tk.X, pady=2)
+        
+        self.new_session_button = ttk.Button(actions_frame, text="New Session Tab", command=self._new_conversation, style="Accent.TButton")
+        self.new_session_button.pack(fill=tk.X, pady=2)
+
+    def _configure_chat_tags(self, display):
+        display.tag_configure("user", foreground=self.user_fg, font=("Segoe UI", 13, "bold"))
+        display.tag_configure("assistant", foreground=self.assistant_fg, font=("Segoe UI", 13))
+        display.tag_configure("system", foreground=self.system_fg, font=("Segoe UI", 11, "italic"))
+        display.tag_configure("error", foreground=self.error_fg, font=("Segoe UI", 11, "bold"))
+        display.tag_configure("thinking", foreground="#FFD54F", font=("Segoe UI", 12, "italic"))
+        display.tag_configure("timestamp", foreground="#999999", font=("Segoe UI", 10))
+        display.tag_configure("bold", font=("Segoe UI", 13, "bold"))
+        
+        display.tag_configure("search_hit", background="#4A4A1A")
+        display.tag_configure("show_earlier", foreground="#66B2FF", underline=True)
+        display.tag_bind("show_earlier", "<Button-1>", lambda event: self._show_earlier_messages())
+        display.tag_bind("show_earlier", "<Enter>", lambda event: event.widget.config(cursor="hand2"))
+        display.tag_bind("show_earlier", "<Leave>", lambda event: event.widget.config(cursor=""))
+        display.tag_configure("fresh_answer", foreground="#66B2FF", underline=True)
+        display.tag_bind("fresh_answer", "<Button-1>", lambda event: self._fresh_answer_for_cached())
+        display.tag_bind("fresh_answer", "<Enter>", lambda event: event.widget.config(cursor="hand2"))
+        display.tag_bind("fresh_answer", "<Leave>", lambda event: event.widget.config(cursor=""))
+        display.tag_configure("source_link", foreground="#66B2FF", font=("Segoe UI", 10))
+        display.tag_bind("source_link", "<Button-1>", self._open_source_link)
+        display.tag_bind("source_link", "<Enter>", lambda event: event.widget.config(cursor="hand2"))
+        display.tag_bind("source_link", "<Leave>", lambda event: event.widget.config(cursor=""))
+        display.tag_configure("user_bg", background="#1A2332", font=("Segoe UI", 13, "bold"))
+        display.tag_configure("assistant_bg", background="#1A2B1A", font=("Segoe UI", 13))
 
     # Core functionality methods
     def _load_api_key(self):
@@ -511,6 +626,7 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
         except ValueError as e:
             messagebox.showerror("API Client Error", str(e))
             self.api_client = None
+        self._refresh_model_health()
 
     def _save_api_key(self, key: str):
         try:
@@ -534,15 +650,41 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
             self.system_prompt_text.delete("1.0", tk.END)
             self.system_prompt_text.insert("1.0", CONVERSATION_TEMPLATES[selected_template])
 
+    def _schedule_char_count(self, event=None):
+        self.ui_scheduler.debounce("char_count", config.ADVANCED["ui_debounce_ms"], self._update_char_count)
+
     def _update_char_count(self, event=None):
-        content = self.user_input.get("1.0", tk.END).strip()
-        char_count = len(content)
-        word_count = len(content.split()) if content else 0
-        self.char_count_label.config(text=f"{char_count} chars, {word_count} words")
+        # Tk counts the characters itself, so large inputs are never copied
+        # into Python just to size them.
+        char_count = self.user_input.count("1.0", "end-1c", "chars")
+        char_count = char_count[0] if char_count else 0
+        last_char_count, self._last_input_char_count = self._last_input_char_count, char_count
+
+        if char_count > config.ADVANCED["large_input_chars"]:
+            # Splitting a pasted document on every pause is what made the
+            # input box sluggish; above the threshold words are estimated
+            # from the length, so an unchanged length changes nothing.
+            if char_count == last_char_count:
+                return
+            word_text = f"~{char_count // 6:,} words"
+            token_estimate = estimate_tokens_for_chars(char_count)
+        else:
+            content = self.user_input.get("1.0", "end-1c")
+            word_text = f"{len(content.split())} words"
+            token_estimate = estimate_tokens(content.strip())
+        self.char_count_label.config(text=f"{char_count:,} chars, {word_text}, ~{token_estimate:,} tokens")
+
+    def _schedule_message_count(self):
+        self.ui_scheduler.coalesce("message_count", self._update_message_count)
 
     def _update_message_count(self):
-        count = len(self.conversation_history)
-        self.message_count_label.config(text=f"Messages: {count}")
+        stats = self.active_session.stats
+        text = f"Messages: {stats.messages}"
+        if stats.messages:
+            text += f" | {stats.words:,} words | ~{stats.estimated_tokens:,} tokens"
+        if text != self._last_message_count_text:
+            self._last_message_count_text = text
+            self.message_count_label.config(text=text)
 
     def _on_send_message_enter(self, event):
         if event.state & 0x0004:  # Ctrl key
@@ -554,40 +696,225 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
         self.user_input.insert(tk.INSERT, "\n")
         return "break"
 
-    def _add_message_to_display(self, who: str, message: str, tag: str, is_thinking_placeholder=False, show_timestamp=True):
-        self.chat_display.config(state=tk.NORMAL)
-        start_index = self.chat_display.index(tk.END)
+    def _add_message_to_display(self, who: str, message: str, tag: str, is_thinking_placeholder=False, show_timestamp=True, session=None):
+        """Append a message to a tab's transcript and return its message id.
+
+        Every rendered message is bracketed by a pair of left-gravity marks
+        (see _message_marks) and ends with its own newline, so later edits
+        only ever touch the text between those marks.
+        """
+        session = session or self.active_session
+        display = session.chat_display
+        display.config(state=tk.NORMAL)
+
+        if display.index('end-1c') != "1.0" and display.get("end-2c", "end-1c") != "\n":
+             display.insert(tk.END, "\n")
 
-        if self.chat_display.index('end-1c') != "1.0" and self.chat_display.get("end-2c", "end-1c") != "\n":
-             self.chat_display.insert(tk.END, "\n")
+        message_id = next(session.message_id_counter)
+        start_mark, end_mark = self._message_marks(message_id)
+        display.mark_set(start_mark, "end-1c")
+        display.mark_gravity(start_mark, tk.LEFT)
+
+        self._render_message(display, "end-1c", who, message, tag, show_timestamp)
+        display.insert(tk.END, "\n")
+
+        display.mark_set(end_mark, "end-1c")
+        display.mark_gravity(end_mark, tk.LEFT)
+        session.message_index[message_id] = (start_mark, end_mark)
+        if is_thinking_placeholder:
+            session.thinking_message_id = message_id
+        display.config(state=tk.DISABLED)
         
+        if session is self.active_session:
+            display.see(tk.END)
+            self._schedule_scroll_position()
+            self._schedule_message_count()
+        return message_id
+
+    @staticmethod
+    def _message_marks(message_id):
+        return f"msg_{message_id}_start", f"msg_{message_id}_end"
+
+    def _render_message(self, display, index, who, message, tag, show_timestamp):
+        # "render_point" has right gravity so it walks forward over each
+        # insert; marks sitting at index keep their place.
+        display.mark_set("render_point", index)
+        display.mark_gravity("render_point", tk.RIGHT)
+
         if show_timestamp and who:
             timestamp = datetime.now().strftime("%H:%M:%S")
-            self.chat_display.insert(tk.END, f"[{timestamp}] ", "timestamp")
+            display.insert("render_point", f"[{timestamp}] ", "timestamp")
         
         if who:
             speaker_color = "user" if who == "You" else "assistant"
-            self.chat_display.insert(tk.END, f"{who}:\n", (speaker_color, "bold"))
+            display.insert("render_point", f"{who}:\n", (speaker_color, "bold"))
         
         if message.strip():
             lines = message.split('\n')
             for i, line in enumerate(lines):
                 if line.strip() or i == 0:
                     indent = "  " if who else ""
-                    self.chat_display.insert(tk.END, f"{indent}{line}", tag)
+                    display.insert("render_point", f"{indent}{line}", tag)
                 if i < len(lines) - 1:
-                    self.chat_display.insert(tk.END, "\n")
-        
-        if is_thinking_placeholder:
-            end_index = self.chat_display.index(tk.END + "-1c")
-            self.thinking_message_indices = (start_index.strip(), end_index.strip())
-        
-        self.chat_display.insert(tk.END, "\n")
-        self.chat_display.config(state=tk.DISABLED)
-        
-        self.chat_display.see(tk.END)
-        self._update_scroll_position()
-        self._update_message_count()
+                    display.insert("render_point", "\n")
+
+        display.mark_unset("render_point")
+
+    def _replace_message(self, message_id, who: str, message: str, tag: str, show_timestamp=True, session=None):
+        """Re-render a single message in place; other messages are untouched."""
+        session = session or self.active_session
+        if message_id not in session.message_index:
+            return
+        start_mark, end_mark = session.message_index[message_id]
+        display = session.chat_display
+        display.config(state=tk.NORMAL)
+        # The trailing newline stays behind as an anchor so the end mark and
+        # the next message's start mark keep their positions after it.
+        display.delete(start_mark, f"{end_mark}-1c")
+        self._render_message(display, start_mark, who, message, tag, show_timestamp)
+        display.config(state=tk.DISABLED)
+        if session is self.active_session:
+            self._schedule_scroll_position()
+
+    def _delete_message(self, message_id, session=None):
+        """Remove a single message from a tab's transcript."""
+        session = session or self.active_session
+        marks = session.message_index.pop(message_id, None)
+        if not marks:
+            return
+        session.stream_backlog.pop(message_id, None)
+        display = session.chat_display
+        display.config(state=tk.NORMAL)
+        display.delete(*marks)
+        display.mark_unset(*marks)
+        display.config(state=tk.DISABLED)
+        if session is self.active_session:
+            self._schedule_scroll_position()
+
+    def _append_to_message(self, message_id, text: str, tag: str, session=None):
+        session = session or self.active_session
+        marks = session.message_index.get(message_id)
+        if not marks:
+            return
+        display = session.chat_display
+        display.config(state=tk.NORMAL)
+        display.insert(f"{marks[1]}-1c", text, (tag,))
+        display.config(state=tk.DISABLED)
+
+    def _append_history(self, message, display_id=None, session=None):
+        session = session or self.active_session
+        session.append_message(message, display_id)
+        if session is self.active_session:
+            self._schedule_message_count()
+
+    def _pop_history(self, session=None):
+        session = session or self.active_session
+        if session is self.active_session:
+            self._schedule_message_count()
+        display_id = session.history_display_ids[-1]
+        return session.pop_message(), display_id
+
+    # Session tabs
+    def _unique_session_id(self, base=None):
+        base = base or f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        candidate, suffix = base, 2
+        while candidate in self.conversation_sessions:
+            candidate = f"{base}_{suffix}"
+            suffix += 1
+        return candidate
+
+    def _create_session_tab(self, session_id=None, focus=True):
+        """Open a new conversation tab, inheriting the current model and prompt."""
+        session_id = self._unique_session_id(session_id)
+        session = self.engine.open_session(session_id, self.model_var.get(), self.template_var.get(),
+                                           self.system_prompt_text.get("1.0", "end-1c"))
+
+        session.frame = ttk.Frame(self.session_notebook, style="Content.TFrame")
+        display = tk.Text(session.frame, wrap=tk.WORD, state=tk.DISABLED,
+                          bg=self.text_bg, fg=self.text_fg, relief=tk.SOLID,
+                          font=("Segoe UI", self.chat_font_size), insertbackground=self.text_fg,
+                          padx=15, pady=15, borderwidth=1, selectbackground="#404040")
+        display.pack(expand=True, fill=tk.BOTH)
+        display.config(yscrollcommand=lambda *args, s=session: self._on_text_scroll(s, *args))
+        display.bind("<MouseWheel>", self._on_mousewheel)
+        display.bind("<Button-4>", self._on_mousewheel)
+        display.bind("<Button-5>", self._on_mousewheel)
+        self._configure_chat_tags(display)
+        session.chat_display = display
+
+        self.session_notebook.add(session.frame, text=session.title)
+        if focus or self.active_session is None:
+            self._activate_session(session)
+        return session
+
+    def _session_for_tab(self, tab_id):
+        for session in self.conversation_sessions.values():
+            if str(session.frame) == str(tab_id):
+                return session
+        return None
+
+    def _on_session_tab_changed(self, event=None):
+        session = self._session_for_tab(self.session_notebook.select())
+        if session is not None and session is not self.active_session:
+            self._activate_session(session)
+
+    def _activate_session(self, session):
+        previous = self.active_session
+        if previous is not None and previous is not session:
+            self._store_session_settings(previous)
+        self.active_session = session
+
+        self.model_var.set(session.model)
+        self.template_var.set(session.template)
+        self.system_prompt_text.delete("1.0", tk.END)
+        self.system_prompt_text.insert("1.0", session.system_prompt)
+        if str(self.session_notebook.select()) != str(session.frame):
+            self.session_notebook.select(session.frame)
+
+        self._flush_stream_backlog(session)
+        self.chat_scrollbar.set(*session.chat_display.yview())
+        self.session_label.config(text=f"Session: {session.session_id}")
+        self._schedule_scroll_position()
+        self._schedule_message_count()
+        self._update_send_button()
+
+    def _store_session_settings(self, session):
+        """Copy the shared model/template/prompt widgets back into a tab."""
+        session.model = self.model_var.get()
+        session.template = self.template_var.get()
+        session.system_prompt = self.system_prompt_text.get("1.0", "end-1c")
+
+    def _flush_stream_backlog(self, session):
+        # Catch a background tab up with everything it streamed while hidden:
+        # one insert per answer instead of one per chunk.
+        if not session.stream_backlog:
+            return
+        backlog, session.stream_backlog = session.stream_backlog, {}
+        for message_id, chunks in backlog.items():
+            self._append_to_message(message_id, "".join(chunks), "assistant", session=session)
+        if session is self.active_session:
+            session.chat_display.see(tk.END)
+
+    def _update_tab_title(self, session):
+        busy = self.request_scheduler.is_busy(session.session_id)
+        title = session.title if len(session.title) <= 24 else session.title[:23] + "…"
+        self.session_notebook.tab(session.frame, text=f"⏳ {title}" if busy else title)
+
+    def _close_session_tab(self):
+        session = self.active_session
+        if self.request_scheduler.is_busy(session.session_id) and not messagebox.askyesno(
+                "Close Tab", "A response is still arriving in this tab. Close it anyway?"):
+            return
+        self._close_session_journal(session)
+        if len(self.conversation_sessions) == 1:
+            self._create_session_tab()
+        else:
+            remaining = [s for s in self.conversation_sessions.values() if s is not session]
+            self._activate_session(remaining[-1])
+        # Late responses for this session are dropped in _process_response_queue.
+        self.engine.close_session(session.session_id)
+        self.session_notebook.forget(session.frame)
+        session.frame.destroy()
 
     def _on_send_message(self):
         if not self.api_client:
@@ -598,162 +925,338 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
         if not user_prompt:
             return
 
-        self._add_message_to_display("You", user_prompt, "user")
-        self.conversation_history.append({"role": "user", "content": user_prompt})
+        session = self.active_session
+        if session.loading is not None:
+            messagebox.showinfo("Loading", "Wait for the conversation to finish loading before sending.")
+            return
+        display_id = self._add_message_to_display("You", user_prompt, "user")
         self.user_input.delete("1.0", tk.END)
-        self.last_ai_response_content = ""
+        self._schedule_char_count()
+        if not session.conversation_history and session.title == session.session_id:
+            session.title = user_prompt.splitlines()[0]
+
+        if self.request_scheduler.is_busy(session.session_id):
+            # Keep typing: the prompt waits behind the answer in flight and is
+            # sent, with that answer in its history, as soon as it lands.
+            settings = self._snapshot_request_settings()
+            self.request_scheduler.enqueue(session.session_id, {"prompt": user_prompt, "display_id": display_id, "settings": settings})
+            self._update_send_button()
+            return
 
-        self.send_button.config(state=tk.DISABLED, text="Sending...")
-        self._add_message_to_display("Assistant", next(self.thinking_text_cycle), "thinking", is_thinking_placeholder=True)
-        self.last_message_was_thinking = True
-        
-        thread = threading.Thread(target=self._call_perplexity_api, args=(list(self.conversation_history),))
-        thread.daemon = True
-        thread.start()
+        self._append_history({"role": "user", "content": user_prompt}, display_id)
+        if len(session.conversation_history) == 1 and self._answer_from_semantic_cache(session, user_prompt):
+            return
+        self._start_request()
 
-    def _call_perplexity_api(self, current_messages):
-        try:
-            model = self.model_var.get()
-            system_prompt_content = self.system_prompt_text.get("1.0", tk.END).strip()
-            
-            api_messages = []
-            if system_prompt_content:
-                api_messages.append({"role": "system", "content": system_prompt_content})
-            api_messages.extend(current_messages)
-
-            params = {
-                "max_tokens": None, "temperature": None, "top_p": None, "top_k": None,
-                "presence_penalty": None, "frequency_penalty": None
-            }
-            
+    # Semantic answer cache
+    def _start_semantic_cache(self):
+        """Open the cache in the background once startup is done and it is enabled."""
+        if self.semantic_cache is not None or not self.startup_finished or not self.semantic_cache_var.get():
+            return
+        from semantic_cache import SemanticCache
+        cache = self.semantic_cache = SemanticCache()
+
+        def load():
             try:
-                if self.max_tokens_var.get(): params["max_tokens"] = int(self.max_tokens_var.get())
-                if self.temp_var.get(): params["temperature"] = float(self.temp_var.get())
-                if self.top_p_var.get(): params["top_p"] = float(self.top_p_var.get())
-                if self.top_k_var.get(): params["top_k"] = int(self.top_k_var.get())
-                if self.presence_penalty_var.get(): params["presence_penalty"] = float(self.presence_penalty_var.get())
-                if self.frequency_penalty_var.get(): params["frequency_penalty"] = float(self.frequency_penalty_var.get())
-            except ValueError as ve:
-                self.response_queue.put({"error": f"Invalid parameter value: {ve}. Using defaults."})
-            
-            stream_enabled = self.stream_var.get()
-
-            if stream_enabled:
-                first_chunk_received = True
-                accumulated_response = ""
-                for chunk in self.api_client.chat_completion(model=model, messages=api_messages, stream=True, **params):
-                    if "error" in chunk:
-                        self.response_queue.put(chunk)
-                        return
-                    if "done" in chunk and chunk["done"]:
-                        self.response_queue.put({"stream_done": True, "full_content": accumulated_response})
-                        return
-                    
-                    content_delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                    if content_delta:
-                        accumulated_response += content_delta
-                        self.response_queue.put({"stream_chunk": content_delta, "first_chunk": first_chunk_received})
-                        if first_chunk_received: 
-                            first_chunk_received = False
-            else:
-                response_data = self.api_client.chat_completion(model=model, messages=api_messages, stream=False, **params)
-                self.response_queue.put({"non_stream_response": response_data})
+                cache.load()
+            except Exception as e:
+                print(f"Semantic cache unavailable: {e}")
+
+        threading.Thread(target=load, name="pplx-semantic-cache", daemon=True).start()
+
+    def _answer_from_semantic_cache(self, session, prompt):
+        """Show a cached answer to a near-duplicate opening question; False if there is none."""
+        cache = self.semantic_cache
+        if cache is None or not self.semantic_cache_var.get():
+            return False
+        # Keyed on the model ("auto" included) and template the question is about to be sent with.
+        hit = cache.lookup(prompt, self.model_var.get(), self.template_var.get())
+        if hit is None:
+            return False
+        message = {"role": "assistant", "content": hit["answer"], "cached_at": hit["created_at"]}
+        if hit.get("citations"):
+            message["citations"] = hit["citations"]
+        display_id = self._add_message_to_display("Assistant", hit["answer"], "assistant", session=session)
+        self._append_history(message, display_id, session=session)
+        session.last_ai_response_content = hit["answer"]
+        if message.get("citations"):
+            self._append_sources(session, display_id, message["citations"])
+        self._add_message_to_display(
+            "", f"♻️ Instant answer from the local cache ({hit['score']:.0%} match with a question asked "
+                f"{hit['created_at'][:10]}). Click here to ask Perplexity instead.", ("system", "fresh_answer"), session=session)
+        if self.auto_save_var.get():
+            self._auto_save_conversation(session)
+        return True
+
+    def _fresh_answer_for_cached(self):
+        """Replace a cached answer that is still the newest message with a real API call."""
+        history = self.conversation_history
+        if history and history[-1].get("cached_at"):
+            self._regenerate_last_response()
+
+    def _remember_answer(self, session, message):
+        """Cache the answer to a conversation's opening question, off the UI thread."""
+        cache = self.semantic_cache
+        history = session.conversation_history
+        if cache is None or not self.semantic_cache_var.get() or len(history) != 2 or message.get("finish_reason") == "length":
+            return
+        # Filed under what the question was sent with, not the model that
+        # answered or a dropdown changed since, so lookups find it.
+        model, template = session.last_sent or (session.model, session.template)
+        self.persistence.submit(("semantic_cache", session.session_id), functools.partial(
+            cache.add, history[0]["content"], model, template, message["content"], message.get("citations")), delay=False)
+
+    def _clear_semantic_cache(self):
+        if self.semantic_cache is None:
+            messagebox.showinfo("Answer Cache", "The answer cache is off. Turn it on in Settings.")
+            return
+        if messagebox.askyesno("Clear Answer Cache", f"Forget all {len(self.semantic_cache):,} cached answers?"):
+            self.persistence.submit("semantic_cache_clear", self.semantic_cache.clear, delay=False)
+
+    def _snapshot_request_settings(self):
+        """Read the model, system prompt and parameters from the widgets.
+
+        Runs on the UI thread; the worker only ever sees the returned dict.
+        """
+        params, invalid = parse_parameters({
+            "max_tokens": self.max_tokens_var.get(), "temperature": self.temp_var.get(),
+            "top_p": self.top_p_var.get(), "top_k": self.top_k_var.get(),
+            "presence_penalty": self.presence_penalty_var.get(),
+            "frequency_penalty": self.frequency_penalty_var.get(),
+        })
+        if invalid:
+            self._add_message_to_display("System Error", f"Invalid parameter value: {', '.join(invalid)}. Using defaults.", "error")
+
+        return {
+            "model": self.model_var.get(),
+            "template": self.template_var.get(),
+            "system_prompt": self.system_prompt_text.get("1.0", tk.END).strip(),
+            "params": params,
+            "stream": self.stream_var.get(),
+        }
 
-        except requests.exceptions.HTTPError as e:
-            self.response_queue.put({"error": f"API Error: {str(e)}"})
-        except Exception as e:
-            self.response_queue.put({"error": f"Unexpected error in API call: {str(e)}"})
+    def _start_request(self, placeholder_id=None, settings=None, enqueued_at=None, session=None):
+        """Show the thinking placeholder and submit the tab's history.
+
+        When placeholder_id is given (regenerate), that message is turned
+        back into the placeholder instead of adding a new one.
+        """
+        session = session or self.active_session
+        session.last_ai_response_content = ""
+        if placeholder_id is None:
+            self._add_message_to_display("Assistant", next(self.thinking_text_cycle), "thinking", is_thinking_placeholder=True, session=session)
+        else:
+            self._replace_message(placeholder_id, "Assistant", next(self.thinking_text_cycle), "thinking", session=session)
+            session.thinking_message_id = placeholder_id
+        session.last_message_was_thinking = True
+
+        self.engine.submit(session, settings or self._snapshot_request_settings(), enqueued_at=enqueued_at)
+        self._update_tab_title(session)
+        self._update_send_button()
+
+    def _on_request_finished(self, session, failed=False):
+        if failed:
+            # Follow-ups were written against an answer that never came.
+            dropped = self.request_scheduler.cancel_pending(session.session_id)
+            if dropped:
+                self._add_message_to_display("", f"{len(dropped)} queued message(s) were not sent.", "system", session=session)
+        next_item = self.request_scheduler.finish(session.session_id)
+        if next_item is not None:
+            item, enqueued_at = next_item
+            self._append_history({"role": "user", "content": item["prompt"]}, item["display_id"], session=session)
+            self._start_request(settings=item["settings"], enqueued_at=enqueued_at, session=session)
+        self._update_tab_title(session)
+        self._update_send_button()
+        self._refresh_model_health()
+
+    def _refresh_model_health(self):
+        """Show the selected model's health next to the model dropdown."""
+        if self._model_health_job is not None:
+            self.after_cancel(self._model_health_job)
+            self._model_health_job = None
+        if self.api_client is None:
+            self.model_health_label.config(text="")
+            return
+        status = self.api_client.health.status(self.model_var.get())
+        text, level = describe_health(status)
+        colors = {"ok": "#81C784", "degraded": "#FFD54F", "down": self.error_fg}
+        self.model_health_label.config(text=text, foreground=colors.get(level, self.system_fg))
+        if level == "down" or status["state"] == "half-open":
+            # Count down the pause, and notice when probes close the breaker.
+            self._model_health_job = self.after(1000, self._refresh_model_health)
+
+    def _update_send_button(self):
+        depth = self.request_scheduler.queue_depth(self.current_session_id)
+        if depth:
+            self.send_button.config(text=f"Queue\n({depth} waiting)")
+        elif self.request_scheduler.is_busy(self.current_session_id):
+            self.send_button.config(text="Queue\n(Ctrl+Enter)")
+        else:
+            self.send_button.config(text="Send\n(Ctrl+Enter)")
 
     def _process_response_queue(self):
         try:
             while not self.response_queue.empty():
                 message_data = self.response_queue.get_nowait()
-
-                if "stream_chunk" in message_data:
-                    self._append_stream_chunk_to_display(message_data["stream_chunk"], message_data["first_chunk"])
+                session = self.conversation_sessions.get(message_data["session_id"])
+                if session is None:
+                    # The tab was closed while its request was in flight.
+                    if "stream_chunk" not in message_data:
+                        self.request_scheduler.finish(message_data["session_id"])
+                    continue
+
+                if session.loading is not None and not {"load_messages", "load_progress", "load_done", "load_error"}.isdisjoint(message_data):
+                    self._on_load_message(session, message_data)
+                elif "stream_chunk" in message_data:
+                    self._append_stream_chunk_to_display(session, message_data["stream_chunk"], message_data["first_chunk"])
                 elif "stream_done" in message_data:
-                    if self.last_message_was_thinking: 
-                        self._clear_thinking_message()
-                    self.conversation_history.append({"role": "assistant", "content": message_data["full_content"]})
-                    self.last_ai_response_content = message_data["full_content"]
-                    self.send_button.config(state=tk.NORMAL, text="Send\n(Ctrl+Enter)")
+                    if session.last_message_was_thinking:
+                        self._promote_thinking_message(session, "")
+                    display_id = session.streaming_message_id
+                    self._flush_stream_backlog(session)
+                    content, usage = answer_from_event(message_data)
+                    message = assistant_message(message_data, content)
+                    self._append_history(message, display_id, session=session)
+                    session.record_usage(message_data, usage)
+                    session.streaming_message_id = None
+                    session.last_ai_response_content = content
+                    self._show_answer_notes(session, display_id, message, usage, message_data)
+                    self._remember_answer(session, message)
                     if self.auto_save_var.get():
-                        self._auto_save_conversation()
+                        self._auto_save_conversation(session)
+                    self._on_request_finished(session)
                 elif "non_stream_response" in message_data:
-                    if self.last_message_was_thinking: 
-                        self._clear_thinking_message()
-                    response = message_data["non_stream_response"]
-                    if response and "choices" in response and response["choices"]:
-                        assistant_message = response["choices"][0].get("message", {}).get("content")
-                        self.last_ai_response_content = assistant_message
-                        self._add_message_to_display("Assistant", assistant_message, "assistant")
-                        self.conversation_history.append({"role": "assistant", "content": assistant_message})
-                        if "usage" in response:
-                            usage = response['usage']
-                            usage_text = f"Tokens: Prompt {usage.get('prompt_tokens',0)}, Completion {usage.get('completion_tokens',0)}, Total {usage.get('total_tokens',0)}"
-                            self._add_message_to_display("", usage_text, "system")
+                    answer = answer_from_event(message_data)
+                    failed = False
+                    if answer is not None:
+                        content, usage = answer
+                        session.last_ai_response_content = content
+                        display_id = self._promote_thinking_message(session, content)
+                        session.streaming_message_id = None
+                        message = assistant_message(message_data, content)
+                        self._append_history(message, display_id, session=session)
+                        session.record_usage(message_data, usage)
+                        self._show_answer_notes(session, display_id, message, usage, message_data)
+                        self._remember_answer(session, message)
                     else:
-                        self._add_message_to_display("System", "No content in response or unexpected structure.", "error")
-                    self.send_button.config(state=tk.NORMAL, text="Send\n(Ctrl+Enter)")
+                        failed = True
+                        self._clear_thinking_message(session)
+                        self._add_message_to_display("System", "No content in response or unexpected structure.", "error", session=session)
                     if self.auto_save_var.get():
-                        self._auto_save_conversation()
+                        self._auto_save_conversation(session)
+                    self._on_request_finished(session, failed=failed)
                 elif "error" in message_data:
-                    if self.last_message_was_thinking: 
-                        self._clear_thinking_message()
-                    self._add_message_to_display("System Error", message_data["error"], "error")
-                    self.send_button.config(state=tk.NORMAL, text="Send\n(Ctrl+Enter)")
+                    if session.last_message_was_thinking:
+                        self._clear_thinking_message(session)
+                    # Whatever streamed before the failure stays above the error.
+                    self._flush_stream_backlog(session)
+                    session.streaming_message_id = None
+                    self._add_message_to_display("System Error", message_data["error"], "error", session=session)
+                    self._on_request_finished(session, failed=True)
         except queue.Empty:
             pass
         finally:
             self.after(100, self._process_response_queue)
 
-    def _clear_thinking_message(self):
-        if hasattr(self, 'thinking_message_indices') and self.thinking_message_indices:
-            self.chat_display.config(state=tk.NORMAL)
-            try:
-                start_idx_str = self.thinking_message_indices[0]
-                line_num = int(float(start_idx_str))
-                self.chat_display.delete(f"{line_num}.0", f"{line_num+1}.0")
-                
-                content_after_delete = self.chat_display.get("1.0", tk.END).strip()
-                if content_after_delete and self.chat_display.get("end-2c", "end-1c") == "\n" and self.chat_display.get("end-3c", "end-2c") == "\n":
-                    self.chat_display.delete("end-2c", "end-1c")
-            except Exception as e:
-                print(f"Error clearing thinking message: {e}")
-            finally:
-                self.chat_display.config(state=tk.DISABLED)
-                self.thinking_message_indices = None
-        
-        self.last_message_was_thinking = False
-
-    def _append_stream_chunk_to_display(self, chunk_text: str, first_chunk: bool):
-        if first_chunk and self.last_message_was_thinking:
-            self._clear_thinking_message()
-            self._add_message_to_display("Assistant", "", "assistant", show_timestamp=True)
-
-        self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, chunk_text, ("assistant",))
-        self.chat_display.config(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
-        self._update_scroll_position()
-        self.last_ai_response_content += chunk_text
+    def _show_answer_notes(self, session, display_id, message, usage, event):
+        """Sources under an answer, then its token usage, and notes on which model answered and if it was cut off."""
+        if message.get("citations"):
+            self._append_sources(session, display_id, message["citations"])
+        if usage:
+            usage_text = f"Tokens: Prompt {usage.get('prompt_tokens',0)}, Completion {usage.get('completion_tokens',0)}, Total {usage.get('total_tokens',0)}"
+            self._add_message_to_display("", usage_text, "system", session=session)
+        if event.get("auto_reason"):
+            self._add_message_to_display(
+                "", f"🔀 {event.get('rerouted_from') or event['model']}: {event['auto_reason']}", "system", session=session)
+        if event.get("rerouted_from"):
+            self._add_message_to_display(
+                "", f"ℹ️ {event['rerouted_from']} keeps failing right now, so {event['model']} answered instead.",
+                "system", session=session)
+        if message.get("finish_reason") == "length":
+            self._add_message_to_display("", "⚠️ The answer was cut off at the max tokens limit.", "system", session=session)
+
+    def _append_sources(self, session, message_id, citations):
+        """Add a compact, clickable source list to the end of a rendered answer."""
+        marks = session.message_index.get(message_id)
+        if not marks:
+            return
+        # Streamed text held back for a hidden tab must land before the list.
+        self._flush_stream_backlog(session)
+        display = session.chat_display
+        display.config(state=tk.NORMAL)
+        display.mark_set("render_point", f"{marks[1]}-1c")
+        display.mark_gravity("render_point", tk.RIGHT)
+        display.insert("render_point", "\n  Sources:", "system")
+        for number, url in enumerate(citations, 1):
+            tag = f"source_{next(self.source_link_counter)}"
+            self.source_urls[tag] = url
+            display.insert("render_point", " ", "system")
+            display.insert("render_point", f"[{number}] {self._source_label(url)}", ("source_link", tag))
+        display.mark_unset("render_point")
+        display.config(state=tk.DISABLED)
+
+    @staticmethod
+    def _source_label(url):
+        from urllib.parse import urlsplit
+        host = urlsplit(url).netloc or url
+        return host[4:] if host.startswith("www.") else host
+
+    def _open_source_link(self, event):
+        for tag in event.widget.tag_names("current"):
+            if tag in self.source_urls:
+                import webbrowser
+                webbrowser.open(self.source_urls[tag])
+                return
+
+    def _clear_thinking_message(self, session):
+        if session.thinking_message_id is not None:
+            self._delete_message(session.thinking_message_id, session=session)
+            session.thinking_message_id = None
+        session.last_message_was_thinking = False
+
+    def _promote_thinking_message(self, session, content: str):
+        """Turn the thinking placeholder into the assistant's answer in place."""
+        message_id = session.thinking_message_id
+        if message_id is None:
+            message_id = self._add_message_to_display("Assistant", content, "assistant", session=session)
+        else:
+            self._replace_message(message_id, "Assistant", content, "assistant", session=session)
+            if session is self.active_session:
+                session.chat_display.see(tk.END)
+        session.thinking_message_id = None
+        session.last_message_was_thinking = False
+        session.streaming_message_id = message_id
+        return message_id
+
+    def _append_stream_chunk_to_display(self, session, chunk_text: str, first_chunk: bool):
+        if first_chunk and session.last_message_was_thinking:
+            self._promote_thinking_message(session, "")
+
+        session.last_ai_response_content += chunk_text
+        if session is not self.active_session:
+            session.stream_backlog.setdefault(session.streaming_message_id, []).append(chunk_text)
+            return
+        self._append_to_message(session.streaming_message_id, chunk_text, "assistant", session=session)
+        session.chat_display.see(tk.END)
+        self._schedule_scroll_position()
 
     # Navigation and UI helper methods
     def _scroll_to_top(self):
         self.chat_display.see("1.0")
-        self._update_scroll_position()
+        self._schedule_scroll_position()
     
     def _scroll_to_bottom(self):
         self.chat_display.see(tk.END)
-        self._update_scroll_position()
+        self._schedule_scroll_position()
     
     def _on_scroll(self, *args):
         self.chat_display.yview(*args)
-        self._update_scroll_position()
+        self._schedule_scroll_position()
     
-    def _on_text_scroll(self, *args):
-        self.chat_scrollbar.set(*args)
-        self._update_scroll_position()
+    def _on_text_scroll(self, session, *args):
+        if session is self.active_session:
+            self.chat_scrollbar.set(*args)
+            self._schedule_scroll_position()
     
     def _on_mousewheel(self, event):
         if event.delta:
@@ -765,9 +1268,12 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
         else:
             delta = 0
         
-        self.chat_display.yview_scroll(int(delta), "units")
-        self._update_scroll_position()
+        event.widget.yview_scroll(int(delta), "units")
+        self._schedule_scroll_position()
     
+    def _schedule_scroll_position(self):
+        self.ui_scheduler.coalesce("scroll_position", self._update_scroll_position)
+
     def _update_scroll_position(self):
         try:
             top, bottom = self.chat_display.yview()
@@ -778,54 +1284,73 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
             else:
                 position_percent = int((top + (bottom - top) / 2) * 100)
                 position_text = f"{position_percent}%"
-            
+        except tk.TclError:
+            position_text = "--"
+        if position_text != self._last_scroll_text:
+            self._last_scroll_text = position_text
             self.scroll_position_label.config(text=position_text)
-        except:
-            self.scroll_position_label.config(text="--")
 
     def _on_font_size_change(self, event):
-        new_size = self.font_size_var.get()
-        self.chat_display.config(font=("Segoe UI", int(new_size)))
-        self._add_message_to_display("System", f"Chat font size set to {new_size}.", "system")
+        self._apply_font_size()
 
     def _apply_font_size(self):
         new_size = self.font_size_var.get()
-        self.chat_display.config(font=("Segoe UI", int(new_size)))
+        self.chat_font_size = int(new_size)
+        for session in self.conversation_sessions.values():
+            session.chat_display.config(font=("Segoe UI", self.chat_font_size))
         self._add_message_to_display("System", f"Chat font size set to {new_size}.", "system")
 
     # Utility methods (simplified versions)
     def _new_conversation(self):
-        if self.conversation_history and messagebox.askyesno("New Conversation", "Start a new conversation? Current conversation will be saved."):
-            if self.auto_save_var.get():
-                self._auto_save_conversation()
-            self._clear_chat()
-            self.current_session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            self.session_label.config(text=f"Session: {self.current_session_id}")
+        self._create_session_tab()
 
     def _regenerate_last_response(self):
         if not self.conversation_history:
             messagebox.showwarning("No Messages", "No conversation history to regenerate from.")
             return
+        if not self.api_client or self.request_scheduler.is_busy(self.current_session_id) or self.active_session.loading is not None:
+            return
         
-        if self.conversation_history and self.conversation_history[-1]["role"] == "assistant":
-            self.conversation_history.pop()
+        placeholder_id = None
+        if self.conversation_history[-1]["role"] == "assistant":
+            _, placeholder_id = self._pop_history()
         
         if self.conversation_history and self.conversation_history[-1]["role"] == "user":
-            last_user_message = self.conversation_history.pop()
-            self.user_input.delete("1.0", tk.END)
-            self.user_input.insert("1.0", last_user_message["content"])
-            self._on_send_message()
+            self._start_request(placeholder_id)
+        elif placeholder_id is not None:
+            self._delete_message(placeholder_id)
 
     def _clear_chat(self):
+        if self.active_session.loading is not None:
+            return
         if messagebox.askyesno("Confirm Clear", "Are you sure you want to clear the chat display and current conversation history?"):
-            self.chat_display.config(state=tk.NORMAL)
-            self.chat_display.delete("1.0", tk.END)
-            self.chat_display.config(state=tk.DISABLED)
-            self.conversation_history = []
-            self.last_ai_response_content = ""
-            self._update_message_count()
+            self.request_scheduler.cancel_pending(self.current_session_id)
+            self._reset_display()
+            self.active_session.clear()
+            self._schedule_message_count()
+            self._update_send_button()
             self._add_message_to_display("", "Chat cleared.", "system")
 
+    def _reset_display(self, session=None):
+        session = session or self.active_session
+        display = session.chat_display
+        display.config(state=tk.NORMAL)
+        display.delete("1.0", tk.END)
+        for marks in session.message_index.values():
+            display.mark_unset(*marks)
+        source_tags = [tag for tag in display.tag_names() if tag in self.source_urls]
+        for tag in source_tags:
+            del self.source_urls[tag]
+        if source_tags:
+            display.tag_delete(*source_tags)
+        display.config(state=tk.DISABLED)
+        session.message_index = {}
+        session.stream_backlog = {}
+        session.thinking_message_id = None
+        session.streaming_message_id = None
+        session.last_message_was_thinking = False
+        session.hidden_messages = 0
+
     def _copy_last_response(self):
         if self.last_ai_response_content:
             self.clipboard_clear()
@@ -835,6 +1360,7 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
             messagebox.showwarning("Nothing to Copy", "No AI response available to copy.")
 
     def _find_in_chat(self):
+        from tkinter import simpledialog
         search_term = simpledialog.askstring("Find in Chat", "Enter search term:")
         if search_term:
             content = self.chat_display.get("1.0", tk.END)
@@ -843,11 +1369,173 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
             else:
                 messagebox.showinfo("Not Found", f"'{search_term}' not found in chat.")
 
+    def _show_history_browser(self):
+        if self.conversation_store is None:
+            messagebox.showerror("Search Unavailable", "The conversation store could not be opened.")
+            return
+
+        browser = tk.Toplevel(self)
+        browser.title("Search All Conversations")
+        browser.geometry("900x500")
+        browser.configure(bg="#2B2B2B")
+        browser.transient(self)
+
+        search_frame = ttk.Frame(browser, style="TFrame", padding="10 10 10 5")
+        search_frame.pack(fill=tk.X)
+        ttk.Label(search_frame, text="Search:", style="TLabel").pack(side=tk.LEFT, padx=(0,5))
+        query_var = tk.StringVar()
+        query_entry = ttk.Entry(search_frame, textvariable=query_var, font=("Segoe UI", 10))
+        query_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        semantic_var = tk.BooleanVar(value=self.semantic_search)
+        ttk.Checkbutton(search_frame, text="By meaning", variable=semantic_var, style="Control.TCheckbutton",
+                        command=lambda: set_mode()).pack(side=tk.LEFT, padx=(10,0))
+        status_label = ttk.Label(search_frame, text="", style="TLabel")
+        status_label.pack(side=tk.RIGHT, padx=(10,0))
+
+        columns = ("title", "role", "snippet", "updated")
+        results = ttk.Treeview(browser, columns=columns, show="headings", selectmode="browse")
+        for column, heading, width in (("title", "Conversation", 220), ("role", "Role", 80),
+                                       ("snippet", "Match", 440), ("updated", "Updated", 140)):
+            results.heading(column, text=heading)
+            results.column(column, width=width, stretch=(column == "snippet"))
+        results.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0,10))
+        hits = {}
+
+        def run_search():
+            if not browser.winfo_exists():
+                return
+            query = query_var.get().strip()
+            started = time.perf_counter()
+            semantic = semantic_var.get() and self.semantic_index is not None
+            if query and semantic:
+                rows = self.semantic_index.search(query, 100)
+            elif query:
+                rows = self.conversation_store.search(query)
+            else:
+                rows = [{"session_id": row["id"], "seq": None, "role": f"{row['message_count']} msgs",
+                         "title": row["title"], "snippet": "", "updated_at": row["updated_at"]}
+                        for row in self.conversation_store.list_sessions()]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            results.delete(*results.get_children())
+            hits.clear()
+            for row in rows:
+                role = f"{row['role']} {row['score']:.2f}" if "score" in row else row["role"]
+                item = results.insert("", tk.END, values=(
+                    row["title"] or row["session_id"], role,
+                    " ".join((row["snippet"] or "").split()), (row["updated_at"] or "")[:16].replace("T", " ")))
+                hits[item] = (row["session_id"], row["seq"])
+            status_label.config(text=f"{len(rows)} {'by meaning ' if query and semantic else ''}results in {elapsed_ms:.0f} ms")
+
+        def set_mode():
+            self.semantic_search = semantic_var.get()
+            if not self.semantic_search:
+                run_search()
+                return
+            status_label.config(text="Indexing messages…")
+            self._update_semantic_index(indexing, indexed)
+
+        def indexing(count):
+            if browser.winfo_exists():
+                status_label.config(text=f"Indexing messages… {count:,}")
+
+        def indexed(error):
+            if not browser.winfo_exists():
+                return
+            if error and self.semantic_index is None:
+                semantic_var.set(False)
+                self.semantic_search = False
+            run_search()
+            if error:
+                status_label.config(text=error)
+
+        def open_selected(event=None):
+            selection = results.selection()
+            if selection and selection[0] in hits:
+                self._open_stored_session(*hits[selection[0]])
+
+        query_entry.bind("<KeyRelease>", lambda event: self.ui_scheduler.debounce(
+            "history_search", config.ADVANCED["ui_debounce_ms"], run_search))
+        query_entry.bind("<Return>", lambda event: run_search())
+        results.bind("<Double-1>", open_selected)
+        results.bind("<Return>", open_selected)
+        query_entry.focus_set()
+        if semantic_var.get():
+            set_mode()
+        else:
+            run_search()
+
+    def _update_semantic_index(self, progress, done):
+        """Index messages stored since the last update on a worker thread.
+
+        progress(count) and done(error or None) are called on the Tk thread.
+        """
+        if self.semantic_index is None:
+            from semantic_index import SemanticIndex
+            try:
+                self.semantic_index = SemanticIndex(self.conversation_store)
+            except ValueError as e:
+                done(f"Search by meaning unavailable: {e}")
+                return
+        index = self.semantic_index  # updates of one index run one at a time
+        results = queue.Queue()
+
+        def run():
+            try:
+                index.update(progress=lambda count: results.put(("progress", count)))
+                results.put(("done", None))
+            except Exception as e:
+                results.put(("done", f"Indexing messages failed: {e}"))
+
+        def poll():
+            try:
+                while True:
+                    kind, value = results.get_nowait()
+                    if kind == "progress":
+                        progress(value)
+                    else:
+                        done(value)
+                        return
+            except queue.Empty:
+                self.after(100, poll)
+
+        threading.Thread(target=run, name="pplx-semantic-index", daemon=True).start()
+        poll()
+
+    def _open_stored_session(self, session_id, seq=None):
+        """Open a stored conversation in a tab (or focus it) and jump to message seq."""
+        session = self.conversation_sessions.get(session_id)
+        if session is None:
+            chat_data = self.conversation_store.load_session(session_id)
+            if chat_data is None:
+                messagebox.showwarning("Not Found", f"Conversation '{session_id}' is no longer stored.")
+                return
+            session = self._open_session_tab(session_id)
+            self._populate_session(session, chat_data)
+            if session.session_id == session_id:
+                session.stored_history = list(session.conversation_history)
+            if chat_data.get("title"):
+                session.title = chat_data["title"]
+                self._update_tab_title(session)
+        else:
+            self._activate_session(session)
+
+        if seq is not None and seq < len(session.history_display_ids):
+            if session.history_display_ids[seq] is None:
+                self._show_earlier_messages(session, first=seq)
+            marks = session.message_index.get(session.history_display_ids[seq])
+            if marks:
+                display = session.chat_display
+                display.tag_remove("search_hit", "1.0", tk.END)
+                display.tag_add("search_hit", *marks)
+                display.see(marks[0])
+                self._schedule_scroll_position()
+
     # File operations (simplified)
     def _save_chat_history(self):
+        from tkinter import filedialog
         filepath = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("JSON files", "*.json"), ("Session archives", f"*{ARCHIVE_SUFFIX}"), ("All files", "*.*")],
             title="Save Chat As"
         )
         if not filepath:
@@ -862,145 +1550,295 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
                 "session_id": self.current_session_id,
                 "saved_at": datetime.now().isoformat()
             }
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(chat_data, f, indent=2)
+            if filepath.endswith(ARCHIVE_SUFFIX):
+                write_archive(filepath, chat_data)
+            else:
+                with open(filepath, "w", encoding="utf-8") as f:
+                    json.dump(chat_data, f, indent=2)
             self._add_message_to_display("", f"Chat saved to {os.path.basename(filepath)}", "system")
         except Exception as e:
             messagebox.showerror("Save Error", f"Failed to save chat: {e}")
 
     def _load_chat_history(self):
+        from tkinter import filedialog
         filepath = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=[("Saved chats", f"*.json *{ARCHIVE_SUFFIX}"), ("JSON files", "*.json"),
+                       ("Session archives", f"*{ARCHIVE_SUFFIX}"), ("All files", "*.*")],
             title="Load Chat From"
         )
         if not filepath:
             return
 
+        # The file is parsed on a worker thread and streamed in through the
+        # response queue; nothing is rendered until the tail is known.
+        session = self._open_session_tab("loaded_session")
+        session.loading = self._add_message_to_display(
+            "", f"📂 Loading {os.path.basename(filepath)}...", "system", session=session)
+        threading.Thread(target=self._read_chat_file, args=(filepath, session.session_id),
+                         name="pplx-load", daemon=True).start()
+
+    def _read_chat_file(self, filepath, session_id):
+        # Runs on a loader thread; only talks to the UI through response_queue.
+        batch, fields = [], {}
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                chat_data = json.load(f)
-            
-            self.conversation_history = chat_data.get("conversation_history", [])
-            system_prompt = chat_data.get("system_prompt", "You are a helpful AI assistant.")
-            model_name = chat_data.get("model")
-            template_name = chat_data.get("template", "General Assistant")
-            session_id = chat_data.get("session_id", "loaded_session")
-
-            self.system_prompt_text.delete("1.0", tk.END)
-            self.system_prompt_text.insert("1.0", system_prompt)
-            
-            if model_name and model_name in AVAILABLE_MODELS:
-                self.model_var.set(model_name)
-            
-            if template_name in CONVERSATION_TEMPLATES:
-                self.template_var.set(template_name)
-            
-            self.current_session_id = session_id
-            self.session_label.config(text=f"Session: {session_id}")
-            
-            self.chat_display.config(state=tk.NORMAL)
-            self.chat_display.delete("1.0", tk.END)
-            for message in self.conversation_history:
-                role = message.get("role")
-                content = message.get("content")
-                if role == "user":
-                    self._add_message_to_display("You", content, "user", show_timestamp=False)
-                elif role == "assistant":
-                    self._add_message_to_display("Assistant", content, "assistant", show_timestamp=False)
-                    self.last_ai_response_content = content
-            self.chat_display.config(state=tk.DISABLED)
-            self._add_message_to_display("", f"Chat loaded from {os.path.basename(filepath)}", "system")
-
+            events = iter_archive(filepath) if filepath.endswith(ARCHIVE_SUFFIX) else iter_chat_file(filepath)
+            for kind, key, value in events:
+                if kind == "message":
+                    batch.append(value)
+                    if len(batch) >= 500:
+                        self.response_queue.put({"load_messages": batch, "session_id": session_id})
+                        batch = []
+                elif kind == "field":
+                    fields[key] = value
+                else:
+                    if session_id not in self.conversation_sessions:
+                        return  # tab closed while loading
+                    if batch:
+                        self.response_queue.put({"load_messages": batch, "session_id": session_id})
+                        batch = []
+                    self.response_queue.put({"load_progress": value, "session_id": session_id})
+            if batch:
+                self.response_queue.put({"load_messages": batch, "session_id": session_id})
+            self.response_queue.put({"load_done": fields, "path": filepath, "session_id": session_id})
         except Exception as e:
-            messagebox.showerror("Load Error", f"Failed to load chat: {e}")
+            self.response_queue.put({"load_error": str(e), "path": filepath, "session_id": session_id})
+
+    def _on_load_message(self, session, message_data):
+        if "load_messages" in message_data:
+            session.extend_messages(message_data["load_messages"])
+            if session is self.active_session:
+                self._schedule_message_count()
+        elif "load_progress" in message_data:
+            done, total = message_data["load_progress"]
+            percent = done * 100 // total if total else 100
+            self._replace_message(session.loading, "", f"📂 Loading... {percent}% ({len(session.conversation_history):,} messages)",
+                                  "system", session=session)
+        elif "load_done" in message_data:
+            chat_data = dict(message_data["load_done"], conversation_history=session.conversation_history)
+            if chat_data.get("session_id"):
+                # Still loading, so the loaded history is not saved under the old id.
+                self._rename_session(session, chat_data["session_id"])
+            session.loading = None
+            self._populate_session(session, chat_data)
+            self._add_message_to_display("", f"Chat loaded from {os.path.basename(message_data['path'])}", "system", session=session)
+        else:
+            session.loading = None
+            session.clear()
+            self._reset_display(session)
+            self._add_message_to_display("System", f"Failed to load chat: {message_data['load_error']}", "error", session=session)
+
+    def _open_session_tab(self, session_id):
+        """Return a tab to load a conversation into.
+
+        The focused tab is reused (and renamed) while it is still empty;
+        otherwise a new tab is opened.
+        """
+        session = self.active_session
+        if (session.conversation_history or session.loading is not None
+                or self.request_scheduler.is_busy(session.session_id)):
+            return self._create_session_tab(session_id)
+        self._rename_session(session, session_id)
+        return session
+
+    def _rename_session(self, session, session_id):
+        old_id, old_journal = session.session_id, session.journal
+        # Replaces any save still pending under the old id, so that save is
+        # made here first and the stored rows then move with the tab.
+        save = self._save_job(session)
+        del self.conversation_sessions[session.session_id]
+        session.session_id = session.title = self._unique_session_id(session_id)
+        new_id = session.session_id
+
+        def retire():
+            if save is not None:
+                save()
+            # A journal the old id wrote is closed so it is not recovered as
+            # a duplicate tab.
+            if old_journal.started:
+                old_journal.mark_closed()
+            if self.conversation_store is not None and session.stored_history is not None:
+                try:
+                    self.conversation_store.rename_session(old_id, new_id)
+                except Exception as e:
+                    print(f"Renaming in conversation store failed: {e}")
+                    session.stored_history = None
+
+        self.persistence.submit(session, retire, delay=False)
+        session.journal = SessionJournal(session.session_id)
+        self.conversation_sessions[session.session_id] = session
+        if session is self.active_session:
+            self.session_label.config(text=f"Session: {session.session_id}")
+        self._update_tab_title(session)
+
+    def _populate_session(self, session, chat_data):
+        """Fill a tab from saved chat data (the Save Chat / auto-save layout)."""
+        session.system_prompt = chat_data.get("system_prompt", "You are a helpful AI assistant.")
+        model_name = chat_data.get("model")
+        if model_name and model_name in AVAILABLE_MODELS:
+            session.model = model_name
+        template_name = chat_data.get("template", "General Assistant")
+        if template_name in CONVERSATION_TEMPLATES:
+            session.template = template_name
+
+        session.conversation_history = chat_data.get("conversation_history", [])
+        for message in session.conversation_history if session.title == session.session_id else ():
+            content = message.get("content") or ""
+            if message.get("role") == "user" and content.strip():
+                session.title = content.splitlines()[0]
+                break
+        for message in reversed(session.conversation_history):
+            if message.get("role") == "assistant":
+                session.last_ai_response_content = message.get("content")
+                break
+        self._render_history(session)
+
+        if session is self.active_session:
+            # Reload the shared model/template/prompt widgets from the tab.
+            self._activate_session(session)
+        self._update_tab_title(session)
+
+    def _render_history(self, session, first=None):
+        """Render the history from index first on (default: the newest
+        render_window messages) behind a "show earlier" link."""
+        history = session.conversation_history
+        if first is None:
+            first = max(0, len(history) - config.ADVANCED.get("render_window", 200))
+        self._reset_display(session)
+        session.history_display_ids = [None] * first
+        session.hidden_messages = first
+        if first:
+            self._add_message_to_display(
+                "", f"⋯ {first:,} earlier messages not shown. Click to show more.", ("system", "show_earlier"), session=session)
+        for message in history[first:]:
+            role = message.get("role")
+            content = message.get("content")
+            display_id = None
+            if role == "user":
+                display_id = self._add_message_to_display("You", content, "user", show_timestamp=False, session=session)
+            elif role == "assistant":
+                display_id = self._add_message_to_display("Assistant", content, "assistant", show_timestamp=False, session=session)
+                if message.get("citations"):
+                    self._append_sources(session, display_id, message["citations"])
+            session.history_display_ids.append(display_id)
+
+    def _show_earlier_messages(self, session=None, first=None):
+        """Re-render with (by default) twice as many messages shown."""
+        session = session or self.active_session
+        if session.loading is not None or self.request_scheduler.is_busy(session.session_id):
+            return False
+        hidden = session.hidden_messages
+        if not hidden:
+            return False
+        if first is None:
+            shown = len(session.conversation_history) - hidden
+            first = max(0, hidden - max(shown, config.ADVANCED.get("render_window", 200)))
+        self._render_history(session, first)
+        return True
+
+    def _recover_sessions(self):
+        """Reopen conversations whose journal shows they were never closed."""
+        try:
+            recovered = recover_sessions()
+        except Exception as e:
+            print(f"Session recovery failed: {e}")
+            return
+        for chat_data in recovered:
+            session = self._create_session_tab(chat_data["session_id"], focus=False)
+            self._populate_session(session, chat_data)
+            # Start the reopened tab from a clean snapshot so the old journal
+            # is closed properly even if auto-save is later switched off.
+            self.persistence.submit(session, functools.partial(
+                session.journal.compact, list(session.conversation_history), self._session_meta(session)), delay=False)
+            self._add_message_to_display("", "♻️ Recovered unsaved conversation after an unexpected exit.", "system", session=session)
 
     def _export_as_text(self):
+        self._export_conversation("txt")
+
+    def _export_as_html(self):
+        self._export_conversation("html")
+
+    def _export_conversation(self, fmt):
         if not self.conversation_history:
             messagebox.showwarning("No Data", "No conversation to export.")
             return
         
+        label = EXPORT_FORMATS[fmt]
+        from tkinter import filedialog
         filepath = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
-            title="Export Chat as Text"
+            defaultextension=f".{fmt}",
+            filetypes=[(f"{label} files", f"*.{fmt}"), ("All files", "*.*")],
+            title=f"Export Chat as {label}"
         )
         if not filepath:
             return
 
+        session = self.active_session
+        meta = self._session_meta(session)
+        meta.update({"session_id": session.session_id, "title": session.title})
         try:
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(f"Perplexity AI Conversation Export\n")
-                f.write(f"Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Model: {self.model_var.get()}\n")
-                f.write("=" * 50 + "\n\n")
-                
-                for message in self.conversation_history:
-                    role = message.get("role", "").title()
-                    content = message.get("content", "")
-                    f.write(f"{role}: {content}\n\n")
-            
+            export_session(filepath, session.conversation_history, meta, fmt)
             messagebox.showinfo("Export Complete", f"Chat exported to {os.path.basename(filepath)}")
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export chat: {e}")
 
-    def _export_as_html(self):
-        if not self.conversation_history:
-            messagebox.showwarning("No Data", "No conversation to export.")
+    def _export_all_conversations(self, fmt):
+        if self.conversation_store is None:
+            messagebox.showerror("Export Unavailable", "The conversation store could not be opened.")
             return
-        
-        filepath = filedialog.asksaveasfilename(
-            defaultextension=".html",
-            filetypes=[("HTML files", "*.html"), ("All files", "*.*")],
-            title="Export Chat as HTML"
-        )
-        if not filepath:
+        from tkinter import filedialog
+        out_dir = filedialog.askdirectory(title=f"Export All Conversations as {EXPORT_FORMATS[fmt]}")
+        if not out_dir:
             return
 
-        try:
-            html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Perplexity AI Conversation</title>
-    <style>
-        body {{ font-family: 'Segoe UI', Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
-        .container {{ max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-        .header {{ border-bottom: 2px solid #007ACC; padding-bottom: 10px; margin-bottom: 20px; }}
-        .message {{ margin: 15px 0; padding: 10px; border-radius: 5px; }}
-        .user {{ background: #E3F2FD; border-left: 4px solid #2196F3; }}
-        .assistant {{ background: #F3E5F5; border-left: 4px solid #9C27B0; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>Perplexity AI Conversation</h1>
-            <p>Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            <p>Model: {self.model_var.get()}</p>
-        </div>"""
-            
-            for message in self.conversation_history:
-                role = message.get("role", "")
-                content = message.get("content", "").replace('\n', '<br>')
-                css_class = "user" if role == "user" else "assistant"
-                role_display = "You" if role == "user" else "Assistant"
-                
-                html_content += f"""
-        <div class="message {css_class}">
-            <strong>{role_display}:</strong><br>
-            {content}
-        </div>"""
-            
-            html_content += """
-    </div>
-</body>
-</html>"""
-            
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(html_content)
-            
-            messagebox.showinfo("Export Complete", f"Chat exported to {os.path.basename(filepath)}")
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export chat: {e}")
+        progress_window = tk.Toplevel(self)
+        progress_window.title("Exporting Conversations")
+        progress_window.geometry("420x110")
+        progress_window.configure(bg="#2B2B2B")
+        progress_window.transient(self)
+        status_label = ttk.Label(progress_window, text="Saving open conversations...", style="TLabel")
+        status_label.pack(fill=tk.X, padx=15, pady=(15, 5))
+        progress_bar = ttk.Progressbar(progress_window, mode="determinate")
+        progress_bar.pack(fill=tk.X, padx=15, pady=5)
+        updates = queue.Queue()
+
+        # Queue a save of every open tab so the store has the latest turns;
+        # the export thread waits for those writes before reading it.
+        for session in list(self.conversation_sessions.values()):
+            self._auto_save_conversation(session)
+
+        def run():
+            self.persistence.flush(timeout=30)
+            started = time.perf_counter()
+            try:
+                results = export_all(self.conversation_store.path, out_dir, fmt,
+                                     progress=lambda done, total, session_id, error: updates.put((done, total, error)))
+                updates.put(("done", len(results), time.perf_counter() - started))
+            except Exception as e:
+                updates.put(("failed", str(e), None))
+
+        def poll():
+            if not progress_window.winfo_exists():
+                return
+            failures = []
+            while not updates.empty():
+                first, second, third = updates.get_nowait()
+                if first == "done":
+                    status_label.config(text=f"✅ Exported {second} conversations to {os.path.basename(out_dir)} in {third:.1f}s")
+                    progress_bar.config(value=progress_bar["maximum"])
+                    return
+                if first == "failed":
+                    status_label.config(text=f"❌ Export failed: {second}")
+                    return
+                if third:
+                    failures.append(third)
+                progress_bar.config(maximum=second, value=first)
+                status_label.config(text=f"Exported {first} of {second} conversations...")
+            for error in failures:
+                print(f"Export failed for a session: {error}")
+            self.after(100, poll)
+
+        threading.Thread(target=run, name="pplx-export", daemon=True).start()
+        poll()
 
     # Settings and info dialogs
     def _show_settings(self):
@@ -1016,6 +1854,8 @@ Need help? Check the Help menu for keyboard shortcuts and tips."""
         auto_save_frame = ttk.Frame(settings_window, style="TFrame")
         auto_save_frame.pack(fill=tk.X, padx=20, pady=5)
         ttk.Checkbutton(auto_save_frame, text="Auto-save conversations", variable=self.auto_save_var, style="Control.TCheckbutton").pack(anchor=tk.W)
+        ttk.Checkbutton(auto_save_frame, text="Offer cached answers to near-duplicate questions",
+                        variable=self.semantic_cache_var, style="Control.TCheckbutton").pack(anchor=tk.W)
         
         theme_frame = ttk.Frame(settings_window, style="Content.TFrame")
         theme_frame.pack(fill=tk.X, padx=20, pady=10)
@@ -1033,7 +1873,7 @@ Author: Enhanced by AI Assistant
 Features:
 • Multiple conversation templates
 • Enhanced UI with dark theme
-• Export to text and HTML
+• Export to text, HTML, Markdown and JSONL
 • Conversation search
 • Auto-save functionality
 • API usage statistics
@@ -1043,15 +1883,21 @@ Features:
 Built with Python and Tkinter"""
         messagebox.showinfo("About", about_text)
 
+    def _open_api_docs(self):
+        import webbrowser
+        webbrowser.open("https://docs.perplexity.ai/")
+
     def _show_shortcuts(self):
         shortcuts_text = """Keyboard Shortcuts:
 
-Ctrl+N - New Conversation
+Ctrl+N - New Conversation (opens a tab)
+Ctrl+W - Close Conversation Tab
 Ctrl+S - Save Chat
 Ctrl+O - Load Chat
 Ctrl+E - Export as Text
 Ctrl+L - Clear Chat
 Ctrl+F - Find in Chat
+Ctrl+Shift+F - Search All Conversations
 Ctrl+C - Copy Last Response
 Ctrl+Enter - Send Message
 Shift+Enter - New Line in Input
@@ -1066,43 +1912,103 @@ Mouse:
             messagebox.showinfo("Word Count", "No conversation to analyze.")
             return
         
-        total_words = 0
-        user_words = 0
-        assistant_words = 0
-        
-        for message in self.conversation_history:
-            content = message.get("content", "")
-            words = len(content.split())
-            total_words += words
-            
-            if message.get("role") == "user":
-                user_words += words
-            elif message.get("role") == "assistant":
-                assistant_words += words
-        
-        stats = f"""Conversation Statistics:
-        
-Total Messages: {len(self.conversation_history)}
-Total Words: {total_words:,}
-Your Words: {user_words:,}
-Assistant Words: {assistant_words:,}
-
-Average Words per Message: {total_words / len(self.conversation_history):.1f}"""
-        messagebox.showinfo("Word Count", stats)
+        # Running totals kept by the session; nothing is rescanned here.
+        stats = self.active_session.stats
+        user, assistant = stats.role("user"), stats.role("assistant")
+        text = f"""Conversation Statistics:
+
+Total Messages: {stats.messages:,} ({user['messages']:,} yours, {assistant['messages']:,} assistant)
+Total Words: {stats.words:,}
+Your Words: {user['words']:,}
+Assistant Words: {assistant['words']:,}
+Characters: {stats.characters:,}
+Estimated Tokens: ~{stats.estimated_tokens:,} (~{user['tokens']:,} yours, ~{assistant['tokens']:,} assistant)
+
+Average Words per Message: {stats.words / stats.messages:.1f}"""
+        if stats.answered_turns:
+            usage = stats.usage
+            text += f"""
+
+API Usage ({stats.answered_turns:,} answers with usage data):
+Prompt Tokens: {usage['prompt_tokens']:,}
+Completion Tokens: {usage['completion_tokens']:,}
+Total Tokens: {usage['total_tokens']:,}
+Average Latency: {stats.average_latency_ms() / 1000:.2f}s (last {stats.last_latency_ms / 1000:.2f}s)"""
+        messagebox.showinfo("Word Count", text)
 
     def _show_api_stats(self):
         if self.api_client:
+            metrics = self.request_scheduler.metrics()
             stats = f"""API Usage Statistics:
             
 Requests Made: {self.api_client.request_count}
 Last Request: {self.api_client.last_request_time.strftime('%Y-%m-%d %H:%M:%S') if self.api_client.last_request_time else 'None'}
 Current Model: {self.model_var.get()}
-Stream Mode: {'Enabled' if self.stream_var.get() else 'Disabled'}"""
+Stream Mode: {'Enabled' if self.stream_var.get() else 'Disabled'}
+
+Request Queue:
+In Flight: {metrics['in_flight']} (pool size {metrics['max_workers']})
+Queued Prompts: {metrics['queue_depth']}
+Average Queue Wait: {metrics['avg_queue_wait']:.1f}s (max {metrics['max_queue_wait']:.1f}s)
+Average Pool Wait: {metrics['avg_pool_wait'] * 1000:.0f}ms"""
         else:
             stats = "API client not initialized. Please set your API key."
         
         messagebox.showinfo("API Statistics", stats)
 
+    def _show_usage_costs(self):
+        ledger = self.engine.ledger
+        if ledger is None:
+            messagebox.showerror("Usage Unavailable", "The usage ledger could not be opened.")
+            return
+        from usage_ledger import month_range
+        start, end = month_range()
+        today = datetime.now().strftime("%Y-%m-%d")
+        lines = [f"This month ({start} to {end}):"]
+        for model, totals in ledger.by_model(start, end).items():
+            lines.append(f"{model}: {totals['requests']:,} requests, {totals['total_tokens']:,} tokens, ${totals['cost']:,.4f}")
+        month = ledger.totals(None, start, end)
+        today_totals = ledger.totals(None, today, today)
+        lines += ["",
+                  f"Month Total: {month['requests']:,} requests, {month['total_tokens']:,} tokens, ${month['cost']:,.4f}",
+                  f"Today: {today_totals['requests']:,} requests, {today_totals['total_tokens']:,} tokens, ${today_totals['cost']:,.4f}"]
+        if month["estimated"]:
+            lines.append(f"({month['estimated']:,} answers this month had no reported usage; their tokens are estimated)")
+        messagebox.showinfo("Usage & Costs", "\n".join(lines))
+
+    def _export_usage_csv(self):
+        ledger = self.engine.ledger
+        if ledger is None:
+            messagebox.showerror("Export Unavailable", "The usage ledger could not be opened.")
+            return
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(title="Export Usage CSV", defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        results = queue.Queue()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                results.put((ledger.export_csv(path), time.perf_counter() - started, None))
+            except Exception as e:
+                results.put((0, 0, str(e)))
+
+        def poll():
+            try:
+                count, elapsed, error = results.get_nowait()
+            except queue.Empty:
+                self.after(100, poll)
+                return
+            if error:
+                messagebox.showerror("Export Failed", f"Could not export usage: {error}")
+            else:
+                messagebox.showinfo("Export Complete", f"Exported {count:,} usage entries to {os.path.basename(path)} in {elapsed:.1f}s")
+
+        threading.Thread(target=run, name="pplx-usage-export", daemon=True).start()
+        poll()
+
     def _validate_api_key(self):
         if not self.api_client:
             messagebox.showerror("No API Key", "Please set your API key first.")
@@ -1110,8 +2016,9 @@ Stream Mode: {'Enabled' if self.stream_var.get() else 'Disabled'}"""
         
         try:
             test_messages = [{"role": "user", "content": "Hello"}]
+            model = self.model_var.get()
             response = self.api_client.chat_completion(
-                model=self.model_var.get(),
+                model=config.DEFAULT_MODEL if model == config.AUTO_MODEL else model,
                 messages=test_messages,
                 max_tokens=1,
                 stream=False
@@ -1124,36 +2031,79 @@ Stream Mode: {'Enabled' if self.stream_var.get() else 'Disabled'}"""
             messagebox.showerror("API Key Invalid", f"API key validation failed: {str(e)}")
 
     # Auto-save and settings
-    def _auto_save_conversation(self):
-        if not self.conversation_history or not self.auto_save_var.get():
-            return
-        
-        try:
-            auto_save_dir = "auto_saves"
-            if not os.path.exists(auto_save_dir):
-                os.makedirs(auto_save_dir)
-            
-            filename = f"auto_save_{self.current_session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            filepath = os.path.join(auto_save_dir, filename)
-            
-            chat_data = {
-                "conversation_history": self.conversation_history,
-                "system_prompt": self.system_prompt_text.get("1.0", tk.END).strip(),
-                "model": self.model_var.get(),
-                "template": self.template_var.get(),
-                "session_id": self.current_session_id,
-                "auto_saved_at": datetime.now().isoformat()
-            }
-            
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(chat_data, f, indent=2)
-                
-        except Exception as e:
-            print(f"Auto-save failed: {e}")
+    def _auto_save_conversation(self, session=None):
+        session = session or self.active_session
+        save = self._save_job(session)
+        if save is not None:
+            self.persistence.submit(session, save)
+
+    def _save_job(self, session, close_journal=False):
+        """The session's auto-save as a persistence job, or None if it is not saved.
+
+        With close_journal the journal is compacted and marked closed
+        instead of synced.
+        """
+        if not session.conversation_history or not self.auto_save_var.get() or session.loading is not None:
+            # A chat still streaming in is saved once it has loaded, under its own id.
+            return None
+        # Snapshot on the Tk thread; the writer thread only sees these copies.
+        journal = session.journal
+        history = list(session.conversation_history)
+        meta = self._session_meta(session)
+        store_args = {
+            "session_id": session.session_id,
+            "title": session.title if session.title != session.session_id else None,
+            "params": dict(session.last_params),
+            "usage": dict(session.turn_usage),
+        }
+
+        def save():
+            try:
+                if close_journal:
+                    journal.close(history, meta)
+                else:
+                    journal.sync(history, meta)
+            except Exception as e:
+                print(f"Auto-save failed: {e}")
+            if self.conversation_store is not None:
+                try:
+                    self._store_session(session, history, meta, **store_args)
+                except Exception as e:
+                    print(f"Saving to conversation store failed: {e}")
+
+        return save
+
+    def _store_session(self, session, history, meta, session_id, title, params, usage):
+        # Runs on the persistence thread.
+        start = common_prefix(session.stored_history or [], history)
+        self.conversation_store.save_session(session_id, meta, params=params, title=title)
+        self.conversation_store.replace_messages(
+            session_id, start, history[start:], model=meta["model"],
+            usage={index: turn for index, turn in usage.items() if index >= start})
+        session.stored_history = history
+
+    def _session_meta(self, session):
+        if session is self.active_session:
+            self._store_session_settings(session)
+        return {
+            "system_prompt": session.system_prompt.strip(),
+            "model": session.model,
+            "template": session.template,
+        }
+
+    def _close_session_journal(self, session):
+        journal = session.journal
+        close = self._save_job(session, close_journal=True)
+        if close is None:
+            close = lambda: journal.started and journal.mark_closed()
+        # Same key as the session's auto-save: a pending save is replaced by
+        # the close, which writes the same snapshot to the store as well.
+        self.persistence.submit(session, close, delay=False)
 
     def _schedule_auto_save(self):
-        if self.auto_save_var.get() and self.conversation_history:
-            self._auto_save_conversation()
+        if self.auto_save_var.get():
+            for session in list(self.conversation_sessions.values()):
+                self._auto_save_conversation(session)
         self.after(300000, self._schedule_auto_save)  # 5 minutes
 
     def _load_settings(self):
@@ -1161,21 +2111,27 @@ Stream Mode: {'Enabled' if self.stream_var.get() else 'Disabled'}"""
             with open("settings.json", "r") as f:
                 settings = json.load(f)
                 self.auto_save_var.set(settings.get("auto_save", True))
+                self.semantic_cache_var.set(settings.get("semantic_cache", self.semantic_cache_var.get()))
         except FileNotFoundError:
             pass
 
     def _save_settings(self):
-        try:
-            settings = {"auto_save": self.auto_save_var.get()}
-            with open("settings.json", "w") as f:
-                json.dump(settings, f, indent=2)
-        except Exception as e:
-            print(f"Failed to save settings: {e}")
+        settings = {"auto_save": self.auto_save_var.get(), "semantic_cache": self.semantic_cache_var.get()}
+        self.persistence.submit("settings", lambda: write_json_atomic("settings.json", settings, indent=2))
 
     def on_closing(self):
-        if self.auto_save_var.get() and self.conversation_history:
-            self._auto_save_conversation()
+        for session in self.conversation_sessions.values():
+            self._close_session_journal(session)
         self._save_settings()
+        self.ui_scheduler.cancel_all()
+        self.request_scheduler.shutdown(wait=False)
+        # The only place the UI waits on disk: everything queued is written
+        # before the window goes away.
+        self.persistence.shutdown()
+        if self.conversation_store is not None:
+            self.conversation_store.close()
+        if self.engine.ledger is not None:
+            self.engine.ledger.close()
         self.destroy()
 
 if __name__ == "__main__":
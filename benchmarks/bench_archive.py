@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Session archive benchmark for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Compares a Save Chat JSON file with the same session as a .pplxa archive
+(zlib, and zstd when "zstandard" is installed): file size, time to write,
+time to read everything, and the operations the index makes cheap:
+listing the header, reading the last 50 messages and jumping to message N.
+
+    python benchmarks/bench_archive.py [--messages 20000] [--chars 1500]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_archive import SessionArchive, read_header, write_archive, zstandard  # noqa: E402
+
+WORDS = ("the model answer source python request stream token latency context window "
+         "search result citation summary research code function error value list data").split()
+
+
+def make_chat(messages, chars, seed=1):
+    rng = random.Random(seed)
+    history = []
+    for i in range(messages):
+        role = "user" if i % 2 == 0 else "assistant"
+        length = chars // 8 if role == "user" else chars
+        words, size = [], 0
+        while size < length:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        history.append({"role": role, "content": " ".join(words)})
+    return {
+        "conversation_history": history,
+        "system_prompt": "You are a helpful AI assistant.",
+        "model": "sonar",
+        "template": "General Assistant",
+        "session_id": "bench_session",
+        "saved_at": "2024-01-01T00:00:00",
+    }
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--chars", type=int, default=1500, help="approximate characters per answer")
+    args = parser.parse_args()
+
+    chat = make_chat(args.messages, args.chars)
+    middle = args.messages // 2
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "chat.json")
+
+        def write_json():
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(chat, f, indent=2)
+
+        def read_json():
+            with open(json_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        write_time, _ = timed(write_json)
+        load_time, _ = timed(read_json)
+        # Every operation on the JSON file needs a full parse first.
+        rows.append(("json (Save Chat)", os.path.getsize(json_path), write_time, load_time, load_time, load_time, load_time))
+
+        codecs = ["zlib"] + (["zstd"] if zstandard is not None else [])
+        for codec in codecs:
+            path = os.path.join(directory, f"chat_{codec}.pplxa")
+            write_time, _ = timed(lambda: write_archive(path, chat, codec=codec))
+
+            def read_all():
+                with SessionArchive(path) as archive:
+                    return archive.to_chat_data()
+
+            def tail():
+                with SessionArchive(path) as archive:
+                    return archive.tail(50)
+
+            def jump():
+                with SessionArchive(path) as archive:
+                    return archive.message(middle)
+
+            load_time, loaded = timed(read_all)
+            assert loaded["conversation_history"] == chat["conversation_history"]
+            header_time, _ = timed(lambda: read_header(path), repeat=10)
+            tail_time, _ = timed(tail, repeat=10)
+            jump_time, _ = timed(jump, repeat=10)
+            rows.append((f"pplxa ({codec})", os.path.getsize(path), write_time, load_time, header_time, tail_time, jump_time))
+
+    print(f"📊 {args.messages:,} messages, ~{args.chars} chars per answer\n")
+    print(f"{'format':<18}{'size':>14}{'write':>10}{'read all':>10}{'header':>10}{'last 50':>10}{'msg N':>10}")
+    json_size = rows[0][1]
+    for name, size, *times in rows:
+        cells = "".join(f"{t * 1000:>8.1f}ms" for t in times)
+        print(f"{name:<18}{size:>11,} B{cells}   ({size / json_size:.1%} of JSON)")
+    if zstandard is None:
+        print("\nℹ️  Install 'zstandard' to include zstd frames in the comparison.")
+
+
+if __name__ == "__main__":
+    main()
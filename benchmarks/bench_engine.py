@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Chat engine benchmark for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Times the headless request path without a network or a display, using a
+fake API client that replays a canned stream:
+
+- building the request (system prompt + history) for long conversations
+- streaming an answer of many chunks through ChatEngine.run()
+- complete ask() round trips, which also record the answer and usage
+
+    python benchmarks/bench_engine.py [--chunks 2000] [--history 10000] [--turns 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_engine import ChatEngine  # noqa: E402
+
+
+class ReplayClient:
+    """Stands in for PerplexityAPI: every request streams the same chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = [{"choices": [{"delta": {"content": f"token{i} "}}]} for i in range(chunks)]
+
+    def chat_completion(self, model, messages, stream=False, **params):
+        if not stream:
+            return {"choices": [{"message": {"content": "".join(c["choices"][0]["delta"]["content"] for c in self.chunks)}}],
+                    "usage": {"prompt_tokens": len(messages), "completion_tokens": len(self.chunks)}}
+        return iter(self.chunks + [{"done": True}])
+
+
+def timed(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks per streamed answer")
+    parser.add_argument("--history", type=int, default=10000, help="messages in the long conversation")
+    parser.add_argument("--turns", type=int, default=500, help="ask() round trips")
+    args = parser.parse_args()
+
+    engine = ChatEngine(api_client=ReplayClient(args.chunks))
+    session = engine.open_session("bench", "sonar", system_prompt="You are a helpful AI assistant.")
+    for i in range(args.history):
+        session.append_message({"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"})
+
+    build_time = timed(lambda: engine.build_request(session))
+    spec = engine.build_request(session)
+    stream_time = timed(lambda: engine.run(spec, emit=lambda event: None))
+
+    engine.api_client = ReplayClient(20)
+    short = engine.open_session("turns", "sonar")
+
+    def turns():
+        short.clear()
+        for i in range(args.turns):
+            engine.ask(short, f"question {i}")
+
+    ask_time = timed(turns, repeat=3)
+
+    print(f"📊 Chat engine hot path ({args.history:,}-message history, {args.chunks:,}-chunk answers)\n")
+    print(f"{'build request':<24}{build_time * 1000:>10.2f}ms")
+    print(f"{'stream one answer':<24}{stream_time * 1000:>10.2f}ms   ({args.chunks / stream_time:,.0f} chunks/sec)")
+    print(f"{'ask() round trip':<24}{ask_time / args.turns * 1000:>10.3f}ms   ({args.turns / ask_time:,.0f} turns/sec)")
+    engine.scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
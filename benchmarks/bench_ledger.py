@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Usage ledger benchmark for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Fills a throwaway ledger with a year of synthetic completions across the
+priced models, then times:
+
+- single record() calls (what each answered request pays)
+- a monthly spend query for one model, served from the daily rollups
+- exporting every entry to CSV
+
+    python benchmarks/bench_ledger.py [--entries 2000000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from usage_ledger import UsageLedger  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=2_000_000, help="synthetic completions in the ledger")
+    args = parser.parse_args()
+
+    models = [model for model in config.MODEL_PRICES if model != "default"]
+    year = 365 * 86400
+    start_ts = time.time() - year
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = UsageLedger(os.path.join(directory, "usage.db"))
+        started = time.perf_counter()
+        batch = 100_000
+        for offset in range(0, args.entries, batch):
+            ledger.record_many({"model": models[i % len(models)], "latency_ms": 500 + i % 3000,
+                                "usage": {"prompt_tokens": 200 + i % 4000, "completion_tokens": 50 + i % 900},
+                                "session_id": f"s{i % 5000}", "source": "bench",
+                                "timestamp": start_ts + i * year / args.entries}
+                               for i in range(offset, min(offset + batch, args.entries)))
+        fill_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(200):
+            ledger.record("sonar-pro", {"prompt_tokens": 900, "completion_tokens": 300}, 1200, "bench", "bench")
+        record_time = (time.perf_counter() - started) / 200
+
+        started = time.perf_counter()
+        month = ledger.month("sonar-pro")
+        query_time = time.perf_counter() - started
+
+        out = os.path.join(directory, "usage.csv")
+        started = time.perf_counter()
+        exported = ledger.export_csv(out)
+        export_time = time.perf_counter() - started
+        size_mb = os.path.getsize(out) / 1e6
+        ledger.close()
+
+    print(f"📊 Usage ledger ({args.entries:,} entries)\n")
+    print(f"{'bulk fill':<24}{fill_time:>10.2f}s    ({args.entries / fill_time:,.0f} entries/sec)")
+    print(f"{'record()':<24}{record_time * 1000:>10.3f}ms")
+    print(f"{'month on sonar-pro':<24}{query_time * 1000:>10.3f}ms   ({month['requests']:,} requests, ${month['cost']:,.2f})")
+    print(f"{'CSV export':<24}{export_time:>10.2f}s    ({exported / export_time:,.0f} rows/sec, {size_mb:,.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Semantic index benchmark for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Fills a throwaway conversation store with synthetic messages, then times:
+
+- indexing every message from scratch (what the first search pays)
+- an incremental update after one more conversation
+- exact top-10 queries (one matrix-vector product over the whole index)
+- the same queries once the index is clustered (IVF), and how many of
+  the exact top 10 they still find
+
+    python benchmarks/bench_semantic_index.py [--messages 200000] [--nprobe 32]
+
+Needs numpy.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore  # noqa: E402
+from semantic_index import SemanticIndex, numpy  # noqa: E402
+
+TOPICS = [
+    "sqlite database transaction index query insert performance",
+    "python list dictionary generator comprehension iterator",
+    "bread recipe flour yeast oven bake dough butter",
+    "france paris capital history revolution museum",
+    "marathon training running pace recovery injury",
+    "tax return deduction income invoice accountant",
+    "garden tomato soil compost watering seedlings",
+    "javascript promise async await fetch browser",
+    "mortgage interest rate loan repayment bank",
+    "guitar chord scale practice strumming tuning",
+]
+FILLER = "please explain detail example quickly better simple best way today again more".split()
+
+
+def synthetic_message(rng):
+    words = TOPICS[rng.randrange(len(TOPICS))].split()
+    return " ".join(rng.choice(words if rng.random() < 0.7 else FILLER) for _ in range(rng.randint(8, 60)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000, help="synthetic messages in the store")
+    parser.add_argument("--nprobe", type=int, default=32, help="clusters searched per clustered query")
+    args = parser.parse_args()
+    if numpy is None:
+        print("❌ The semantic index needs numpy.")
+        return 1
+
+    rng = random.Random(0)
+    queries = [synthetic_message(rng)[:60] for _ in range(50)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ConversationStore(os.path.join(directory, "conversations.db"))
+        per_session = 20
+        store.bulk_import({"session_id": f"s{n}", "model": "sonar",
+                           "conversation_history": [{"role": "user", "content": synthetic_message(rng)}
+                                                    for _ in range(per_session)]}
+                          for n in range(args.messages // per_session))
+        index = SemanticIndex(store, os.path.join(directory, "index"), ivf_rows=0, nprobe=args.nprobe)
+
+        started = time.perf_counter()
+        indexed = index.update(batch_size=5000)
+        build_time = time.perf_counter() - started
+
+        store.import_session({"session_id": "new", "model": "sonar",
+                              "conversation_history": [{"role": "user", "content": synthetic_message(rng)}
+                                                       for _ in range(per_session)]})
+        started = time.perf_counter()
+        index.update()
+        update_time = time.perf_counter() - started
+
+        def timed():
+            results = []
+            started = time.perf_counter()
+            for query in queries:
+                results.append({(row["session_id"], row["seq"]) for row in index.search(query, 10)})
+            return results, (time.perf_counter() - started) / len(queries)
+
+        exact, exact_time = timed()
+        started = time.perf_counter()
+        index.build_ivf()
+        ivf_time = time.perf_counter() - started
+        clustered, clustered_time = timed()
+        recall = sum(len(a & b) for a, b in zip(exact, clustered)) / max(1, sum(len(a) for a in exact))
+        store.close()
+
+    lists = len(index.ivf["centroids"])
+    print(f"📊 Semantic index ({indexed:,} messages, dim {index.vectorizer.dim})\n")
+    print(f"{'initial indexing':<24}{build_time:>10.2f}s    ({indexed / build_time:,.0f} messages/sec)")
+    print(f"{'update (+20 messages)':<24}{update_time * 1000:>10.1f}ms")
+    print(f"{'exact top-10':<24}{exact_time * 1000:>10.1f}ms")
+    print(f"{'clustering':<24}{ivf_time:>10.2f}s    ({lists} clusters)")
+    print(f"{'clustered top-10':<24}{clustered_time * 1000:>10.1f}ms   (nprobe {args.nprobe}, recall {recall:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Measures, in fresh interpreter processes:
+
+- import time of App1 (the modules loaded before any window exists)
+- time from the start of that import until the main window is mapped and
+  has processed its first round of events (first interactive frame)
+- time until the deferred second half of startup (_finish_startup) is done
+
+Each run happens in an empty temporary directory so no saved settings,
+auto-saves or conversation database affect the numbers.  The first run
+only warms the bytecode cache and is not counted.  The frame timings need
+a display; without one only the import time is reported.
+
+    python benchmarks/bench_startup.py [--runs 7] [--target-ms 300]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import App1
+print(json.dumps({"import_ms": (time.perf_counter() - start) * 1000,
+                  "requests_loaded": "requests" in sys.modules}))
+"""
+
+FRAME_PROBE = """
+import json, time
+start = time.perf_counter()
+import App1
+imported = time.perf_counter()
+app = App1.PerplexityGUI()
+while not app.winfo_viewable():
+    app.update()
+app.update()
+first_frame = time.perf_counter()
+while not app.startup_finished:
+    app.update()
+finished = time.perf_counter()
+app.on_closing()
+print(json.dumps({"import_ms": (imported - start) * 1000,
+                  "first_frame_ms": (first_frame - start) * 1000,
+                  "startup_done_ms": (finished - start) * 1000}))
+"""
+
+
+def run_probe(code, directory):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    # Measure with cached bytecode, as an installed copy would run.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run([sys.executable, "-c", code], cwd=directory, env=env,
+                            capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(code, runs):
+    samples = []
+    for n in range(runs + 1):
+        with tempfile.TemporaryDirectory() as directory:
+            sample = run_probe(code, directory)
+        if n:  # the first run compiles bytecode
+            samples.append(sample)
+    return samples
+
+
+def median(samples, key):
+    return statistics.median(sample[key] for sample in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--target-ms", type=float, default=300.0, help="first-frame budget (default: %(default)s)")
+    args = parser.parse_args()
+
+    samples = measure(IMPORT_PROBE, args.runs)
+    print(f"📊 Startup, median of {args.runs} runs\n")
+    print(f"{'import App1':<28}{median(samples, 'import_ms'):>8.1f}ms")
+    if any(sample["requests_loaded"] for sample in samples):
+        print("⚠️  requests was imported at startup")
+
+    try:
+        samples = measure(FRAME_PROBE, args.runs)
+    except RuntimeError as e:
+        print(f"\nℹ️  Skipping window timings (no display?): {e}")
+        return 0
+    first_frame = median(samples, "first_frame_ms")
+    print(f"{'first interactive frame':<28}{first_frame:>8.1f}ms")
+    print(f"{'deferred startup finished':<28}{median(samples, 'startup_done_ms'):>8.1f}ms")
+    verdict = "✅ within" if first_frame <= args.target_ms else "❌ over"
+    print(f"\n{verdict} the {args.target_ms:.0f} ms first-frame target")
+    return 0 if first_frame <= args.target_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Load test for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Simulates many users chatting at once against a local stand-in for the
+Perplexity API, to find how many concurrent sessions one host (or one
+local proxy) sustains before latency climbs.  No API key is used and
+nothing is sent to Perplexity.
+
+The stand-in runs in a child process, so the CPU and memory reported are
+those of the client side only.  It answers every request after a
+simulated time to first token (longer for longer prompts), then streams
+the answer at a fixed token rate, or returns it whole.
+
+Each point of the run is a number of users (and, optionally, an arrival
+rate).  Without --rate, every user sends its next message as soon as the
+last one is answered (closed loop).  With --rate, messages arrive at
+that average rate whatever the state of earlier ones, and --users is the
+most that are in flight at once; a message waiting for a free user
+counts that wait in its latency (open loop).
+
+Requests are sent by the chosen driver:
+
+    client   PerplexityAPI.chat_completion(), called by each user's thread
+    engine   ChatEngine.submit() onto its RequestScheduler, as the GUI and
+             batch jobs do; --workers is the scheduler's pool size
+
+Each point reports throughput, time to first token (TTFT) and total
+latency (p50/p99), errors by kind, and CPU and resident memory sampled
+every second.  Several points make a saturation curve.
+
+    python benchmarks/load_test.py                           users 1,2,4,8,16,32
+    python benchmarks/load_test.py --users 64 --rate 5,10,20,40 --duration 20
+    python benchmarks/load_test.py --driver engine --workers 4 --users 4,8,16
+    python benchmarks/load_test.py --via-proxy --users 8,16,32   through a local proxy_server
+    python benchmarks/load_test.py --target http://127.0.0.1:8765/v1   an already running server
+    python benchmarks/load_test.py --serve --port 9000         only run the stand-in
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_engine import ChatEngine  # noqa: E402
+from perplexity_api import PerplexityAPI  # noqa: E402
+from request_scheduler import RequestScheduler  # noqa: E402
+
+WORDS = ("latency throughput request model answer stream token socket thread queue cache proxy "
+         "session history prompt server client engine worker deadline timeout").split()
+
+
+# --- Stand-in API server ---
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        options = self.server.options
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": "not found"}})
+        rng = random.Random()
+        if rng.random() < options.error_rate:
+            return self._send(500, {"error": {"message": "injected failure"}})
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", ())) * 4 // 3
+        tokens = min(body.get("max_tokens") or options.answer_tokens, options.answer_tokens)
+        time.sleep(options.ttft * rng.uniform(0.5, 1.5) + prompt_tokens / options.prefill_rate)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens}
+        if not body.get("stream"):
+            time.sleep(tokens / options.token_rate)
+            return self._send(200, {"model": body.get("model"), "usage": usage,
+                                    "choices": [{"message": {"role": "assistant", "content": "token " * tokens},
+                                                 "finish_reason": "stop"}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        per_chunk = 4
+        for sent in range(0, tokens, per_chunk):
+            count = min(per_chunk, tokens - sent)
+            chunk = {"model": body.get("model"), "choices": [{"delta": {"content": "token " * count}}]}
+            if sent + count >= tokens:
+                chunk["usage"], chunk["choices"][0]["finish_reason"] = usage, "stop"
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(count / options.token_rate)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections between points is expected.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(options):
+    """Run the stand-in until interrupted; its URL is the first line printed."""
+    httpd = StandInServer(("127.0.0.1", options.port), StandInHandler)
+    httpd.options = options
+    print(f"http://127.0.0.1:{httpd.server_address[1]}", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+    return 0
+
+
+def start_stand_in(options):
+    """Start the stand-in in a child process; returns (process, base URL)."""
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", "0",
+               "--ttft", str(options.ttft), "--token-rate", str(options.token_rate),
+               "--prefill-rate", str(options.prefill_rate), "--answer-tokens", str(options.answer_tokens),
+               "--error-rate", str(options.error_rate)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = process.stdout.readline().strip()
+    if not url:
+        process.kill()
+        raise RuntimeError("the stand-in server did not start")
+    return process, url
+
+
+# --- Measurement ---
+
+def _rss_bytes():
+    """Resident memory of this process, or its peak where the current value can't be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ResourceSampler:
+    """Samples CPU use (percent of one core) and RSS every interval seconds on a background thread."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.samples = []  # (seconds since start, cpu percent, rss bytes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pplx-load-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        started = last_wall = time.monotonic()
+        last_cpu = time.process_time()
+        while not self._stop.wait(self.interval):
+            wall, cpu = time.monotonic(), time.process_time()
+            self.samples.append((round(wall - started, 1), 100 * (cpu - last_cpu) / (wall - last_wall), _rss_bytes()))
+            last_wall, last_cpu = wall, cpu
+
+
+def percentile(values, p):
+    """The p-th percentile (nearest rank) of values, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+
+class Workload:
+    """Draws prompts of the configured sizes and decides which requests stream."""
+
+    def __init__(self, sizes, stream_ratio):
+        self.sizes = [size for size, _ in sizes]
+        self.weights = [weight for _, weight in sizes]
+        self.stream_ratio = stream_ratio
+
+    def next(self, rng):
+        words = rng.choices(self.sizes, self.weights)[0]
+        return " ".join(rng.choice(WORDS) for _ in range(words)), rng.random() < self.stream_ratio
+
+
+def parse_sizes(text):
+    """"20:6,200:3,2000:1" -> [(20, 6.0), (200, 3.0), (2000, 1.0)] (prompt words: weight)."""
+    sizes = []
+    for part in text.split(","):
+        words, _, weight = part.partition(":")
+        sizes.append((int(words), float(weight or 1)))
+    return sizes
+
+
+def parse_list(text, kind=int):
+    return [kind(part) for part in text.split(",") if part.strip()]
+
+
+# --- Drivers ---
+
+class ClientDriver:
+    """Calls PerplexityAPI.chat_completion() in the caller's thread."""
+
+    def __init__(self, url, model, max_tokens, users, workers=None):
+        self.api = PerplexityAPI("load-test", base_url=url, pool_size=users)
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def request(self, user, prompt, stream):
+        """(ttft, total, error) in seconds for one request; error is None or (kind, message)."""
+        started = time.monotonic()
+        messages = [{"role": "user", "content": prompt}]
+        try:
+            if not stream:
+                self.api.chat_completion(self.model, messages, max_tokens=self.max_tokens)
+                total = time.monotonic() - started
+                return total, total, None
+            ttft = None
+            for chunk in self.api.chat_completion(self.model, messages, stream=True, max_tokens=self.max_tokens):
+                if "error" in chunk:
+                    return ttft, time.monotonic() - started, (chunk.get("timeout") or "stream error", chunk["error"])
+                if ttft is None and chunk.get("choices"):
+                    ttft = time.monotonic() - started
+            return ttft, time.monotonic() - started, None
+        except Exception as e:
+            return None, time.monotonic() - started, (_error_kind(str(e), type(e).__name__), str(e))
+
+    def close(self):
+        pass
+
+
+class EngineDriver:
+    """Submits each user's messages through ChatEngine.submit() and waits for the final event."""
+
+    def __init__(self, url, model, max_tokens, users, workers=None):
+        self.engine = ChatEngine(api_client=PerplexityAPI("load-test", base_url=url, pool_size=users),
+                                 scheduler=RequestScheduler(max_workers=workers))
+        self.engine.subscribe(self._on_event)
+        self.params = {"max_tokens": max_tokens}
+        self.model = model
+        self._waiting = {}  # session id -> (first chunk list, final event list, threading.Event)
+
+    def _on_event(self, event):
+        waiting = self._waiting.get(event["session_id"])
+        if waiting is None:
+            return
+        first, final, done = waiting
+        if "stream_chunk" in event:
+            if not first:
+                first.append(time.monotonic())
+        else:
+            final.append(event)
+            done.set()
+
+    def request(self, user, prompt, stream):
+        session_id = f"user-{user}"
+        session = self.engine.sessions.get(session_id) or self.engine.open_session(session_id, self.model)
+        session.conversation_history = [{"role": "user", "content": prompt}]
+        first, final, done = [], [], threading.Event()
+        self._waiting[session_id] = (first, final, done)
+        started = time.monotonic()
+        try:
+            self.engine.submit(session, session.settings(self.params, stream=stream))
+            done.wait()
+        finally:
+            self.engine.scheduler.finish(session_id)
+            self._waiting.pop(session_id, None)
+        total = time.monotonic() - started
+        event = final[0]
+        if "error" in event:
+            return None, total, (event.get("timeout") or _error_kind(event["error"], "error"), event["error"])
+        return (first[0] - started if first else total), total, None
+
+    def close(self):
+        self.engine.scheduler.shutdown()
+
+
+DRIVERS = {"client": ClientDriver, "engine": EngineDriver}
+
+
+def _error_kind(message, default):
+    """"HTTP 503" for an error message naming an HTTP status, else default."""
+    status = re.search(r"status (\d{3})", message)
+    return f"HTTP {status.group(1)}" if status else default
+
+
+# --- Running a point ---
+
+def run_point(driver, workload, users, rate, duration, warmup, seed):
+    """Load the target with users (at rate arrivals/s, or closed loop) for duration seconds; returns the results."""
+    results = []  # (arrival, ttft, total, error kind, streamed) for every request
+    examples = {}  # error kind -> its first message
+    lock = threading.Lock()
+    started = time.monotonic()
+    measure_from, stop_at = started + warmup, started + warmup + duration
+
+    def one(user, rng, arrival):
+        prompt, stream = workload.next(rng)
+        ttft, total, error = driver.request(user, prompt, stream)
+        waited = time.monotonic() - total - arrival  # time spent waiting for a free user (open loop)
+        with lock:
+            if error is not None and arrival >= measure_from:
+                examples.setdefault(error[0], error[1])
+            results.append((arrival, ttft and ttft + waited, total + waited, error and error[0], stream))
+
+    sampler = ResourceSampler().start()
+    if rate is None:
+        def user_loop(user):
+            rng = random.Random(seed * 1000 + user)
+            while time.monotonic() < stop_at:
+                one(user, rng, time.monotonic())
+
+        threads = [threading.Thread(target=user_loop, args=(user,), name=f"pplx-load-{user}", daemon=True)
+                   for user in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        rng = random.Random(seed)
+        free = list(range(users))
+        free_lock = threading.Lock()
+
+        def task(arrival, task_seed):
+            with free_lock:
+                user = free.pop()
+            try:
+                one(user, random.Random(task_seed), arrival)
+            finally:
+                with free_lock:
+                    free.append(user)
+
+        pool = ThreadPoolExecutor(max_workers=users, thread_name_prefix="pplx-load")
+        arrivals = []
+        arrival = time.monotonic()
+        while arrival < stop_at:
+            arrival += rng.expovariate(rate)
+            time.sleep(max(0.0, arrival - time.monotonic()))
+            arrivals.append((arrival, pool.submit(task, arrival, rng.random())))
+        # Messages still waiting for a free user when the time is up were never served.
+        pool.shutdown(cancel_futures=True)
+        results.extend((arrival, None, None, "unserved", False) for arrival, future in arrivals if future.cancelled())
+    samples = [sample for sample in sampler.stop() if warmup <= sample[0] <= warmup + duration]
+    point = summarize(results, measure_from, stop_at, samples, users, rate)
+    point["examples"] = examples
+    return point
+
+
+def summarize(results, measure_from, stop_at, samples, users, rate):
+    """Throughput, latency percentiles, errors and resources for one point.
+
+    Throughput counts answers completed inside the measured window;
+    latencies and errors are those of requests that arrived inside it.
+    """
+    completed = sum(1 for r in results if r[3] is None and measure_from <= r[0] + r[2] <= stop_at)
+    results = [r for r in results if measure_from <= r[0] <= stop_at]
+    ok = [r for r in results if r[3] is None]
+    ttfts = [r[1] for r in ok if r[4] and r[1] is not None]
+    totals = [r[2] for r in ok]
+    cpu = [sample[1] for sample in samples]
+    rss = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        "users": users, "rate": rate, "requests": len(results), "ok": len(ok),
+        "streamed": sum(1 for r in results if r[4]),
+        "throughput": completed / (stop_at - measure_from),
+        "ttft_p50": percentile(ttfts, 50), "ttft_p99": percentile(ttfts, 99),
+        "total_p50": percentile(totals, 50), "total_p99": percentile(totals, 99),
+        "errors": dict(Counter(r[3] for r in results if r[3] is not None)),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "cpu_avg": sum(cpu) / len(cpu) if cpu else None, "cpu_max": max(cpu) if cpu else None,
+        "rss_max": max(rss) if rss else None,
+        "timeline": [{"t": t, "cpu": round(c, 1), "rss": r} for t, c, r in samples],
+    }
+
+
+def knee(points):
+    """The last point before more load starts failing requests, or adds under 10% throughput
+    but 50% more p99 latency; None if no point does."""
+    for before, after in zip(points, points[1:]):
+        if after["error_rate"] > before["error_rate"] + 0.05:
+            return before
+        if not (before["total_p99"] and after["total_p99"]):
+            continue
+        if after["throughput"] < 1.1 * before["throughput"] and after["total_p99"] > 1.5 * before["total_p99"]:
+            return before
+    return None
+
+
+def _where(point):
+    return f"{point['users']} users" + ("" if point["rate"] is None else f" at {point['rate']}/s")
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:,.0f}"
+
+
+def report(points, label):
+    print(f"📊 Load test ({label})\n")
+    print(f"{'users':>6}{'rate/s':>8}{'req/s':>8}{'TTFT p50':>10}{'p99':>8}{'total p50':>11}{'p99':>8}"
+          f"{'errors':>8}{'CPU avg':>9}{'max':>6}{'RSS MB':>8}")
+    top = max((point["throughput"] for point in points), default=0) or 1
+    for point in points:
+        rss = "-" if point["rss_max"] is None else f"{point['rss_max'] / 1e6:.0f}"
+        cpu_avg = "-" if point["cpu_avg"] is None else f"{point['cpu_avg']:.0f}%"
+        cpu_max = "-" if point["cpu_max"] is None else f"{point['cpu_max']:.0f}%"
+        print(f"{point['users']:>6}{'-' if point['rate'] is None else point['rate']:>8}{point['throughput']:>8.1f}"
+              f"{_ms(point['ttft_p50']):>10}{_ms(point['ttft_p99']):>8}{_ms(point['total_p50']):>11}"
+              f"{_ms(point['total_p99']):>8}{point['error_rate']:>8.0%}{cpu_avg:>9}{cpu_max:>6}{rss:>8}"
+              f"  {'█' * max(1, round(20 * point['throughput'] / top))}")
+    print("\nLatencies in ms (TTFT of streamed requests only); the bar is throughput relative to the best point.")
+    for point in points:
+        if point["errors"]:
+            print(f"⚠️  {_where(point)}:")
+            for kind, count in sorted(point["errors"].items()):
+                example = point["examples"].get(kind, "still waiting for a free user when the time was up")
+                print(f"      {kind} ×{count}: {example[:120]}")
+    saturated = knee(points)
+    if saturated is not None and len(points) > 1:
+        print(f"\n📈 Saturates around {_where(saturated)} ({saturated['throughput']:.1f} requests/s): "
+              "more load past it adds latency or errors, not throughput.")
+    elif len(points) > 1:
+        print("\n📈 No saturation point in this range; try more users or a higher rate.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="concurrent users per point, comma separated")
+    parser.add_argument("--rate", help="arrivals per second per point, comma separated (default: closed loop)")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per point")
+    parser.add_argument("--warmup", type=float, default=1, help="seconds per point before measuring")
+    parser.add_argument("--driver", choices=sorted(DRIVERS), default="client", help="how requests are sent")
+    parser.add_argument("--workers", type=int, help="engine driver: request worker pool size (default: config)")
+    parser.add_argument("--prompt-words", default="20:6,200:3,2000:1", help="prompt sizes in words with weights")
+    parser.add_argument("--stream-ratio", type=float, default=0.8, help="share of requests that stream")
+    parser.add_argument("--model", default="sonar")
+    parser.add_argument("--max-tokens", type=int, default=200, help="answer length asked for")
+    parser.add_argument("--target", help="base URL of a running server instead of the stand-in")
+    parser.add_argument("--via-proxy", action="store_true", help="send through an in-process proxy_server")
+    parser.add_argument("--proxy-concurrent", type=int, help="the proxy's upstream connection cap (default: config)")
+    parser.add_argument("--output", help="write every point, with its CPU/RSS timeline, to this JSON file")
+    parser.add_argument("--seed", type=int, default=0)
+    stand_in = parser.add_argument_group("stand-in server")
+    stand_in.add_argument("--serve", action="store_true", help="only run the stand-in server")
+    stand_in.add_argument("--port", type=int, default=0, help="--serve: port (default: any free one)")
+    stand_in.add_argument("--ttft", type=float, default=0.3, help="seconds to the first token (±50%%)")
+    stand_in.add_argument("--prefill-rate", type=float, default=20000, help="prompt tokens read per second")
+    stand_in.add_argument("--token-rate", type=float, default=200, help="answer tokens per second per stream")
+    stand_in.add_argument("--answer-tokens", type=int, default=200, help="longest answer in tokens")
+    stand_in.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    args = parser.parse_args(argv)
+    if args.serve:
+        return serve(args)
+
+    process = None
+    proxy = None
+    if args.target:
+        url, label = args.target.rstrip("/"), args.target
+    else:
+        process, url = start_stand_in(args)
+        label = f"stand-in, TTFT {args.ttft}s, {args.token_rate:.0f} tokens/s"
+    try:
+        if args.via_proxy:
+            from proxy_server import ProxyServer
+            proxy = ProxyServer(PerplexityAPI("load-test", base_url=url, pool_size=args.proxy_concurrent or 8),
+                                port=0, rate=0, cache_ttl=0, max_concurrent=args.proxy_concurrent).start()
+            url, label = proxy.url, f"via proxy, {label}"
+        workload = Workload(parse_sizes(args.prompt_words), args.stream_ratio)
+        rates = parse_list(args.rate, float) if args.rate else [None]
+        points = []
+        for users in parse_list(args.users):
+            for rate in rates:
+                driver = DRIVERS[args.driver](url, args.model, args.max_tokens, users, args.workers)
+                try:
+                    point = run_point(driver, workload, users, rate, args.duration, args.warmup, args.seed)
+                finally:
+                    driver.close()
+                points.append(point)
+                print(f"  {_where(point)}: {point['throughput']:.1f} requests/s, p99 {_ms(point['total_p99'])} ms",
+                      flush=True)
+        print()
+        report(points, f"{args.driver} driver, {label}")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"options": vars(args), "points": points}, f, indent=2)
+            print(f"\n💾 Results written to {args.output}")
+    except KeyboardInterrupt:
+        print("\n⏹  Interrupted")
+        return 1
+    finally:
+        if proxy is not None:
+            proxy.shutdown()
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+Headless chat engine for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Everything about a conversation except drawing it: session state, request
+parameters, the message list sent to the API, running a request (streamed
+or not) and folding the answer and its usage back into the history.
+Nothing here imports Tk, so batch jobs, command-line tools and servers
+can hold conversations without a display.
+
+Progress is reported to subscribers as plain dict events, each carrying
+"session_id":
+
+    {"stream_chunk": text, "first_chunk": bool}        part of a streamed answer
+    {"stream_done": True, "full_content", "model", "latency_ms", "ttft_ms",
+     "usage", "citations", "finish_reason"}            last three None if not sent
+    {"non_stream_response": response, "model", "latency_ms"}
+    {"error": message}                                 with "partial_content" if a stream broke off
+
+A conversation whose model is config.AUTO_MODEL has a model picked for
+each request by the engine's ModelRouter (model_router.py); the final
+event then also has "auto_reason".  Streamed answers report "ttft_ms",
+the time to their first token, and every answer's speed is passed to the
+router.
+
+When the API client's route() sends a request to a fallback model because
+the chosen one keeps failing (see model_health.py), "model" in the final
+event is the fallback and "rerouted_from" is the model that was chosen.
+
+Every request ends with exactly one event that is not a stream_chunk.
+submit() runs requests on the RequestScheduler pool, so events arrive on
+a worker thread; the GUI subscribes with its response queue and applies
+them on the Tk thread.  ask() runs a request in the calling thread and
+returns the answer.
+
+Requests are given the spec's "deadline" (set by the scheduler) and run
+under the API client's connect, first byte and idle timeouts (see
+perplexity_api.py), so a stalled stream ends in an error within seconds
+instead of holding its session busy.  The text that had arrived is sent
+with the error but not added to the history.
+
+When the engine has a UsageLedger, every answered request is recorded
+in it (on the thread that ran the request) before its final event is
+emitted.
+"""
+
+import time
+from datetime import datetime
+
+import config
+from conversation_stats import ConversationStats
+from model_health import ModelUnavailableError
+from perplexity_api import RequestTimeoutError, import_requests
+from request_scheduler import RequestScheduler
+
+PARAMETER_TYPES = (
+    ("max_tokens", int), ("temperature", float), ("top_p", float), ("top_k", int),
+    ("presence_penalty", float), ("frequency_penalty", float),
+)
+
+
+class ChatEngineError(Exception):
+    """A request failed; the message is what the GUI would show."""
+
+
+def parse_parameters(raw):
+    """Convert {name: text} from input fields into typed API parameters.
+
+    Blank values are left out.  Returns (params, invalid) where invalid
+    holds "name='value'" for every value that did not convert.
+    """
+    params, invalid = {}, []
+    for name, convert in PARAMETER_TYPES:
+        value = str(raw.get(name, "")).strip()
+        if not value:
+            continue
+        try:
+            params[name] = convert(value)
+        except ValueError:
+            invalid.append(f"{name}={value!r}")
+    return params, invalid
+
+
+def build_messages(system_prompt, history):
+    """The messages sent to the API: the system prompt, then the history.
+
+    Extra keys kept on history entries (citations, finish_reason) are
+    left out; entries without any are passed through as they are.
+    """
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    messages.extend(m if len(m) == 2 else {"role": m.get("role"), "content": m.get("content")} for m in history)
+    return messages
+
+
+def response_citations(payload):
+    """Source URLs of a response or stream chunk: "citations", else the "search_results" URLs."""
+    citations = payload.get("citations")
+    if citations:
+        return list(citations)
+    return [result["url"] for result in payload.get("search_results") or () if result.get("url")] or None
+
+
+def stream_metadata(chunks):
+    """{"usage", "citations", "finish_reason"} from the end of a stream, latest chunk first."""
+    metadata = dict.fromkeys(("usage", "citations", "finish_reason"))
+    for chunk in reversed(chunks):
+        metadata["usage"] = metadata["usage"] or chunk.get("usage")
+        metadata["citations"] = metadata["citations"] or response_citations(chunk)
+        if not metadata["finish_reason"] and chunk.get("choices"):
+            metadata["finish_reason"] = chunk["choices"][0].get("finish_reason")
+    return metadata
+
+
+def answer_from_event(event):
+    """(content, usage) from a stream_done or non_stream_response event.
+
+    Returns None when a non-streamed response has no content.
+    """
+    if "stream_done" in event:
+        return event["full_content"], event.get("usage")
+    response = event.get("non_stream_response")
+    if response and "choices" in response and response["choices"]:
+        return response["choices"][0].get("message", {}).get("content"), response.get("usage")
+    return None
+
+
+def answer_details(event):
+    """{"citations", "finish_reason"} of an answer event, leaving out what the API didn't send."""
+    if "stream_done" in event:
+        details = {"citations": event.get("citations"), "finish_reason": event.get("finish_reason")}
+    else:
+        response = event.get("non_stream_response") or {}
+        choice = (response.get("choices") or [{}])[0]
+        details = {"citations": response_citations(response), "finish_reason": choice.get("finish_reason")}
+    return {key: value for key, value in details.items() if value}
+
+
+def assistant_message(event, content):
+    """The history entry for an answer, with its citations and finish_reason."""
+    return dict({"role": "assistant", "content": content}, **answer_details(event))
+
+
+class Conversation:
+    """One conversation's history and settings, with no UI attached."""
+
+    def __init__(self, session_id, model, template="", system_prompt=""):
+        self.session_id = session_id
+        self.title = session_id
+        self.model = model
+        self.template = template
+        self.system_prompt = system_prompt
+        self.stats = ConversationStats()
+        self.turn_usage = {}  # history index -> usage/latency of that assistant turn
+        self._history = []
+        self.last_ai_response_content = ""
+        self.last_params = {}
+        self.last_sent = None  # (model, template) the last request was sent with
+
+    # Every change to the history goes through these methods (or the
+    # setter) so that stats stays in step without rescanning it.
+    @property
+    def conversation_history(self):
+        return self._history
+
+    @conversation_history.setter
+    def conversation_history(self, history):
+        if history is self._history:
+            return
+        self._history = history
+        self.mark_truncated(len(history))
+        self.stats.reset()
+        self.stats.extend(history)
+        for index in sorted(self.turn_usage):
+            self.stats.add_usage(self.turn_usage[index])
+
+    def append_message(self, message):
+        self._history.append(message)
+        self.stats.add(message)
+
+    def extend_messages(self, messages):
+        start = len(self._history)
+        self._history.extend(messages)
+        self.stats.extend(self._history[start:])
+
+    def pop_message(self):
+        message = self._history.pop()
+        self.stats.remove_last()
+        self.mark_truncated(len(self._history))
+        return message
+
+    def clear(self):
+        self.mark_truncated(0)
+        self._history = []
+        self.stats.reset()
+        self.last_ai_response_content = ""
+
+    def mark_truncated(self, length):
+        """Drop usage recorded for turns past length after the history was cut back."""
+        for index in sorted((i for i in self.turn_usage if i >= length), reverse=True):
+            self.stats.remove_usage(self.turn_usage.pop(index))
+
+    def record_usage(self, event, usage=None):
+        """Attach usage and latency to the answer that was just appended."""
+        index = len(self._history) - 1
+        if index in self.turn_usage:
+            self.mark_truncated(index)
+        self.turn_usage[index] = dict(usage or {}, model=event["model"], latency_ms=event["latency_ms"])
+        self.stats.add_usage(self.turn_usage[index])
+
+    def to_chat_data(self):
+        """The conversation in the GUI's Save Chat layout."""
+        return {
+            "conversation_history": self.conversation_history,
+            "system_prompt": self.system_prompt,
+            "model": self.model,
+            "template": self.template,
+            "session_id": self.session_id,
+            "saved_at": datetime.now().isoformat(),
+        }
+
+    def load_chat_data(self, chat_data):
+        """Replace history and settings with saved chat data (Save Chat / auto-save layout)."""
+        self.clear()
+        self.system_prompt = chat_data.get("system_prompt", self.system_prompt)
+        self.model = chat_data.get("model") or self.model
+        self.template = chat_data.get("template", self.template)
+        for message in chat_data.get("conversation_history", []):
+            self.append_message(message)
+        for message in reversed(self.conversation_history):
+            if message.get("role") == "assistant":
+                self.last_ai_response_content = message.get("content") or ""
+                break
+
+    def settings(self, params=None, stream=True):
+        """Request settings from the conversation's own model and prompt."""
+        return {
+            "model": self.model,
+            "template": self.template,
+            "system_prompt": self.system_prompt,
+            "params": dict(config.DEFAULT_PARAMETERS if params is None else params),
+            "stream": stream,
+        }
+
+
+class ChatEngine:
+    """Owns the open conversations and runs their requests."""
+
+    def __init__(self, api_client=None, scheduler=None, session_factory=Conversation, ledger=None, source=None,
+                 router=None):
+        self.api_client = api_client
+        self.scheduler = scheduler or RequestScheduler()
+        self.session_factory = session_factory
+        self.ledger = ledger  # UsageLedger, or None to keep no record
+        self.router = router  # ModelRouter for the "auto" model; without one it means DEFAULT_MODEL
+        self.source = source  # recorded with each ledger entry ("gui", "repl", ...)
+        self.sessions = {}  # session id -> conversation
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """callback(event) is called for every event, possibly from a worker thread."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def emit(self, event):
+        for callback in list(self._subscribers):
+            callback(event)
+
+    def open_session(self, session_id, model=None, template="", system_prompt=""):
+        session = self.session_factory(session_id, model or config.DEFAULT_MODEL, template, system_prompt)
+        self.sessions[session_id] = session
+        return session
+
+    def close_session(self, session_id):
+        """Forget a session; a request still in flight finishes unobserved."""
+        self.scheduler.cancel_pending(session_id)
+        return self.sessions.pop(session_id, None)
+
+    def build_request(self, session, settings=None):
+        """A self-contained request spec; workers never read the session."""
+        spec = dict(settings or session.settings())
+        spec["messages"] = build_messages(spec["system_prompt"], session.conversation_history)
+        spec["session_id"] = session.session_id
+        return spec
+
+    def submit(self, session, settings=None, enqueued_at=None):
+        """Run a request for the session's history on the worker pool."""
+        spec = self.build_request(session, settings)
+        session.last_params = spec["params"]
+        session.last_sent = spec["model"], spec.get("template", session.template)
+        return self.scheduler.submit(session.session_id, spec, self.run, enqueued_at=enqueued_at)
+
+    def run(self, spec, emit=None):
+        """Perform one request, reporting events to emit (default: subscribers)."""
+        emit = emit or self.emit
+        session_id = spec["session_id"]
+        started_at = time.monotonic()
+        try:
+            chosen, auto_reason = self._choose_model(spec)
+            route = getattr(self.api_client, "route", None)
+            model = route(chosen) if route else chosen
+            first_token_at = None
+            if spec["stream"]:
+                first_chunk = True
+                parts = []
+                # Usage, citations and finish_reason come at the end of the
+                # stream, on the last chunk or on chunks without content, so
+                # only those are kept and read once the stream is over.
+                last_chunk, contentless = {}, []
+                for chunk in self.api_client.chat_completion(model=model, messages=spec["messages"], stream=True,
+                                                             deadline=spec.get("deadline"), **spec["params"]):
+                    if "error" in chunk:
+                        event = dict(chunk, session_id=session_id)
+                        if parts:
+                            event["partial_content"] = "".join(parts)
+                            event["error"] = f"{chunk['error']} The partial answer above was not saved."
+                        emit(event)
+                        return
+                    if chunk.get("done"):
+                        break
+                    last_chunk = chunk
+                    choices = chunk.get("choices")
+                    content_delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if content_delta:
+                        if first_chunk:
+                            first_token_at = time.monotonic()
+                        parts.append(content_delta)
+                        emit({"stream_chunk": content_delta, "first_chunk": first_chunk, "session_id": session_id})
+                        first_chunk = False
+                    else:
+                        contentless.append(chunk)
+                event = {"stream_done": True, "full_content": "".join(parts), "session_id": session_id,
+                         "model": model, "latency_ms": int((time.monotonic() - started_at) * 1000),
+                         "ttft_ms": first_token_at and int((first_token_at - started_at) * 1000),
+                         **stream_metadata(contentless + [last_chunk])}
+            else:
+                response_data = self.api_client.chat_completion(model=model, messages=spec["messages"], stream=False,
+                                                                deadline=spec.get("deadline"), **spec["params"])
+                event = {"non_stream_response": response_data, "session_id": session_id,
+                         "model": model, "latency_ms": int((time.monotonic() - started_at) * 1000)}
+            if model != chosen:
+                event["rerouted_from"] = chosen
+            if auto_reason:
+                event["auto_reason"] = auto_reason
+            self._record(spec, event)
+            self._observe(event)
+            emit(event)
+        except (ModelUnavailableError, RequestTimeoutError) as e:
+            emit({"error": str(e), "session_id": session_id})
+        except import_requests().exceptions.HTTPError as e:
+            emit({"error": f"API Error: {str(e)}", "session_id": session_id})
+        except Exception as e:
+            emit({"error": f"Unexpected error in API call: {str(e)}", "session_id": session_id})
+
+    def _choose_model(self, spec):
+        """(model, reason) for a request; reason is None unless the router picked the model."""
+        if spec["model"] != config.AUTO_MODEL:
+            return spec["model"], None
+        if self.router is None:
+            return config.DEFAULT_MODEL, None
+        return self.router.choose(spec["messages"], getattr(self.api_client, "health", None), spec["session_id"])
+
+    def _observe(self, event):
+        """Pass an answer's speed to the router; a router failure never fails the request."""
+        if self.router is None:
+            return
+        answer = answer_from_event(event)
+        if answer is None:
+            return
+        content, usage = answer
+        tokens = (usage or {}).get("completion_tokens") or len(content or "") // 4
+        ttft = event["ttft_ms"] / 1000 if event.get("ttft_ms") is not None else None
+        try:
+            self.router.observe(event["model"], ttft, event["latency_ms"] / 1000, tokens, streamed="stream_done" in event)
+        except Exception as e:
+            print(f"Model router update failed: {e}")
+
+    def _record(self, spec, event):
+        """Append an answered request to the ledger; a ledger failure never fails the request."""
+        if self.ledger is None:
+            return
+        answer = answer_from_event(event)
+        if answer is None:
+            return
+        content, usage = answer
+        estimated = not usage
+        if estimated:
+            from usage_ledger import estimate_usage
+            usage = estimate_usage(spec["messages"], content)
+        try:
+            self.ledger.record(event["model"], usage, event["latency_ms"], spec["session_id"], self.source,
+                               estimated=estimated)
+        except Exception as e:
+            print(f"Usage ledger write failed: {e}")
+
+    def ask(self, session, prompt, settings=None, on_event=None):
+        """Send prompt, wait for the answer in this thread and return its text.
+
+        Every event is also passed to on_event as it happens.  If the
+        request fails the prompt is taken back out of the history and
+        ChatEngineError is raised.
+        """
+        session.append_message({"role": "user", "content": prompt})
+        spec = self.build_request(session, settings)
+        session.last_params = spec["params"]
+        session.last_sent = spec["model"], spec.get("template", session.template)
+        final = []
+
+        def emit(event):
+            if "stream_chunk" not in event:
+                final.append(event)
+            if on_event:
+                on_event(event)
+
+        self.run(spec, emit)
+        event = final[-1]
+        answer = None if "error" in event else answer_from_event(event)
+        if answer is None:
+            session.pop_message()
+            raise ChatEngineError(event.get("error") or "No content in response or unexpected structure.")
+        content, usage = answer
+        session.append_message(assistant_message(event, content))
+        session.record_usage(event, usage)
+        session.last_ai_response_content = content
+        return content
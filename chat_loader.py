@@ -0,0 +1,124 @@
+"""
+Streaming loader for saved chats
+Enhanced Edition v2.0
+
+json.load() on a multi-hundred-MB Save Chat file holds the whole file text
+and the parsed result in memory at once, and nothing can be shown until
+both are done.  iter_chat_file() instead reads the file in chunks and
+yields the top-level fields one at a time, with every element of the
+"conversation_history" array yielded as its own message, so the raw text
+never needs to be in memory as a whole:
+
+    for kind, key, value in iter_chat_file(path):
+        kind == "message"   value is one conversation_history entry
+        kind == "field"     key/value is any other top-level field
+        kind == "progress"  value is (bytes_read, total_bytes)
+
+Only the layout written by Save Chat / auto-save (a JSON object) is
+supported; anything else raises ValueError.
+"""
+
+import json
+import os
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """Chunked text buffer that only keeps the unparsed tail in memory."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def fill(self, at_least):
+        """Read at least at_least more characters (or up to EOF); False at EOF."""
+        if self.eof:
+            return False
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(max(at_least, self.chunk_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.bytes_read = self.f.buffer.tell()
+        self.buffer += chunk
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or "" at EOF."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill(self.chunk_size):
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} at byte ~{self.bytes_read}, found {found!r}")
+        self.pos += 1
+
+    def value(self, decoder):
+        """Decode one JSON value, reading more of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete value: read at least as much again as we hold, so
+                # a huge message is re-scanned O(log n) times, not O(n).
+                if not self.fill(len(self.buffer) - self.pos):
+                    raise
+                continue
+            if end == len(self.buffer) and not self.eof and self.fill(self.chunk_size):
+                # A number (or literal) may continue in the next chunk.
+                continue
+            self.pos = end
+            return value
+
+
+def iter_chat_file(path, chunk_size=CHUNK_SIZE, progress_every=1 << 20):
+    """Yield ("field", key, value), ("message", None, message) and
+    ("progress", None, (bytes_read, total)) events for a saved chat file."""
+    total = os.path.getsize(path)
+    decoder = json.JSONDecoder()
+    last_progress = 0
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value(decoder)
+            if not isinstance(key, str):
+                raise ValueError("Saved chat must be a JSON object")
+            reader.expect(":")
+            if key == "conversation_history" and reader.peek() == "[":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield "message", None, reader.value(decoder)
+                        if reader.bytes_read - last_progress >= progress_every:
+                            last_progress = reader.bytes_read
+                            yield "progress", None, (reader.bytes_read, total)
+                        if reader.peek() == "]":
+                            reader.pos += 1
+                            break
+                        reader.expect(",")
+            else:
+                yield "field", key, reader.value(decoder)
+            if reader.peek() == "}":
+                break
+            reader.expect(",")
+    yield "progress", None, (total, total)
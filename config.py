@@ -7,7 +7,8 @@ Modify these settings to customize the application behavior and appearance.
 
 # API Configuration
 DEFAULT_MODEL = "sonar"  # Default model to select on startup
-API_TIMEOUT = 60  # Timeout for API requests in seconds
+AUTO_MODEL = "auto"  # Model choice that picks a model per request (see model_router.py)
+API_TIMEOUT = 60  # Seconds to wait for the first byte of an answer (see also the *_timeout_s settings)
 MAX_RETRIES = 3  # Maximum number of retries for failed requests
 
 # UI Configuration
@@ -94,7 +95,8 @@ FEATURES = {
     "enable_auto_save": True,
     "enable_session_management": True,
     "enable_regenerate": True,
-    "enable_api_validation": True
+    "enable_api_validation": True,
+    "enable_semantic_cache": False  # Default for Settings -> "Offer cached answers to near-duplicate questions"
 }
 
 # Advanced Settings
@@ -102,6 +104,40 @@ ADVANCED = {
     "max_conversation_history": 1000,  # Maximum messages to keep in memory
     "thinking_animation_speed": 500,   # Thinking animation speed in milliseconds
     "stream_chunk_delay": 50,          # Delay between stream chunks in milliseconds
+    "ui_debounce_ms": 150,             # Quiet period before recounting the input box
+    "large_input_chars": 20000,        # Above this, input word counts are estimated
+    "max_concurrent_requests": 4,      # Size of the API request worker pool
+    "journal_compact_records": 500,    # Fold the auto-save journal into a snapshot after this many records
+    "persist_delay_ms": 500,           # Saves within this window are coalesced into one background write
+    "snapshot_keep_last": 5,           # Auto-save snapshots kept per session...
+    "snapshot_keep_daily": 7,          # ...plus the newest one from each of this many days
+    "render_window": 200,              # Messages rendered when a long conversation is opened
+    "startup_defer_ms": 50,            # Delay after the first frame before the rest of startup runs
+    "proxy_port": 8765,                # Port for `python launch.py serve` (binds to localhost)
+    "proxy_rate_limit": 5.0,           # Upstream requests per second shared by all proxy clients (0 = no limit)
+    "proxy_rate_burst": 10,            # Requests allowed at once before the rate limit applies
+    "proxy_queue_timeout": 30,         # Longest a proxied request waits for the rate limit before a 429
+    "proxy_max_concurrent": 8,         # Upstream connections shared by all proxy clients
+    "proxy_cache_ttl": 300,            # Seconds an identical proxied request is answered from cache (0 = off)
+    "proxy_cache_entries": 256,        # Responses kept in the proxy cache
+    "semantic_cache_threshold": 0.85,  # Similarity (0-1) above which a cached answer is offered
+    "semantic_cache_entries": 5000,    # Answers kept in the semantic cache (oldest dropped first)
+    "semantic_cache_max_age_days": 30, # Cached answers older than this are never offered
+    "semantic_cache_dim": 1024,        # Vector size; changing it empties the semantic cache
+    "semantic_index_dim": 512,         # Vector size of the message search index; changing it rebuilds the index
+    "semantic_index_ivf_rows": 1000000, # Past this many indexed messages, search only the nearest clusters (0 = never)
+    "semantic_index_nprobe": 32,       # Clusters searched per query once the index is clustered
+    "health_window_s": 300,            # Seconds of request outcomes kept per model for its health
+    "breaker_failures": 3,             # Failures in a row that pause a model (circuit breaker opens)
+    "breaker_error_rate": 0.5,         # ...or this share of failed requests in the window
+    "breaker_min_requests": 6,         # ...once the window holds at least this many requests
+    "breaker_cooldown_s": 30,          # Seconds a paused model fails fast before a probe is let through
+    "breaker_max_cooldown_s": 600,     # Each failed probe doubles the pause, up to this
+    "connect_timeout_s": 10,           # Seconds to wait for a connection to the API
+    "stream_idle_timeout_s": 30,       # A streamed answer that sends nothing for this long is cut off
+    "request_deadline_s": 600,         # Longest a request may take in all, from when it is sent to a worker
+    "auto_quick_words": 15,            # "auto" sends prompts up to this many words to the fastest model
+    "auto_research_words": 150,        # ...and prompts from this many words to the deep research models
     "api_key_mask_char": "*",          # Character to use for masking API key
     "debug_mode": False,               # Enable debug logging
     "check_updates": True              # Check for application updates
@@ -111,6 +147,11 @@ ADVANCED = {
 PATHS = {
     "api_key_file": "pplx_api_key.txt",
     "settings_file": "settings.json",
+    "database_file": "conversations.db",
+    "usage_ledger_file": "usage_ledger.db",
+    "semantic_cache_dir": "semantic_cache",
+    "semantic_index_dir": "semantic_index",
+    "routing_log_file": "logs/model_routing.jsonl",
     "auto_save_dir": "auto_saves",
     "export_dir": "exports",
     "logs_dir": "logs"
@@ -133,10 +174,42 @@ MODEL_DESCRIPTIONS = {
     "sonar-pro": "Advanced model with enhanced capabilities",
     "sonar-deep-research": "Specialized for research and analysis",
     "sonar-reasoning-pro": "Advanced reasoning capabilities",
+    "sonar-reasoning": "Fast step-by-step reasoning with web search",
+    "r1-1776": "Offline reasoning model without web search",
     "llama-3-70b-instruct": "Large language model for complex tasks",
     "codellama-70b-instruct": "Specialized for code generation and programming"
 }
 
+# Model Prices (USD per million input/output tokens, plus a per-request fee)
+# Used by the usage ledger to cost each completion; edit to match your plan
+# and run "python usage_ledger.py --reprice". Unlisted models use "default".
+MODEL_PRICES = {
+    "sonar": {"input": 1.0, "output": 1.0, "request": 0.005},
+    "sonar-pro": {"input": 3.0, "output": 15.0, "request": 0.006},
+    "sonar-reasoning": {"input": 1.0, "output": 5.0, "request": 0.005},
+    "sonar-reasoning-pro": {"input": 2.0, "output": 8.0, "request": 0.006},
+    "sonar-deep-research": {"input": 2.0, "output": 8.0, "request": 0.005},
+    "r1-1776": {"input": 2.0, "output": 8.0, "request": 0.0},
+    "default": {"input": 1.0, "output": 1.0, "request": 0.005},
+}
+
+# Automatic Model Routing
+# Models the "auto" model picks from.  Their capability classes (online or
+# chat, fast, advanced, reasoning, deep research) are read from their names
+# and MODEL_DESCRIPTIONS; see model_router.capabilities().
+AUTO_ROUTE_MODELS = ["sonar", "sonar-pro", "sonar-reasoning", "sonar-reasoning-pro", "sonar-deep-research"]
+
+# Model Fallbacks
+# While a model's circuit breaker is open (it keeps failing; see
+# model_health.py), its requests go to its fallback here instead, following
+# the chain.  A model without an entry fails fast until it recovers.
+MODEL_FALLBACKS = {
+    "sonar-deep-research": "sonar-pro",
+    "sonar-reasoning-pro": "sonar-reasoning",
+    "sonar-reasoning": "sonar",
+    "sonar-pro": "sonar",
+}
+
 # Validation Rules
 VALIDATION = {
     "max_tokens_range": (1, 4096),
@@ -0,0 +1,113 @@
+"""
+Conversation statistics for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Running totals for one conversation, updated as messages are appended
+and popped, so the Word Count dialog and the status bar never rescan the
+history.  Each message is measured once, when it is added, and its counts
+are kept so that popping it (regenerate, clear) is a subtraction.
+
+Usage reported by the API (prompt/completion/total tokens) and the
+latency of each answer are tracked per assistant turn, alongside the
+estimated token count that is available for every message.
+"""
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) without a tokenizer."""
+    return estimate_tokens_for_chars(len(text) if text else 0)
+
+
+def estimate_tokens_for_chars(char_count: int) -> int:
+    """estimate_tokens for a text known only by its length."""
+    if not char_count:
+        return 0
+    return max(1, (char_count + 3) // 4)
+
+
+class ConversationStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._measured = []  # (role, words, characters, tokens) per message, in history order
+        self.by_role = {}  # role -> {"messages", "words", "characters", "tokens"}
+        self.messages = 0
+        self.words = 0
+        self.characters = 0
+        self.estimated_tokens = 0
+        self.usage = dict.fromkeys(USAGE_FIELDS, 0)
+        self.latencies = []  # latency in ms of each answered turn, oldest first
+        self.latency_total_ms = 0
+
+    def add(self, message):
+        content = message.get("content") or ""
+        measured = (message.get("role", ""), len(content.split()), len(content), estimate_tokens(content))
+        self._measured.append(measured)
+        self._apply(measured, 1)
+
+    def extend(self, messages):
+        for message in messages:
+            self.add(message)
+
+    def remove_last(self):
+        self._apply(self._measured.pop(), -1)
+
+    def add_usage(self, turn_usage):
+        """Count the newest turn's usage/latency entry (see Conversation.record_usage)."""
+        self._apply_usage(turn_usage, 1)
+        self.latencies.append(turn_usage.get("latency_ms") or 0)
+
+    def remove_usage(self, turn_usage):
+        """Uncount a turn's entry; turns are only ever removed from the end."""
+        self._apply_usage(turn_usage, -1)
+        self.latencies.pop()
+
+    @property
+    def answered_turns(self):
+        return len(self.latencies)
+
+    @property
+    def last_latency_ms(self):
+        return self.latencies[-1] if self.latencies else None
+
+    def average_latency_ms(self):
+        return self.latency_total_ms / len(self.latencies) if self.latencies else None
+
+    def role(self, role):
+        return self.by_role.get(role, {"messages": 0, "words": 0, "characters": 0, "tokens": 0})
+
+    def summary(self):
+        """All totals as a plain dict."""
+        return {
+            "messages": self.messages,
+            "words": self.words,
+            "characters": self.characters,
+            "estimated_tokens": self.estimated_tokens,
+            "by_role": {role: dict(totals) for role, totals in self.by_role.items()},
+            "usage": dict(self.usage),
+            "answered_turns": self.answered_turns,
+            "average_latency_ms": self.average_latency_ms(),
+            "last_latency_ms": self.last_latency_ms,
+        }
+
+    def _apply(self, measured, sign):
+        role, words, characters, tokens = measured
+        self.messages += sign
+        self.words += sign * words
+        self.characters += sign * characters
+        self.estimated_tokens += sign * tokens
+        totals = self.by_role.setdefault(role, {"messages": 0, "words": 0, "characters": 0, "tokens": 0})
+        totals["messages"] += sign
+        totals["words"] += sign * words
+        totals["characters"] += sign * characters
+        totals["tokens"] += sign * tokens
+        if not totals["messages"]:
+            del self.by_role[role]
+
+    def _apply_usage(self, turn_usage, sign):
+        for field in USAGE_FIELDS:
+            self.usage[field] += sign * (turn_usage.get(field) or 0)
+        self.latency_total_ms += sign * (turn_usage.get("latency_ms") or 0)
@@ -0,0 +1,395 @@
+"""
+SQLite conversation store for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Keeps every conversation in one SQLite database (WAL mode) instead of
+loose JSON files, with an FTS5 full-text index over message content so
+past sessions can be searched in milliseconds.
+
+Tables:
+    sessions  one row per conversation (title, model, template, system prompt)
+    params    model parameters used by a session
+    messages  one row per turn, ordered by seq within a session; meta holds
+              any other keys of the message (citations, finish_reason) as JSON
+    usage     token usage and latency for assistant turns
+    imported_files  auto-save files already bulk-imported (see import_auto_saves.py)
+    message_changes  ids of messages deleted or edited, in order, so an
+              index built from messages (see semantic_index.py) can catch up;
+              logged only once an index has called track_message_changes()
+    messages_fts  FTS5 index over messages.content (external content)
+
+If the SQLite build lacks FTS5, search falls back to a LIKE scan.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    model TEXT,
+    template TEXT,
+    system_prompt TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS params (
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (session_id, name)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    model TEXT,
+    created_at TEXT NOT NULL,
+    meta TEXT,
+    UNIQUE (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS usage (
+    message_id INTEGER PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,
+    model TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    latency_ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    session_id TEXT
+);
+CREATE TABLE IF NOT EXISTS message_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at);
+"""
+
+CHANGES_SCHEMA = """
+CREATE TRIGGER IF NOT EXISTS messages_changed_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO message_changes (message_id) VALUES (old.id);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_changed_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO message_changes (message_id) VALUES (old.id);
+END;
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+
+def _message_meta(message):
+    extra = {key: value for key, value in message.items() if key not in ("role", "content")}
+    return json.dumps(extra) if extra else None
+
+
+def _message_from_row(row):
+    message = {"role": row["role"], "content": row["content"]}
+    if row["meta"]:
+        message.update(json.loads(row["meta"]))
+    return message
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class ConversationStore:
+    def __init__(self, path=None):
+        self.path = path or config.PATHS.get("database_file", "conversations.db")
+        # One connection shared under a lock, so the store can be used from
+        # whichever thread does the persistence work.
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA foreign_keys=ON")
+            self.conn.executescript(SCHEMA)
+            # Databases created before messages.meta existed.
+            if "meta" not in {row["name"] for row in self.conn.execute("PRAGMA table_info(messages)")}:
+                self.conn.execute("ALTER TABLE messages ADD COLUMN meta TEXT")
+            try:
+                self.conn.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                self.has_fts = False
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Writing
+    def save_session(self, session_id, meta, params=None, title=None):
+        """Insert or update a session's header row and parameters."""
+        with self.lock, self.conn:
+            self._save_session_rows(session_id, meta, params, title)
+
+    def replace_messages(self, session_id, start, messages, model=None, usage=None):
+        """Replace a session's messages from seq start onwards.
+
+        usage maps seq -> {"prompt_tokens", "completion_tokens",
+        "total_tokens", "latency_ms", "model"} for assistant turns.
+        """
+        with self.lock, self.conn:
+            self._replace_message_rows(session_id, start, messages, model, usage)
+
+    def import_session(self, chat_data, title=None):
+        """Bulk-insert a whole saved chat (Save Chat / auto-save layout) in one transaction."""
+        session_id = chat_data.get("session_id") or f"imported_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        with self.lock, self.conn:
+            self._import_rows(session_id, chat_data, title)
+        return session_id
+
+    def bulk_import(self, chat_datas, files=()):
+        """Import many saved chats and record files as imported, all in one transaction.
+
+        A session already in the store is only replaced by a longer history,
+        so re-importing an older snapshot never loses turns.  A chat's
+        "title" key, if any, overrides the title taken from its first
+        question.  files is an
+        iterable of (path, size, mtime, session_id).  Returns how many
+        sessions were written.
+        """
+        written = 0
+        with self.lock, self.conn:
+            for chat_data in chat_datas:
+                session_id = chat_data["session_id"]
+                stored = self.conn.execute(
+                    "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+                if len(chat_data.get("conversation_history", [])) > stored:
+                    self._import_rows(session_id, chat_data, chat_data.get("title"))
+                    written += 1
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO imported_files (path, size, mtime, session_id) VALUES (?, ?, ?, ?)", files)
+        return written
+
+    def imported_files(self):
+        """path -> (size, mtime) for every file bulk_import() has recorded."""
+        with self.lock:
+            return {row["path"]: (row["size"], row["mtime"])
+                    for row in self.conn.execute("SELECT path, size, mtime FROM imported_files")}
+
+    def _import_rows(self, session_id, chat_data, title):
+        history = chat_data.get("conversation_history", [])
+        saved_at = chat_data.get("saved_at") or chat_data.get("auto_saved_at")
+        self._save_session_rows(session_id, chat_data, None, title or title_for(history), saved_at)
+        self._replace_message_rows(session_id, 0, history, chat_data.get("model"), None, saved_at)
+
+    def _save_session_rows(self, session_id, meta, params, title, now=None):
+        now = now or datetime.now().isoformat()
+        self.conn.execute(
+            """INSERT INTO sessions (id, title, model, template, system_prompt, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET
+                   title = COALESCE(excluded.title, sessions.title),
+                   model = excluded.model, template = excluded.template,
+                   system_prompt = excluded.system_prompt, updated_at = excluded.updated_at""",
+            (session_id, title, meta.get("model"), meta.get("template"), meta.get("system_prompt"), now, now))
+        if params is not None:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO params (session_id, name, value) VALUES (?, ?, ?)",
+                [(session_id, name, json.dumps(value)) for name, value in params.items()])
+
+    def _replace_message_rows(self, session_id, start, messages, model, usage, now=None):
+        now = now or datetime.now().isoformat()
+        usage = usage or {}
+        self.conn.execute("DELETE FROM messages WHERE session_id = ? AND seq >= ?", (session_id, start))
+        for seq, message in enumerate(messages, start):
+            turn_usage = usage.get(seq)
+            turn_model = (turn_usage or {}).get("model") or model
+            cursor = self.conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, model, created_at, meta) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, seq, message.get("role", ""), message.get("content") or "", turn_model, now,
+                 _message_meta(message) if len(message) > 2 else None))
+            if turn_usage:
+                self._insert_usage(cursor.lastrowid, turn_usage, turn_model)
+        self.conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+
+    def _insert_usage(self, message_id, usage, model):
+        self.conn.execute(
+            """INSERT OR REPLACE INTO usage (message_id, model, prompt_tokens, completion_tokens, total_tokens, latency_ms)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (message_id, model, usage.get("prompt_tokens"), usage.get("completion_tokens"),
+             usage.get("total_tokens"), usage.get("latency_ms")))
+
+    def delete_session(self, session_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def rename_session(self, session_id, new_id):
+        """Move a stored session to new_id, replacing whatever is stored under it."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (new_id,))
+            self.conn.execute(
+                """INSERT INTO sessions (id, title, model, template, system_prompt, created_at, updated_at)
+                   SELECT ?, title, model, template, system_prompt, created_at, updated_at FROM sessions WHERE id = ?""",
+                (new_id, session_id))
+            for table in ("params", "messages"):
+                self.conn.execute(f"UPDATE {table} SET session_id = ? WHERE session_id = ?", (new_id, session_id))
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    # Reading
+    def list_sessions(self, limit=200):
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                """SELECT s.id, s.title, s.model, s.updated_at,
+                          (SELECT COUNT(*) FROM messages m WHERE m.session_id = s.id) AS message_count
+                   FROM sessions s ORDER BY s.updated_at DESC LIMIT ?""", (limit,))]
+
+    def load_session(self, session_id):
+        """Return a session in the Save Chat layout, or None if unknown."""
+        with self.lock:
+            header = self.conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if header is None:
+                return None
+            messages = self.conn.execute(
+                "SELECT role, content, meta FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+            params = {row["name"]: json.loads(row["value"]) for row in self.conn.execute(
+                "SELECT name, value FROM params WHERE session_id = ?", (session_id,))}
+        return {
+            "conversation_history": [_message_from_row(row) for row in messages],
+            "system_prompt": header["system_prompt"] or "",
+            "model": header["model"],
+            "template": header["template"],
+            "session_id": header["id"],
+            "title": header["title"],
+            "params": params,
+            "saved_at": header["updated_at"],
+        }
+
+    def session_header(self, session_id):
+        """A session's fields without its messages (the meta of the Save Chat layout)."""
+        with self.lock:
+            header = self.conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if header is None:
+            raise KeyError(session_id)
+        return {"session_id": header["id"], "title": header["title"], "model": header["model"],
+                "template": header["template"], "system_prompt": header["system_prompt"] or "",
+                "saved_at": header["updated_at"]}
+
+    def iter_messages(self, session_id, batch_size=500):
+        """Yield a session's messages in order, fetching batch_size rows at a time."""
+        last_seq = -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT seq, role, content, meta FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (session_id, last_seq, batch_size)).fetchall()
+            for row in rows:
+                yield _message_from_row(row)
+            if len(rows) < batch_size:
+                return
+            last_seq = rows[-1]["seq"]
+
+    def messages_after(self, message_id, limit=1000):
+        """[(id, content)] of up to limit messages with an id above message_id, in id order."""
+        with self.lock:
+            return [tuple(row) for row in self.conn.execute(
+                "SELECT id, content FROM messages WHERE id > ? ORDER BY id LIMIT ?", (message_id, limit))]
+
+    def message_texts(self, message_ids):
+        """{id: content} of the given messages that still exist."""
+        texts = {}
+        for chunk in _chunks(list(message_ids)):
+            with self.lock:
+                texts.update(self.conn.execute(
+                    f"SELECT id, content FROM messages WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+        return texts
+
+    def message_hits(self, message_ids):
+        """{id: row} in the layout of search() for the given messages that still exist."""
+        hits = {}
+        for chunk in _chunks(list(message_ids)):
+            with self.lock:
+                for row in self.conn.execute(
+                        f"""SELECT m.id, m.session_id, m.seq, m.role, s.title, s.updated_at,
+                                   substr(m.content, 1, 120) AS snippet
+                            FROM messages m JOIN sessions s ON s.id = m.session_id
+                            WHERE m.id IN ({','.join('?' * len(chunk))})""", chunk):
+                    hits[row["id"]] = dict(row)
+        return hits
+
+    def track_message_changes(self):
+        """Log deleted and edited messages from now on (the triggers stay in the database)."""
+        with self.lock:
+            self.conn.executescript(CHANGES_SCHEMA)
+
+    def message_changes(self, after=0):
+        """(last seq, set of message ids) deleted or edited after change seq after."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, message_id FROM message_changes WHERE seq > ? ORDER BY seq", (after,)).fetchall()
+        return (rows[-1][0] if rows else after), {row[1] for row in rows}
+
+    def prune_message_changes(self, upto):
+        """Forget changes up to seq upto once they have been applied."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM message_changes WHERE seq <= ?", (upto,))
+
+    def search(self, text, limit=100):
+        """Full-text search over every stored message, best matches first."""
+        if not text.strip():
+            return []
+        with self.lock:
+            if self.has_fts:
+                rows = self.conn.execute(
+                    """SELECT m.session_id, m.seq, m.role, s.title, s.updated_at,
+                              snippet(messages_fts, 0, '[', ']', '…', 12) AS snippet
+                       FROM messages_fts
+                       JOIN messages m ON m.id = messages_fts.rowid
+                       JOIN sessions s ON s.id = m.session_id
+                       WHERE messages_fts MATCH ?
+                       ORDER BY bm25(messages_fts) LIMIT ?""", (fts_query(text), limit)).fetchall()
+            else:
+                rows = self.conn.execute(
+                    """SELECT m.session_id, m.seq, m.role, s.title, s.updated_at,
+                              substr(m.content, 1, 120) AS snippet
+                       FROM messages m JOIN sessions s ON s.id = m.session_id
+                       WHERE m.content LIKE ? ORDER BY s.updated_at DESC LIMIT ?""",
+                    (f"%{text}%", limit)).fetchall()
+        return [dict(row) for row in rows]
+
+
+def _chunks(values, size=500):
+    """values in slices small enough for one IN (...) list."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def title_for(history):
+    """A session title from the first line of its first user message."""
+    for message in history:
+        if message.get("role") == "user" and (message.get("content") or "").strip():
+            return message["content"].strip().splitlines()[0][:80]
+    return None
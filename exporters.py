@@ -0,0 +1,204 @@
+"""
+Conversation exporters for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Each exporter writes a conversation straight to an open file, one message
+at a time, so exporting never builds the whole document in memory:
+
+    txt    plain text, same layout as the original "Export as Text"
+    html   standalone page; all content is HTML-escaped
+    md     Markdown
+    jsonl  one JSON object per line: a "meta" record, then one per message
+
+export_session() writes one conversation atomically.  export_all() exports
+every session in the conversation store in parallel worker processes, each
+with its own SQLite connection, and reports progress through a callback.
+"""
+
+import html
+import json
+import os
+import re
+from datetime import datetime
+
+from conversation_store import ConversationStore
+
+
+class TextExporter:
+    extension = ".txt"
+
+    def __init__(self, f, meta):
+        self.f = f
+        self.meta = meta
+
+    def begin(self):
+        self.f.write("Perplexity AI Conversation Export\n")
+        self.f.write(f"Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        self.f.write(f"Model: {self.meta.get('model', '')}\n")
+        self.f.write("=" * 50 + "\n\n")
+
+    def write_message(self, message):
+        self.f.write(f"{message.get('role', '').title()}: {message.get('content') or ''}\n\n")
+
+    def end(self):
+        pass
+
+
+class MarkdownExporter(TextExporter):
+    extension = ".md"
+
+    def begin(self):
+        self.f.write(f"# {self.meta.get('title') or 'Perplexity AI Conversation'}\n\n")
+        self.f.write(f"- Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        self.f.write(f"- Model: {self.meta.get('model', '')}\n")
+        if self.meta.get("system_prompt"):
+            self.f.write(f"- System prompt: {self.meta['system_prompt']}\n")
+        self.f.write("\n---\n\n")
+
+    def write_message(self, message):
+        speaker = "You" if message.get("role") == "user" else message.get("role", "").title()
+        self.f.write(f"### {speaker}\n\n{message.get('content') or ''}\n\n")
+        if message.get("citations"):
+            sources = " ".join(f"[{n}]({url})" for n, url in enumerate(message["citations"], 1))
+            self.f.write(f"Sources: {sources}\n\n")
+
+
+class HtmlExporter(TextExporter):
+    extension = ".html"
+
+    def begin(self):
+        self.f.write(f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>{html.escape(self.meta.get('title') or 'Perplexity AI Conversation')}</title>
+    <style>
+        body {{ font-family: 'Segoe UI', Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
+        .container {{ max-width: 800px; margin: 0 auto; background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
+        .header {{ border-bottom: 2px solid #007ACC; padding-bottom: 10px; margin-bottom: 20px; }}
+        .message {{ margin: 15px 0; padding: 10px; border-radius: 5px; }}
+        .user {{ background: #E3F2FD; border-left: 4px solid #2196F3; }}
+        .assistant {{ background: #F3E5F5; border-left: 4px solid #9C27B0; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Perplexity AI Conversation</h1>
+            <p>Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            <p>Model: {html.escape(self.meta.get('model') or '')}</p>
+        </div>""")
+
+    def write_message(self, message):
+        role = message.get("role", "")
+        css_class = "user" if role == "user" else "assistant"
+        role_display = "You" if role == "user" else "Assistant"
+        content = html.escape(message.get("content") or "").replace("\n", "<br>\n")
+        if message.get("citations"):
+            content += "<br>\n<small>Sources: " + " ".join(
+                f'<a href="{html.escape(url)}">[{n}]</a>' for n, url in enumerate(message["citations"], 1)) + "</small>"
+        self.f.write(f"""
+        <div class="message {css_class}">
+            <strong>{role_display}:</strong><br>
+            {content}
+        </div>""")
+
+    def end(self):
+        self.f.write("""
+    </div>
+</body>
+</html>
+""")
+
+
+class JsonlExporter(TextExporter):
+    extension = ".jsonl"
+
+    def begin(self):
+        self.f.write(json.dumps(dict(self.meta, type="meta"), ensure_ascii=False) + "\n")
+        self.seq = 0
+
+    def write_message(self, message):
+        self.f.write(json.dumps(dict(message, type="message", seq=self.seq), ensure_ascii=False) + "\n")
+        self.seq += 1
+
+
+EXPORT_FORMATS = {"txt": "Text", "html": "HTML", "md": "Markdown", "jsonl": "JSONL"}
+
+EXPORTERS = {
+    "txt": TextExporter,
+    "html": HtmlExporter,
+    "md": MarkdownExporter,
+    "jsonl": JsonlExporter,
+}
+
+
+def export_session(path, messages, meta, fmt):
+    """Stream messages (any iterable) to path in format fmt; returns the count."""
+    exporter_class = EXPORTERS[fmt]
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        exporter = exporter_class(f, meta)
+        exporter.begin()
+        for message in messages:
+            exporter.write_message(message)
+            count += 1
+        exporter.end()
+    os.replace(tmp_path, path)
+    return count
+
+
+def _file_name(session_id, fmt):
+    return re.sub(r"[^\w.-]+", "_", session_id) + EXPORTERS[fmt].extension
+
+
+def _export_stored_session(db_path, session_id, out_dir, fmt):
+    # Runs in a worker process: open a private connection, stream, close.
+    store = ConversationStore(db_path)
+    try:
+        meta = store.session_header(session_id)
+        path = os.path.join(out_dir, _file_name(session_id, fmt))
+        count = export_session(path, store.iter_messages(session_id), meta, fmt)
+    finally:
+        store.close()
+    return session_id, path, count
+
+
+def export_all(db_path, out_dir, fmt, workers=None, progress=None, session_ids=None):
+    """Export every stored session (or session_ids) to out_dir in parallel.
+
+    progress(done, total, session_id, error) is called in the calling process
+    as each session finishes.  Returns a list of (session_id, path, count).
+    """
+    if fmt not in EXPORTERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    if session_ids is None:
+        store = ConversationStore(db_path)
+        try:
+            session_ids = [row["id"] for row in store.list_sessions(limit=-1)]
+        finally:
+            store.close()
+
+    results = []
+    if not session_ids:
+        return results
+    # Imported here: the GUI imports this module at startup and
+    # multiprocessing is the bulk of its import time.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    # "spawn" so workers never inherit a forked copy of the GUI's threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(_export_stored_session, db_path, session_id, out_dir, fmt): session_id
+                   for session_id in session_ids}
+        for done, future in enumerate(as_completed(futures), 1):
+            error = None
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = str(e)
+            if progress:
+                progress(done, len(futures), futures[future], error)
+    return results
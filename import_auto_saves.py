@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Bulk import of auto-saves for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Earlier versions auto-saved a full copy of the conversation after every
+answer as auto_saves/auto_save_<session_id>_<YYYYmmdd_HHMMSS>.json, so a
+single session can have hundreds of overlapping snapshots.  This command
+loads them all into the conversation store (conversations.db):
+
+- files are grouped by session id and parsed in a process pool
+- one session id can hold several conversations: the app kept the id
+  "default" until New Conversation, and Clear Chat kept it too.  Each
+  group is split into chains of snapshots, in save order, where every
+  history is a prefix of the longer ones; each chain becomes its own
+  session (default, default-2, ...) with its first save time in the title
+- each chain is deduplicated down to its longest history (the latest
+  save wins a tie) and only that snapshot leaves the worker
+- results are written in large transactions together with the list of
+  files they came from, so an interrupted run resumes where it stopped and
+  a re-run only re-reads session ids with new or changed files
+- a session already in the store is only replaced by a longer history
+
+    python import_auto_saves.py [--dir auto_saves] [--db conversations.db] [--workers N]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+from conversation_store import ConversationStore, title_for
+
+AUTO_SAVE_PATTERN = re.compile(r"^auto_save_(?P<session_id>.+)_(?P<stamp>\d{8}_\d{6})\.json$")
+
+
+def scan(directory):
+    """Group auto-save files by session id: {session_id: [(path, size, mtime), ...]}."""
+    groups = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = AUTO_SAVE_PATTERN.match(entry.name)
+            if match and entry.is_file():
+                stat = entry.stat()
+                groups.setdefault(match.group("session_id"), []).append((entry.path, stat.st_size, stat.st_mtime))
+    return groups
+
+
+def session_chains(groups):
+    """Worker: split each (session_id, paths) into conversations, keeping each one's longest history.
+
+    Snapshots are read in save order.  One joins the first chain whose
+    longest history it extends or is a prefix of, and starts a new chain
+    otherwise.  Chains are numbered by their first save: session_id,
+    session_id-2, ...
+
+    Returns (snapshots, errors) where errors is a list of (path, message).
+    """
+    snapshots, errors = [], []
+    for session_id, paths in groups:
+        chains = []  # [first stamp, (role, content) of each message, longest snapshot]
+        for path in sorted(paths, key=lambda path: (_stamp(path), path)):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    chat_data = json.load(f)
+                messages = [(message.get("role"), message.get("content")) for message in chat_data["conversation_history"]]
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                errors.append((path, str(e)))
+                continue
+            for chain in chains:
+                shorter = min(len(chain[1]), len(messages))
+                if chain[1][:shorter] == messages[:shorter]:
+                    if len(messages) >= len(chain[1]):
+                        chain[1], chain[2] = messages, chat_data
+                    break
+            else:
+                chains.append([_stamp(path), messages, chat_data])
+        for number, (stamp, _, chat_data) in enumerate(chains, 1):
+            chat_data["session_id"] = session_id if number == 1 else f"{session_id}-{number}"
+            if len(chains) > 1:
+                saved = f"{stamp[:4]}-{stamp[4:6]}-{stamp[6:8]} {stamp[9:11]}:{stamp[11:13]}:{stamp[13:15]}"
+                chat_data["title"] = f"{title_for(chat_data['conversation_history']) or session_id} ({saved})"
+            snapshots.append(chat_data)
+    return snapshots, errors
+
+
+def _stamp(path):
+    return AUTO_SAVE_PATTERN.match(os.path.basename(path)).group("stamp")
+
+
+def _tasks(groups, files_per_task):
+    """Pack session groups into tasks of roughly files_per_task files."""
+    task, size = [], 0
+    for session_id, files in groups.items():
+        task.append((session_id, files))
+        size += len(files)
+        if size >= files_per_task:
+            yield task
+            task, size = [], 0
+    if task:
+        yield task
+
+
+def import_auto_saves(directory=None, db_path=None, workers=None, batch_files=2000, files_per_task=64, progress=None):
+    """Import every new or changed auto-save file; returns a stats dict.
+
+    progress(files_done, files_total, files_per_sec) is called after each
+    task completes.
+    """
+    directory = directory or config.PATHS["auto_save_dir"]
+    started = time.perf_counter()
+    store = ConversationStore(db_path)
+    try:
+        seen = store.imported_files()
+        all_groups = scan(directory) if os.path.isdir(directory) else {}
+        total_files = sum(len(files) for files in all_groups.values())
+        groups = {}
+        for session_id, files in all_groups.items():
+            if any(seen.get(path) != (size, mtime) for path, size, mtime in files):
+                # A new file can extend any of the id's conversations or start
+                # another, so the chains are rebuilt from every file of the id.
+                groups[session_id] = files
+        pending_files = sum(len(files) for files in groups.values())
+
+        stats = {"files_total": total_files, "files_skipped": total_files - pending_files,
+                 "files_done": 0, "sessions_seen": 0, "sessions_written": 0, "errors": []}
+        batch, batch_records = [], []
+
+        def commit():
+            stats["sessions_written"] += store.bulk_import(batch, batch_records)
+            batch.clear()
+            batch_records.clear()
+
+        if groups:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {}
+                for task in _tasks(groups, files_per_task):
+                    future = pool.submit(session_chains, [(session_id, [f[0] for f in files]) for session_id, files in task])
+                    futures[future] = task
+                for future in as_completed(futures):
+                    task = futures.pop(future)
+                    snapshots, errors = future.result()
+                    stats["errors"].extend(errors)
+                    stats["sessions_seen"] += len(snapshots)
+                    failed = {path for path, _ in errors}
+                    batch.extend(snapshots)
+                    for session_id, files in task:
+                        # Unreadable files are not recorded, so a re-run retries them.
+                        batch_records.extend((path, size, mtime, session_id)
+                                             for path, size, mtime in files if path not in failed)
+                        stats["files_done"] += len(files)
+                    if len(batch_records) >= batch_files:
+                        commit()
+                    if progress:
+                        elapsed = time.perf_counter() - started
+                        progress(stats["files_done"], pending_files, stats["files_done"] / elapsed if elapsed else 0.0)
+        if batch_records:
+            commit()
+    finally:
+        store.close()
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["files_per_sec"] = stats["files_done"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import auto_save_*.json files into the conversation store.")
+    parser.add_argument("--dir", default=config.PATHS["auto_save_dir"], help="auto-save directory (default: %(default)s)")
+    parser.add_argument("--db", default=config.PATHS.get("database_file", "conversations.db"), help="database (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    last_report = [0.0]
+
+    def report(done, total, rate):
+        now = time.perf_counter()
+        if now - last_report[0] >= 1 or done == total:
+            last_report[0] = now
+            print(f"  {done:,}/{total:,} files  ({rate:,.0f} files/sec)", flush=True)
+
+    print(f"📥 Importing auto-saves from {args.dir} into {args.db}...")
+    stats = import_auto_saves(args.dir, args.db, workers=args.workers, progress=report)
+    for path, error in stats["errors"][:20]:
+        print(f"  ⚠️  {os.path.basename(path)}: {error}")
+    if len(stats["errors"]) > 20:
+        print(f"  ⚠️  ... and {len(stats['errors']) - 20} more unreadable files")
+    print(f"✅ {stats['files_done']:,} files parsed ({stats['files_skipped']:,} already imported), "
+          f"{stats['sessions_written']:,} of {stats['sessions_seen']:,} sessions written "
+          f"in {stats['seconds']:.1f}s ({stats['files_per_sec']:,.0f} files/sec)")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
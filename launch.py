@@ -8,6 +8,7 @@ This launcher script checks dependencies and provides helpful error messages.
 
 import sys
 import os
+import importlib.util
 
 def check_python_version():
     """Check if Python version is compatible."""
@@ -19,18 +20,12 @@ def check_python_version():
     return True
 
 def check_dependencies():
-    """Check if required dependencies are installed."""
-    missing_deps = []
-    
-    try:
-        import tkinter
-    except ImportError:
-        missing_deps.append("tkinter")
-    
-    try:
-        import requests
-    except ImportError:
-        missing_deps.append("requests")
+    """Check if required dependencies are installed.
+
+    Only looks the modules up; importing them here would add their import
+    time to every launch before the window can appear.
+    """
+    missing_deps = [name for name in ("tkinter", "requests") if importlib.util.find_spec(name) is None]
     
     if missing_deps:
         print("❌ Error: Missing required dependencies:")
@@ -58,8 +53,50 @@ def check_api_key():
         print("   You'll need to set your Perplexity AI API key in the application")
         return True  # Not a blocking error
 
+def serve(argv):
+    """Run the local API proxy instead of the GUI."""
+    print("🚀 Perplexity AI GUI Client - Local API Proxy")
+    print("=" * 55)
+    if not check_python_version() or not check_dependencies():
+        sys.exit(1)
+    from proxy_server import main as proxy_main
+    sys.exit(proxy_main(argv))
+
+def repl(argv):
+    """Chat in the terminal instead of the GUI."""
+    if not check_python_version():
+        sys.exit(1)
+    if importlib.util.find_spec("requests") is None:
+        check_dependencies()
+        sys.exit(1)
+    from repl import main as repl_main
+    sys.exit(repl_main(argv))
+
+def usage(argv):
+    """Report usage and cost from the usage ledger."""
+    if not check_python_version():
+        sys.exit(1)
+    from usage_ledger import main as usage_main
+    sys.exit(usage_main(argv))
+
+def search(argv):
+    """Search every stored message by meaning."""
+    if not check_python_version():
+        sys.exit(1)
+    from semantic_index import main as search_main
+    sys.exit(search_main(argv))
+
 def main():
     """Main launcher function."""
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "repl":
+        repl(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "usage":
+        usage(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "search":
+        search(sys.argv[2:])
+    
     print("🚀 Perplexity AI GUI Client - Enhanced Edition v2.0")
     print("=" * 55)
     
@@ -0,0 +1,224 @@
+"""
+Model health for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Tracks how each model has been answering lately and stops sending it
+requests while it keeps failing.  A degraded model then costs an instant
+error (or an answer from its fallback) instead of a full API_TIMEOUT wait
+per message.
+
+Every request's outcome goes into a per-model window of the last
+health_window_s seconds, with how long the response took.  Only failures
+that point at the model count against it: timeouts, connection errors,
+HTTP 408 and 5xx, and streams cut off midway.  A 400 or 401 is the
+request's own fault and is not recorded.
+
+Each model has a circuit breaker:
+
+    closed     requests go through
+    open       entered after breaker_failures failures in a row, or when
+               at least breaker_error_rate of breaker_min_requests or more
+               requests in the window failed; requests fail fast with
+               ModelUnavailableError, or route() sends them to the model's
+               fallback in config.MODEL_FALLBACKS
+    half-open  once breaker_cooldown_s has passed, one request at a time
+               goes through as a probe while the rest are treated as if
+               the breaker were open: a success closes the breaker, a
+               failure opens it for twice as long (up to
+               breaker_max_cooldown_s)
+
+A request that allows() let through reports its outcome to record(), or
+to release() when it ended without one (a 400, a stream the caller
+dropped), so the next probe can go.  A probe that never reports is
+written off after request_deadline_s.
+"""
+
+import threading
+import time
+from collections import deque
+
+import config
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class ModelUnavailableError(Exception):
+    """A model's circuit breaker is open and no fallback will take the request."""
+
+    def __init__(self, model, retry_in):
+        super().__init__(f"{model} keeps failing, so requests to it are paused for another {retry_in:.0f}s. "
+                         "Choose another model or try again then.")
+        self.model = model
+        self.retry_in = retry_in
+
+
+class _Breaker:
+    def __init__(self):
+        self.outcomes = deque()  # (time, ok, latency in seconds or None)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.cooldown = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+
+
+class ModelHealth:
+    def __init__(self, window=None, failures=None, error_rate=None, min_requests=None,
+                 cooldown=None, max_cooldown=None, probe_timeout=None, clock=time.monotonic):
+        advanced = config.ADVANCED
+        self.window = window or advanced.get("health_window_s", 300)
+        self.failures = failures or advanced.get("breaker_failures", 3)
+        self.error_rate = error_rate or advanced.get("breaker_error_rate", 0.5)
+        self.min_requests = min_requests or advanced.get("breaker_min_requests", 6)
+        self.cooldown = cooldown or advanced.get("breaker_cooldown_s", 30)
+        self.max_cooldown = max_cooldown or advanced.get("breaker_max_cooldown_s", 600)
+        self.probe_timeout = probe_timeout or advanced.get("request_deadline_s", 600)
+        self.clock = clock
+        self._models = {}  # model -> _Breaker
+        self._lock = threading.Lock()
+
+    def _state(self, breaker, now):
+        if breaker.opened_at is None:
+            return CLOSED
+        return OPEN if now < breaker.opened_at + breaker.cooldown else HALF_OPEN
+
+    def state(self, model):
+        with self._lock:
+            breaker = self._models.get(model)
+            return CLOSED if breaker is None else self._state(breaker, self.clock())
+
+    def _available(self, breaker, now):
+        state = self._state(breaker, now)
+        if state == HALF_OPEN:
+            return not breaker.probe_in_flight or now >= breaker.probe_started + self.probe_timeout
+        return state == CLOSED
+
+    def available(self, model):
+        """True if allows(model) would let a request through now; claims nothing."""
+        with self._lock:
+            breaker = self._models.get(model)
+            return breaker is None or self._available(breaker, self.clock())
+
+    def allows(self, model):
+        """True unless model's breaker is open or its one probe is already out.
+
+        A True from a half-open breaker makes the caller the probe: it must
+        report the outcome to record(), or call release() if there is none.
+        """
+        with self._lock:
+            breaker = self._models.get(model)
+            if breaker is None:
+                return True
+            now = self.clock()
+            if not self._available(breaker, now):
+                return False
+            if self._state(breaker, now) == HALF_OPEN:
+                breaker.probe_in_flight, breaker.probe_started = True, now
+            return True
+
+    def release(self, model):
+        """A request allows() let through ended with no outcome for record()."""
+        with self._lock:
+            breaker = self._models.get(model)
+            if breaker is not None:
+                breaker.probe_in_flight = False
+
+    def retry_in(self, model):
+        """Seconds until an open breaker lets a probe through (0 if it isn't open)."""
+        with self._lock:
+            breaker = self._models.get(model)
+            if breaker is None or breaker.opened_at is None:
+                return 0.0
+            return max(0.0, breaker.opened_at + breaker.cooldown - self.clock())
+
+    def route(self, model, fallbacks=None):
+        """The model to send a request for model to: model itself, else the
+        first fallback down its MODEL_FALLBACKS chain that allows requests.
+
+        Raises ModelUnavailableError if none does.
+        """
+        fallbacks = config.MODEL_FALLBACKS if fallbacks is None else fallbacks
+        candidate, tried = model, set()
+        while candidate and candidate not in tried:
+            if self.available(candidate):
+                return candidate
+            tried.add(candidate)
+            candidate = fallbacks.get(candidate)
+        raise ModelUnavailableError(model, self.retry_in(model))
+
+    def record(self, model, ok, latency=None):
+        """Count one request's outcome against model; latency in seconds."""
+        now = self.clock()
+        with self._lock:
+            breaker = self._models.setdefault(model, _Breaker())
+            breaker.probe_in_flight = False
+            breaker.outcomes.append((now, ok, latency))
+            self._trim(breaker, now)
+            if ok:
+                breaker.consecutive_failures = 0
+                if breaker.opened_at is not None:
+                    # The model answered: close, and let the failures that opened it go.
+                    breaker.opened_at = None
+                    breaker.cooldown = 0.0
+                    breaker.outcomes = deque([(now, ok, latency)])
+                return
+            breaker.consecutive_failures += 1
+            state = self._state(breaker, now)
+            if state == HALF_OPEN:
+                breaker.opened_at = now
+                breaker.cooldown = min(self.max_cooldown, breaker.cooldown * 2)
+            elif state == CLOSED and self._tripped(breaker):
+                breaker.opened_at = now
+                breaker.cooldown = self.cooldown
+                print(f"Circuit breaker opened for {model}; pausing it for {self.cooldown:.0f}s")
+
+    def _trim(self, breaker, now):
+        while breaker.outcomes and breaker.outcomes[0][0] < now - self.window:
+            breaker.outcomes.popleft()
+
+    def _tripped(self, breaker):
+        if breaker.consecutive_failures >= self.failures:
+            return True
+        requests = len(breaker.outcomes)
+        failed = sum(1 for _, ok, _ in breaker.outcomes if not ok)
+        return requests >= self.min_requests and failed >= self.error_rate * requests
+
+    def status(self, model):
+        """{"state", "requests", "errors", "error_rate", "latency", "retry_in"} over the window.
+
+        latency is the median response time of the window's successes in
+        seconds, or None.
+        """
+        now = self.clock()
+        with self._lock:
+            breaker = self._models.get(model)
+            if breaker is None:
+                return {"state": CLOSED, "requests": 0, "errors": 0, "error_rate": 0.0, "latency": None, "retry_in": 0.0}
+            self._trim(breaker, now)
+            outcomes = list(breaker.outcomes)
+            state = self._state(breaker, now)
+            retry_in = max(0.0, breaker.opened_at + breaker.cooldown - now) if state == OPEN else 0.0
+        errors = sum(1 for _, ok, _ in outcomes if not ok)
+        latencies = sorted(latency for _, ok, latency in outcomes if ok and latency is not None)
+        return {"state": state, "requests": len(outcomes), "errors": errors,
+                "error_rate": errors / len(outcomes) if outcomes else 0.0,
+                "latency": latencies[len(latencies) // 2] if latencies else None, "retry_in": retry_in}
+
+    def snapshot(self):
+        """{model: status()} for every model that has had a request."""
+        with self._lock:
+            models = list(self._models)
+        return {model: self.status(model) for model in models}
+
+
+def describe(status):
+    """(text, level) for showing a status; level is "ok", "degraded", "down" or None (no requests yet)."""
+    if status["state"] == OPEN:
+        return f"● paused, retry in {status['retry_in']:.0f}s", "down"
+    if status["state"] == HALF_OPEN:
+        return "● recovering", "degraded"
+    if not status["requests"]:
+        return "", None
+    if status["errors"]:
+        return f"● {status['errors']}/{status['requests']} failed", "degraded"
+    return (f"● {status['latency']:.1f}s" if status["latency"] is not None else "● ok"), "ok"
@@ -0,0 +1,254 @@
+"""
+Automatic model routing for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Picks a model for each request sent with the "auto" model
+(config.AUTO_MODEL), from config.AUTO_ROUTE_MODELS.
+
+Each model has capability classes, read from its name and its
+MODEL_DESCRIPTIONS entry (see capabilities()):
+
+    online / chat       searches the web, or answers from the model alone
+    fast / advanced     plain models, and "pro"/"advanced" ones
+    reasoning / deep    step-by-step reasoning, and multi-step research
+
+The prompt decides which classes will do (see classify()):
+- quick questions (at most auto_quick_words words) go to fast models
+- reasoning questions ("prove", "step by step", "calculate"...) go to
+  reasoning models
+- research questions (auto_research_words words or more, or research cues
+  in a longer prompt) go to deep models
+- anything else goes to fast or advanced models
+
+Among the healthy models of those classes (model_health), the one expected
+to finish first wins: time to first token plus the answer's expected length
+over the model's token rate.  Both speeds are running averages of observed
+answers (observe()), starting from a per-class guess.
+
+Every decision and observation is appended to PATHS["routing_log_file"]
+(JSON lines) for review.  A new router replays the latest observations
+from it, so it remembers speeds across restarts.
+
+    python model_router.py     summary of the routing log
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import config
+
+# (time to first token in seconds, tokens per second) before a model has been observed
+PRIORS = {"deep": (15.0, 30.0), "reasoning": (3.0, 40.0), "advanced": (1.5, 50.0), "fast": (0.8, 70.0)}
+# prompt kind -> (classes that can answer it, expected answer tokens)
+KINDS = {
+    "quick": (("fast",), 150),
+    "general": (("fast", "advanced"), 500),
+    "reasoning": (("reasoning",), 800),
+    "research": (("deep",), 2000),
+}
+SMOOTHING = 0.3  # weight of the newest observation in the running averages
+REPLAY_BYTES = 256 * 1024  # log tail replayed by a new router
+MAX_LOG_BYTES = 5 * 1024 * 1024  # the log is rotated to <name>.1 past this
+
+_RESEARCH = re.compile(r"\b(research|in[- ]depth|comprehensive|literature|survey|report|compare|comparison|"
+                       r"pros and cons|analy[sz]e|analysis|sources|citations|deep dive)\b", re.IGNORECASE)
+_REASONING = re.compile(r"\b(prove|proof|derive|step[- ]by[- ]step|reasoning|calculate|solve|puzzle|logic|"
+                        r"equation|theorem|why does|why is|how many)\b", re.IGNORECASE)
+_WEB = re.compile(r"\b(latest|today|news|current|currently|this (week|month|year)|recent|price of)\b", re.IGNORECASE)
+
+
+def capabilities(model):
+    """The capability classes of a model, from its name and description."""
+    text = f"{model} {config.MODEL_DESCRIPTIONS.get(model, '')}".lower()
+    classes = {"chat" if re.search(r"chat|instruct|offline", text) else "online"}
+    if "research" in text:
+        classes.add("deep")
+    if "reasoning" in text:
+        classes.add("reasoning")
+    if re.search(r"\bpro\b|-pro\b|advanced|enhanced|large|70b", text):
+        classes.add("advanced")
+    if not classes & {"deep", "reasoning", "advanced"}:
+        classes.add("fast")
+    if "code" in text:
+        classes.add("code")
+    return classes
+
+
+def classify(prompt):
+    """(kind, needs_web) for a prompt; kind is one of KINDS."""
+    words = len(prompt.split())
+    advanced = config.ADVANCED
+    quick_words = advanced.get("auto_quick_words", 15)
+    needs_web = bool(_WEB.search(prompt))
+    if words >= advanced.get("auto_research_words", 150) or (words > quick_words and _RESEARCH.search(prompt)):
+        return "research", needs_web
+    if _REASONING.search(prompt):
+        return "reasoning", needs_web
+    return ("quick" if words <= quick_words else "general"), needs_web
+
+
+class ModelRouter:
+    def __init__(self, models=None, log_path=None):
+        self.models = list(models or config.AUTO_ROUTE_MODELS)
+        self.log_path = log_path or config.PATHS.get("routing_log_file", "logs/model_routing.jsonl")
+        self.speeds = {}  # model -> {"ttft": seconds, "rate": tokens/s, "answers": n}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Called with self._lock held.
+        self.loaded = True
+        try:
+            with open(self.log_path, "rb") as f:
+                start = max(0, f.seek(0, os.SEEK_END) - REPLAY_BYTES)
+                f.seek(start)
+                lines = f.read().splitlines()[1 if start else 0:]  # the first line may be cut
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Could not read routing log: {e}")
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("event") == "answer":
+                self._update(entry["model"], entry.get("ttft_s"), entry.get("rate"))
+
+    def speed(self, model):
+        """(time to first token in seconds, tokens per second) expected of model."""
+        with self._lock:
+            if not self.loaded:
+                self._load()
+            return self._speed(model)
+
+    def _speed(self, model):
+        observed = self.speeds.get(model)
+        if observed:
+            return observed["ttft"], observed["rate"]
+        classes = capabilities(model)
+        for name in ("deep", "reasoning", "advanced"):
+            if name in classes:
+                return PRIORS[name]
+        return PRIORS["fast"]
+
+    def choose(self, messages, health=None, session_id=None):
+        """(model, reason) for a request with these messages.
+
+        health (a ModelHealth) rules out models that are paused.
+        """
+        prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        kind, needs_web = classify(prompt)
+        wanted, tokens = KINDS[kind]
+        healthy = [model for model in self.models if health is None or health.available(model)] or self.models
+        pool = [model for model in healthy if capabilities(model) & set(wanted)
+                and (not needs_web or "online" in capabilities(model))]
+        described = "/".join(wanted)
+        if not pool:
+            pool, described = healthy, "healthy"
+        with self._lock:
+            if not self.loaded:
+                self._load()
+            estimates = {}
+            for model in pool:
+                ttft, rate = self._speed(model)
+                estimates[model] = ttft + tokens / rate
+        model = min(pool, key=lambda name: (estimates[name], self.models.index(name)))
+        reason = f"{kind} prompt, fastest {described} model (~{estimates[model]:.0f}s)"
+        self._log({"event": "route", "session_id": session_id, "kind": kind, "words": len(prompt.split()),
+                   "model": model, "reason": reason, "estimates": {name: round(value, 2) for name, value in estimates.items()},
+                   "paused": [name for name in self.models if name not in healthy]})
+        return model, reason
+
+    def observe(self, model, ttft, total, completion_tokens, streamed=True):
+        """Fold one answer's timing into the model's running speeds.
+
+        ttft and total are seconds.  Without streaming only the total is
+        known; it is split using the model's current token rate.
+        """
+        with self._lock:
+            if not self.loaded:
+                self._load()
+            ttft_now, rate_now = self._speed(model)
+            if streamed and ttft is not None:
+                generating = total - ttft
+                rate = completion_tokens / generating if completion_tokens and generating > 0.05 else None
+            else:
+                ttft, rate = max(0.1, total - completion_tokens / rate_now), None
+            self._update(model, ttft, rate)
+        self._log({"event": "answer", "model": model, "ttft_s": round(ttft, 3), "rate": rate and round(rate, 1),
+                   "tokens": completion_tokens, "streamed": streamed})
+
+    def _update(self, model, ttft, rate):
+        speeds = self.speeds.get(model)
+        if speeds is None:
+            prior_ttft, prior_rate = self._speed(model)
+            speeds = self.speeds[model] = {"ttft": ttft or prior_ttft, "rate": rate or prior_rate, "answers": 0}
+        else:
+            if ttft is not None:
+                speeds["ttft"] += SMOOTHING * (ttft - speeds["ttft"])
+            if rate:
+                speeds["rate"] += SMOOTHING * (rate - speeds["rate"])
+        speeds["answers"] += 1
+
+    def _log(self, entry):
+        entry = dict({"time": time.strftime("%Y-%m-%dT%H:%M:%S")}, **entry)
+        try:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > MAX_LOG_BYTES:
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Routing log write failed: {e}")
+
+
+def summarize(log_path):
+    """Counts of routing decisions by prompt kind and model, and observed speeds, from a routing log."""
+    routes = defaultdict(Counter)
+    router = ModelRouter(log_path=log_path)
+    router.loaded = True
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("event") == "route":
+                routes[entry["kind"]][entry["model"]] += 1
+            elif entry.get("event") == "answer":
+                router._update(entry["model"], entry.get("ttft_s"), entry.get("rate"))
+    return routes, router.speeds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise automatic model routing decisions.")
+    parser.add_argument("--log", help="routing log (default: config PATHS['routing_log_file'])")
+    args = parser.parse_args(argv)
+    log_path = args.log or config.PATHS.get("routing_log_file", "logs/model_routing.jsonl")
+    if not os.path.exists(log_path):
+        print(f"No routing log at {log_path} yet; choose the 'auto' model to start one.")
+        return 0
+    routes, speeds = summarize(log_path)
+    print("🔀 Routing decisions\n")
+    for kind in KINDS:
+        if routes.get(kind):
+            print(f"{kind:<10}" + ", ".join(f"{model} ×{count}" for model, count in routes[kind].most_common()))
+    print("\n⏱  Observed speeds\n")
+    for model, speed in sorted(speeds.items()):
+        print(f"{model:<24}first token {speed['ttft']:>5.1f}s   {speed['rate']:>6.1f} tokens/s   ({speed['answers']} answers)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""
+Perplexity API client for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+A thin wrapper over the chat completions endpoint.  It does not depend on
+Tk, so the GUI, the headless chat engine and command-line tools all share
+it.  requests is only imported when the first request is made, which keeps
+it off the startup path.
+
+Each model's recent failures and response times are tracked in
+self.health (model_health.ModelHealth).  While a model keeps failing, a
+request for it raises ModelUnavailableError at once instead of waiting
+for the timeout; route() picks the fallback to send to instead.
+
+A request has three timeouts, and optionally a deadline:
+
+    connect      connect_timeout_s to reach the API
+    first byte   API_TIMEOUT (or timeout=) for the response to start
+    idle         stream_idle_timeout_s between the events of a stream
+    deadline     a time.monotonic() value the whole request must finish
+                 by; the request scheduler sets one per request
+
+A read blocked on a stalled stream cannot give up on its own, so a
+StreamWatchdog thread shuts down the socket of any stream that is past
+its first byte, idle or deadline limit.  The stream then ends with an
+{"error", "timeout"} chunk instead of hanging its worker.  Timeouts
+before a stream starts raise RequestTimeoutError.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import config
+from model_health import ModelHealth, ModelUnavailableError
+
+if TYPE_CHECKING:
+    import requests
+
+BASE_URL = "https://api.perplexity.ai"
+
+
+def import_requests():
+    """Import requests (the slowest dependency) on first use."""
+    import requests
+    return requests
+
+
+class RequestTimeoutError(Exception):
+    """A request ran out of time; kind is "connect", "first_byte", "idle" or "deadline"."""
+
+    def __init__(self, message, kind):
+        super().__init__(message)
+        self.kind = kind
+
+
+class _Watch:
+    def __init__(self, response, due, kind):
+        self.response = response
+        self.due = due  # time.monotonic() by which the stream must send something
+        self.kind = kind  # which limit due is
+        self.fired = False
+
+
+class StreamWatchdog:
+    """Shuts down streams that have sent nothing by their due time."""
+
+    def __init__(self, interval=0.25, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._watches = set()
+        self._lock = threading.Condition()
+        self._thread = None
+
+    def watch(self, response, due, kind):
+        """Start watching response; returns the watch for touch() and unwatch()."""
+        watch = _Watch(response, due, kind)
+        with self._lock:
+            self._watches.add(watch)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pplx-stream-watchdog", daemon=True)
+                self._thread.start()
+            self._lock.notify()
+        return watch
+
+    def touch(self, watch, due, kind):
+        """The stream sent something; it now has until due."""
+        with self._lock:
+            watch.due, watch.kind = due, kind
+
+    def unwatch(self, watch):
+        with self._lock:
+            self._watches.discard(watch)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._watches:
+                    self._lock.wait()
+                now = self.clock()
+                overdue = [watch for watch in self._watches if not watch.fired and now >= watch.due]
+                for watch in overdue:
+                    watch.fired = True
+            for watch in overdue:
+                _abort(watch.response)
+            time.sleep(self.interval)
+
+
+def _abort(response):
+    """Shut down the socket under a response, so a read blocked on it returns."""
+    raw = getattr(response, "raw", None)
+    sock = getattr(getattr(raw, "_connection", None), "sock", None)
+    if sock is None:
+        try:
+            sock = raw._fp.fp.raw._sock  # urllib3 1.x
+        except AttributeError:
+            sock = None
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+        else:
+            response.close()
+    except OSError:
+        pass
+
+
+def _due(at, kind, deadline):
+    """(due, kind) for a limit at time at, or the deadline if that comes first."""
+    if deadline is not None and deadline <= at:
+        return deadline, "deadline"
+    return at, kind
+
+
+def load_api_key(path=None):
+    """The key saved by the GUI, else $PERPLEXITY_API_KEY, else ""."""
+    path = path or config.PATHS["api_key_file"]
+    try:
+        with open(path, "r") as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    return os.getenv("PERPLEXITY_API_KEY", "")
+
+
+class PerplexityAPI:
+    def __init__(self, api_key: str, base_url=None, pool_size=None):
+        if not api_key:
+            raise ValueError("API key cannot be empty.")
+        self.api_key = api_key
+        self.base_url = (base_url or BASE_URL).rstrip("/")
+        self.pool_size = pool_size or config.ADVANCED.get("max_concurrent_requests", 4)
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        self.request_count = 0
+        self.last_request_time = None
+        self._http = None
+        self._http_lock = threading.Lock()
+        self.health = ModelHealth()
+        advanced = config.ADVANCED
+        self.connect_timeout = advanced.get("connect_timeout_s", 10)
+        self.first_byte_timeout = config.API_TIMEOUT
+        self.idle_timeout = advanced.get("stream_idle_timeout_s", 30)
+        self.watchdog = StreamWatchdog()
+
+    @property
+    def http(self):
+        """One pooled HTTP session shared by every tab's requests, sized to
+        the request worker pool so concurrent streams reuse connections.
+        Created on the first request rather than at startup."""
+        with self._http_lock:
+            if self._http is None:
+                requests = import_requests()
+                http = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                http.mount("https://", adapter)
+                http.mount("http://", adapter)
+                self._http = http
+            return self._http
+
+    def route(self, model):
+        """The model to send a request for model to (itself unless it keeps failing).
+
+        Raises ModelUnavailableError if neither it nor a fallback in
+        config.MODEL_FALLBACKS will take requests right now.
+        """
+        return self.health.route(model)
+
+    def _handle_response_error(self, response: "requests.Response"):
+        try:
+            error_data = response.json()
+            error_message = error_data.get("error", {}).get("message", response.text)
+        except json.JSONDecodeError:
+            error_message = response.text
+        
+        if response.status_code == 401:
+            error_message = "Invalid API key. Please check your API key and try again."
+        elif response.status_code == 429:
+            error_message = "Rate limit exceeded. Please wait a moment before trying again."
+        elif response.status_code == 500:
+            error_message = "Server error. Please try again later."
+        
+        raise import_requests().exceptions.HTTPError(
+            f"API request failed with status {response.status_code}: {error_message}",
+            response=response
+        )
+
+    def chat_completion(self, model, messages, stream=False, max_tokens=None, temperature=None,
+                        top_p=None, top_k=None, presence_penalty=None, frequency_penalty=None,
+                        timeout=None, deadline=None):
+        """Send a chat completion request.
+
+        timeout overrides the first byte timeout; deadline is a
+        time.monotonic() value the request must be done by.
+        """
+        endpoint = f"{self.base_url}/chat/completions"
+        payload = {"model": model, "messages": messages, "stream": stream}
+        
+        if max_tokens is not None: payload["max_tokens"] = max_tokens
+        if temperature is not None: payload["temperature"] = temperature
+        if top_p is not None: payload["top_p"] = top_p
+        if top_k is not None: payload["top_k"] = top_k
+        if presence_penalty is not None: payload["presence_penalty"] = presence_penalty
+        if frequency_penalty is not None: payload["frequency_penalty"] = frequency_penalty
+        
+        started_at = time.monotonic()
+        if deadline is not None and started_at >= deadline:
+            raise RequestTimeoutError("The request ran out of time before it could be sent.", "deadline")
+        if not self.health.allows(model):
+            raise ModelUnavailableError(model, self.health.retry_in(model))
+        first_byte = timeout or self.first_byte_timeout
+        connect, read = self.connect_timeout, first_byte
+        if deadline is not None:
+            # The socket timeouts never outlast the deadline.
+            connect, read = min(connect, deadline - started_at), min(read, deadline - started_at)
+        self.request_count += 1
+        self.last_request_time = datetime.now()
+        requests = import_requests()
+
+        try:
+            response = self.http.post(endpoint, headers=self.headers, json=payload, stream=stream,
+                                      timeout=(connect, read))
+            response.raise_for_status()
+            if stream:
+                # A stream is only healthy once it has run to the end.
+                return self._handle_streamed_response(response, model, time.monotonic() - started_at,
+                                                      (started_at, first_byte, deadline))
+            data = response.json()
+            self.health.record(model, True, time.monotonic() - started_at)
+            return data
+        except requests.exceptions.RequestException as e:
+            if _model_failure(e):
+                self.health.record(model, False)
+            else:
+                self.health.release(model)
+            if hasattr(e, 'response') and e.response is not None:
+                self._handle_response_error(e.response)
+            if isinstance(e, requests.exceptions.ConnectTimeout):
+                raise RequestTimeoutError(f"Could not connect to the API within {connect:.0f}s.", "connect") from e
+            if isinstance(e, requests.exceptions.ReadTimeout):
+                if read < first_byte:
+                    raise RequestTimeoutError("The request ran past its deadline.", "deadline") from e
+                raise RequestTimeoutError(f"No answer from {model} within {read:.0f}s.", "first_byte") from e
+            raise
+
+    def _handle_streamed_response(self, response: "requests.Response", model=None, latency=None, limits=None):
+        """Yield the stream's chunks; limits is (started_at, first_byte, deadline) for the watchdog."""
+        ok = None  # stays None if the caller stops reading early
+        watch = None
+        if limits is not None:
+            started_at, first_byte, deadline = limits
+            watch = self.watchdog.watch(response, *_due(started_at + first_byte, "first_byte", deadline))
+        try:
+            for line in response.iter_lines():
+                if line:
+                    decoded_line = line.decode('utf-8')
+                    if decoded_line.startswith('data: '):
+                        if watch is not None:
+                            self.watchdog.touch(watch, *_due(time.monotonic() + self.idle_timeout, "idle", deadline))
+                        json_str = decoded_line[len('data: '):]
+                        if json_str.strip() == "[DONE]":
+                            ok = True
+                            yield {"done": True}
+                            return
+                        try:
+                            chunk = json.loads(json_str)
+                            yield chunk
+                        except json.JSONDecodeError:
+                            print(f"Warning: Could not decode JSON chunk: {json_str}")
+            if watch is not None and watch.fired:
+                raise RequestTimeoutError("cut off by the watchdog", watch.kind)
+            ok = True
+        except Exception as e:
+            ok = False
+            if watch is not None and (watch.fired or _read_timed_out(e)):
+                # Cut off by the watchdog, or by the socket's read timeout a moment before it.
+                if watch.kind == "first_byte":
+                    message = f"No answer from {model or 'the model'} within {first_byte:.0f}s."
+                elif watch.kind == "idle":
+                    message = f"The answer stalled: nothing arrived for {self.idle_timeout:.0f}s."
+                else:
+                    message = "The request ran past its deadline."
+                    ok = None  # the time ran out, the model did not fail
+                yield {"error": message, "timeout": watch.kind}
+            else:
+                print(f"Error while processing stream: {e}")
+                yield {"error": str(e)}
+        finally:
+            if watch is not None:
+                self.watchdog.unwatch(watch)
+            response.close()
+            if model is not None and ok is not None:
+                self.health.record(model, ok, latency if ok else None)
+            elif model is not None:
+                self.health.release(model)
+
+
+def _read_timed_out(error):
+    """True if error is a socket read timeout, as raised while reading a response body."""
+    requests = import_requests()
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    from urllib3.exceptions import ReadTimeoutError
+    cause = error.args[0] if isinstance(error, requests.exceptions.ConnectionError) and error.args else None
+    return isinstance(cause, ReadTimeoutError)
+
+
+def _model_failure(error):
+    """True for errors that say the model is struggling, not that the request was wrong."""
+    requests = import_requests()
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and (response.status_code == 408 or response.status_code >= 500)
@@ -0,0 +1,136 @@
+"""
+Background persistence writer for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Serializing and writing conversations used to happen on the Tk thread,
+which froze the UI after every answer once a history grew large.  All disk
+work now goes through one PersistenceWriter thread:
+
+    writer.submit(key, job)   run job() on the writer thread, soon
+    writer.flush()            block until everything submitted has run
+    writer.shutdown()         flush, then stop the thread
+
+Jobs are coalesced by key: submitting again for a key that has not been
+written yet replaces the pending job, so a burst of saves within the delay
+window becomes one write.  Callers must snapshot whatever a job needs on
+the UI thread; the job itself must never touch Tk.
+"""
+
+import json
+import os
+import threading
+import time
+
+import config
+
+
+def write_json_atomic(path, data, indent=None):
+    """Write data as JSON to a temp file and rename it over path."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def common_prefix(old, new) -> int:
+    """Number of leading messages old and new share.
+
+    Messages are compared by identity: a turn that was popped and replaced
+    (regenerate) is a new dict even if its text happens to match.
+    """
+    limit = min(len(old), len(new))
+    i = 0
+    while i < limit and old[i] is new[i]:
+        i += 1
+    return i
+
+
+class PersistenceWriter:
+    def __init__(self, delay_ms=None):
+        if delay_ms is None:
+            delay_ms = config.ADVANCED.get("persist_delay_ms", 500)
+        self.delay = delay_ms / 1000
+        self._cond = threading.Condition()
+        self._pending = {}   # key -> [due, job], in submission order
+        self._running = 0
+        self._stopping = False
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="pplx-persist", daemon=True)
+        self._thread.start()
+
+    def submit(self, key, job, delay=True):
+        """Schedule job(); replaces any job still pending under key.
+
+        With delay=False the job runs as soon as the thread is free.
+        """
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("persistence writer is shut down")
+            entry = self._pending.get(key)
+            if entry is not None:
+                # Keep the original deadline so a steady stream of saves
+                # still gets written within one delay window.
+                entry[1] = job
+                self.coalesced += 1
+                if not delay:
+                    entry[0] = 0
+            else:
+                self._pending[key] = [time.monotonic() + self.delay if delay else 0, job]
+            self._cond.notify()
+
+    def flush(self, timeout=None) -> bool:
+        """Run every pending job now and wait for them; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            for entry in self._pending.values():
+                entry[0] = 0
+            self._cond.notify_all()
+            while self._pending or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=None) -> bool:
+        """Flush everything and stop the writer thread."""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._running
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping and not self._pending:
+                        return
+                    now = time.monotonic()
+                    due = [key for key, (at, _) in self._pending.items() if at <= now]
+                    if due:
+                        break
+                    next_due = min((at for at, _ in self._pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+                jobs = [self._pending.pop(key)[1] for key in due]
+                self._running = len(jobs)
+
+            for job in jobs:
+                try:
+                    job()
+                    self.writes += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Background save failed: {e}")
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
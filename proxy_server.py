@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Local API proxy for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Serves an OpenAI-compatible endpoint on localhost so every tool on the
+machine can share one Perplexity API key and one process's resources:
+
+- one pooled PerplexityAPI client, with a cap on concurrent upstream requests
+- one token-bucket rate limiter; requests wait for a token and then for a
+  free upstream connection rather than fail, unless the wait would exceed
+  the queue timeout (then 429)
+- one response cache: an identical request (model, messages, parameters)
+  inside the TTL is answered without going upstream
+- one usage tally per model and per client, at GET /v1/usage, with every
+  upstream completion also appended to the usage ledger (usage_ledger.py)
+- one circuit breaker per model (model_health.py): a model that keeps
+  failing is answered by its fallback, or with a 503 at once
+- the client's connect, first byte and stream idle timeouts: an upstream
+  request that runs out of time is answered with a 504
+
+Endpoints:
+
+    POST /v1/chat/completions   streaming ("stream": true, server-sent events) or not
+    GET  /v1/models
+    GET  /v1/usage
+    GET  /health                each model's recent failures and breaker state
+
+    python proxy_server.py [--port 8765] [--rate 5] [--cache-ttl 300]
+    python launch.py serve [same options]
+
+A client can skip the cache for one request with "Cache-Control: no-cache"
+and names itself for the usage tally with an "X-Client" header.
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from chat_engine import PARAMETER_TYPES
+from model_health import ModelUnavailableError
+from perplexity_api import PerplexityAPI, RequestTimeoutError, import_requests, load_api_key
+from usage_ledger import UsageLedger, estimate_usage
+
+PARAMETER_NAMES = tuple(name for name, _ in PARAMETER_TYPES)
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class ProxyError(Exception):
+    """An error to return to the client as an OpenAI-style error body."""
+
+    def __init__(self, status, message, error_type="invalid_request_error"):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+class RateLimiter:
+    """Token bucket: rate requests per second on average, burst at once."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take one token, waiting up to timeout seconds; False if none came."""
+        if not self.rate:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class ResponseCache:
+    """LRU of finished responses that expire after ttl seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(body):
+        request = {name: body.get(name) for name in ("model", "messages", "stream") + PARAMETER_NAMES}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if not self.ttl or not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _ProxyHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Connections waiting to be accepted; with the default of 5 a burst of
+    # clients connecting at once gets refused or timed out.
+    request_queue_size = 128
+
+
+class ProxyServer:
+    """The shared client, limiter, cache and usage tally behind the HTTP server."""
+
+    def __init__(self, api_client, host="127.0.0.1", port=None, rate=None, burst=None,
+                 cache_ttl=None, cache_entries=None, max_concurrent=None, verbose=False, ledger=None):
+        advanced = config.ADVANCED
+        self.api_client = api_client
+        self.ledger = ledger  # UsageLedger for upstream completions, or None
+        self.limiter = RateLimiter(advanced.get("proxy_rate_limit", 5.0) if rate is None else rate,
+                                   advanced.get("proxy_rate_burst", 10) if burst is None else burst)
+        self.cache = ResponseCache(advanced.get("proxy_cache_entries", 256) if cache_entries is None else cache_entries,
+                                   advanced.get("proxy_cache_ttl", 300) if cache_ttl is None else cache_ttl)
+        self.upstream_slots = threading.BoundedSemaphore(max_concurrent or advanced.get("proxy_max_concurrent", 8))
+        self.queue_timeout = advanced.get("proxy_queue_timeout", 30)
+        self.verbose = verbose
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._usage = {"models": {}, "clients": {}, "rate_limited": 0}
+        self.httpd = _ProxyHTTPServer((host, advanced.get("proxy_port", 8765) if port is None else port), ProxyHandler)
+        self.httpd.proxy = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Serve on a background thread (for tests and embedding)."""
+        self._thread = threading.Thread(target=self.serve_forever, name="pplx-proxy", daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # Requests
+    def chat_completion(self, body, client, use_cache=True):
+        """Non-streamed completion; returns (response, cached)."""
+        key = ResponseCache.key(body)
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            self._record(client, body["model"], None, cached=True)
+            return cached, True
+        body = self._routed(body)
+        key = ResponseCache.key(body)
+        started_at = time.monotonic()
+        with self._upstream(client, body["model"]):
+            response = self.api_client.chat_completion(model=body["model"], messages=body["messages"],
+                                                       stream=False, **_parameters(body))
+        usage = response.get("usage") if isinstance(response, dict) else None
+        self._record(client, body["model"], usage)
+        self._ledger_record(client, body, usage, started_at, lambda: _message_text(response))
+        self.cache.put(key, response)
+        return response, False
+
+    def stream_completion(self, body, client, use_cache=True):
+        """Yield (chunk, cached) for a streamed completion.
+
+        The upstream request is made before the first chunk is yielded, so
+        errors that happen before streaming starts raise here.
+        """
+        key = ResponseCache.key(body)
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            self._record(client, body["model"], None, cached=True)
+            for chunk in cached:
+                yield chunk, True
+            return
+        body = self._routed(body)
+        key = ResponseCache.key(body)
+        chunks, usage = [], None
+        started_at = time.monotonic()
+        with self._upstream(client, body["model"]):
+            stream = self.api_client.chat_completion(model=body["model"], messages=body["messages"],
+                                                     stream=True, **_parameters(body))
+            try:
+                for chunk in stream:
+                    if chunk.get("done"):
+                        break
+                    if "error" in chunk:
+                        if chunk.get("timeout"):
+                            raise ProxyError(504, chunk["error"], "upstream_timeout")
+                        raise ProxyError(502, chunk["error"], "upstream_error")
+                    usage = chunk.get("usage") or usage
+                    chunks.append(chunk)
+                    yield chunk, False
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+        self._record(client, body["model"], usage)
+        self._ledger_record(client, body, usage, started_at,
+                            lambda: "".join((c.get("choices") or [{}])[0].get("delta", {}).get("content") or "" for c in chunks))
+        self.cache.put(key, chunks)
+
+    def _routed(self, body):
+        """body with its model swapped for the fallback if that model keeps failing (see model_health.py)."""
+        route = getattr(self.api_client, "route", None)
+        model = route(body["model"]) if route else body["model"]
+        return body if model == body["model"] else dict(body, model=model)
+
+    def _upstream(self, client, model):
+        deadline = time.monotonic() + self.queue_timeout
+        if not self.limiter.acquire(self.queue_timeout):
+            self._rate_limited()
+            raise ProxyError(429, "Local rate limit exceeded; try again shortly.", "rate_limit_error")
+        return _Slot(self, client, model, deadline)
+
+    def _rate_limited(self):
+        with self._lock:
+            self._usage["rate_limited"] += 1
+
+    def _record(self, client, model, usage, cached=False, failed=False):
+        with self._lock:
+            for table, name in ((self._usage["models"], model), (self._usage["clients"], client)):
+                entry = table.setdefault(name, dict({"requests": 0, "cached": 0, "errors": 0}, **dict.fromkeys(USAGE_FIELDS, 0)))
+                entry["requests"] += 1
+                entry["cached"] += cached
+                entry["errors"] += failed
+                for field in USAGE_FIELDS:
+                    entry[field] += (usage or {}).get(field) or 0
+
+    def _ledger_record(self, client, body, usage, started_at, answer_text):
+        """Append an upstream completion to the ledger; cached answers cost nothing and are skipped."""
+        if self.ledger is None:
+            return
+        estimated = not usage
+        if estimated:
+            usage = estimate_usage(body["messages"], answer_text())
+        try:
+            self.ledger.record(body["model"], usage, int((time.monotonic() - started_at) * 1000),
+                               source=f"proxy:{client}", estimated=estimated)
+        except Exception as e:
+            print(f"Usage ledger write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            usage = copy.deepcopy(self._usage)
+        usage.update(uptime_s=int(time.time() - self.started_at), cache_entries=len(self.cache),
+                     cache_hits=self.cache.hits, cache_misses=self.cache.misses)
+        return usage
+
+
+class _Slot:
+    """Holds one upstream connection slot; records a failure if the body raises."""
+
+    def __init__(self, proxy, client, model, deadline):
+        self.proxy, self.client, self.model = proxy, client, model
+        self.deadline = deadline  # time.monotonic() after which waiting for a slot gives up
+
+    def __enter__(self):
+        if not self.proxy.upstream_slots.acquire(timeout=max(0.0, self.deadline - time.monotonic())):
+            self.proxy._rate_limited()
+            raise ProxyError(429, "Every upstream connection is busy; try again shortly.", "rate_limit_error")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.proxy.upstream_slots.release()
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.proxy._record(self.client, self.model, None, failed=True)
+
+
+def _message_text(response):
+    try:
+        return response["choices"][0]["message"]["content"] or ""
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def _parameters(body):
+    return {name: body[name] for name in PARAMETER_NAMES if body.get(name) is not None}
+
+
+def _upstream_error(e):
+    """Map an exception from PerplexityAPI to a ProxyError."""
+    if isinstance(e, ProxyError):
+        return e
+    if isinstance(e, ModelUnavailableError):
+        return ProxyError(503, str(e), "model_unavailable")
+    if isinstance(e, RequestTimeoutError):
+        return ProxyError(504, str(e), "upstream_timeout")
+    if isinstance(e, import_requests().exceptions.HTTPError) and e.response is not None:
+        return ProxyError(e.response.status_code, str(e), "upstream_error")
+    return ProxyError(502, f"Upstream request failed: {e}", "upstream_error")
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    server_version = "PerplexityProxy/2.0"
+
+    def do_GET(self):
+        proxy = self.server.proxy
+        if self.path == "/health":
+            health = getattr(proxy.api_client, "health", None)
+            self._send_json(200, {"status": "ok", "models": health.snapshot() if health else {}})
+        elif self.path == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [
+                {"id": model, "object": "model", "owned_by": "perplexity"} for model in config.AVAILABLE_MODELS]})
+        elif self.path == "/v1/usage":
+            self._send_json(200, proxy.stats())
+        else:
+            self._send_error(ProxyError(404, f"Unknown endpoint: {self.path}"))
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_error(ProxyError(404, f"Unknown endpoint: {self.path}"))
+            return
+        started = time.perf_counter()
+        proxy = self.server.proxy
+        client = self.headers.get("X-Client") or self.headers.get("User-Agent") or "unknown"
+        use_cache = "no-cache" not in (self.headers.get("Cache-Control") or "")
+        try:
+            body = self._read_body()
+            if body.get("stream"):
+                cached = self._stream(proxy.stream_completion(body, client, use_cache))
+            else:
+                try:
+                    response, cached = proxy.chat_completion(body, client, use_cache)
+                except Exception as e:
+                    raise _upstream_error(e)
+                self._send_json(200, response, cached)
+        except ProxyError as e:
+            self._send_error(e)
+            return
+        if proxy.verbose:
+            print(f"{client}: {body['model']} {'stream ' if body.get('stream') else ''}"
+                  f"{'cached ' if cached else ''}{(time.perf_counter() - started) * 1000:.0f} ms", flush=True)
+
+    def _read_body(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            raise ProxyError(400, "Request body is not valid JSON.")
+        if not isinstance(body, dict) or not isinstance(body.get("model"), str) or not isinstance(body.get("messages"), list):
+            raise ProxyError(400, "Expected a JSON object with 'model' and 'messages'.")
+        return body
+
+    def _stream(self, chunks):
+        """Relay chunks as server-sent events; returns whether they came from cache."""
+        try:
+            first = next(chunks, None)
+        except Exception as e:
+            raise _upstream_error(e)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Cache", "HIT" if first and first[1] else "MISS")
+        self.end_headers()
+        cached = bool(first and first[1])
+        try:
+            if first is not None:
+                self._write_event(first[0])
+                for chunk, _ in chunks:
+                    self._write_event(chunk)
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            chunks.close()  # the client went away; release the upstream stream
+        except Exception as e:
+            self._write_event({"error": {"message": str(_upstream_error(e)), "type": "upstream_error"}})
+        return cached
+
+    def _write_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, cached=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if cached is not None:
+            self.send_header("X-Cache", "HIT" if cached else "MISS")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, error):
+        self._send_json(error.status, {"error": {"message": str(error), "type": error.error_type}})
+
+    def log_message(self, format, *args):
+        if self.server.proxy.verbose:
+            super().log_message(format, *args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible endpoint backed by Perplexity.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=config.ADVANCED.get("proxy_port", 8765), help="port (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=None, help="upstream requests per second (0 = no limit)")
+    parser.add_argument("--burst", type=int, default=None, help="requests allowed at once before --rate applies")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="seconds to reuse identical responses (0 = off)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--no-ledger", action="store_true", help="don't record usage in the usage ledger")
+    args = parser.parse_args(argv)
+
+    api_key = load_api_key()
+    if not api_key:
+        print("❌ No API key: save one from the GUI or set PERPLEXITY_API_KEY.")
+        return 1
+    max_concurrent = config.ADVANCED.get("proxy_max_concurrent", 8)
+    ledger = None if args.no_ledger else UsageLedger()
+    proxy = ProxyServer(PerplexityAPI(api_key, pool_size=max_concurrent), args.host, args.port, rate=args.rate,
+                        burst=args.burst, cache_ttl=args.cache_ttl, verbose=args.verbose, ledger=ledger)
+    print(f"🌐 Serving {proxy.url}/chat/completions (Ctrl+C to stop)")
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Proxy stopped")
+    finally:
+        proxy.httpd.server_close()
+        if ledger is not None:
+            ledger.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Terminal client for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+A line-oriented chat for machines without a display.  It runs on the
+same ChatEngine and PerplexityAPI as the GUI and uses the templates and
+default model from config.py.  Streamed answers are written to stdout
+chunk by chunk as they arrive.  Chats are saved and loaded in the GUI's
+Save Chat layout (.json, or .pplxa archives), so a conversation can move
+between the two.
+
+    python repl.py [--model sonar] [--template "Code Helper"] [--no-stream] [--load chat.json]
+    python launch.py repl [same options]
+
+End a line with a backslash to continue the message on the next line.
+Type /help for the commands.
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+
+import config
+from chat_engine import ChatEngine, ChatEngineError
+from model_router import ModelRouter
+from perplexity_api import PerplexityAPI, load_api_key
+
+HELP = """Commands:
+  /model [name]       show the models or switch to one ("auto" picks per message)
+  /template [name]    show the templates or switch to one (replaces the system prompt)
+  /system [text]      show or set the system prompt
+  /save PATH          save the chat (.json or .pplxa), readable by the GUI's Load Chat
+  /load PATH          load a chat saved by the GUI or /save
+  /new                start a new conversation
+  /stream on|off      stream answers as they arrive
+  /usage              tokens and latency of the last answer, and this month's spend
+  /help               this text
+  /quit               exit (also Ctrl+D)"""
+
+
+class Repl:
+    """Reads commands and prompts, writes answers to out."""
+
+    def __init__(self, engine, model=None, template=None, stream=True, out=None):
+        self.engine = engine
+        self.out = out or sys.stdout
+        self.stream = stream
+        self.session = None
+        self._new_session(model or config.DEFAULT_MODEL, template or "General Assistant")
+
+    def _new_session(self, model, template):
+        session_id = f"repl_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if self.session is not None:
+            self.engine.close_session(self.session.session_id)
+        self.session = self.engine.open_session(session_id, model, template,
+                                                config.CONVERSATION_TEMPLATES.get(template, ""))
+
+    def write(self, text):
+        self.out.write(text)
+        self.out.flush()
+
+    def handle(self, line):
+        """Process one input line; returns False when the user quits."""
+        line = line.strip()
+        if not line:
+            return True
+        if line.startswith("/"):
+            command, _, argument = line[1:].partition(" ")
+            handler = getattr(self, f"cmd_{command.lower()}", None)
+            if handler is None:
+                self.write(f"Unknown command /{command}. Type /help for the list.\n")
+                return True
+            return handler(argument.strip()) is not False
+        self.ask(line)
+        return True
+
+    def ask(self, prompt):
+        settings = self.session.settings(stream=self.stream)
+
+        notes = []
+
+        def on_event(event):
+            if "stream_chunk" in event:
+                self.write(event["stream_chunk"])
+            elif event.get("rerouted_from") or event.get("auto_reason"):
+                notes.append(event)
+
+        try:
+            answer = self.engine.ask(self.session, prompt, settings, on_event=on_event)
+        except ChatEngineError as e:
+            self.write(f"\n❌ {e}\n")
+            return
+        except KeyboardInterrupt:
+            # The answer never arrived; take the question back out.
+            if self.session.conversation_history and self.session.conversation_history[-1]["role"] == "user":
+                self.session.pop_message()
+            self.write("\n⏹  Interrupted\n")
+            return
+        self.write(("" if self.stream else answer) + "\n")
+        message = self.session.conversation_history[-1]
+        for number, url in enumerate(message.get("citations") or (), 1):
+            self.write(f"  [{number}] {url}\n")
+        if message.get("finish_reason") == "length":
+            self.write("⚠️  Cut off at the max tokens limit.\n")
+        for event in notes:
+            if event.get("auto_reason"):
+                self.write(f"🔀 {event.get('rerouted_from') or event['model']}: {event['auto_reason']}\n")
+            if event.get("rerouted_from"):
+                self.write(f"ℹ️  {event['rerouted_from']} keeps failing right now, so {event['model']} answered.\n")
+
+    # Commands
+    def cmd_help(self, argument):
+        self.write(HELP + "\n")
+
+    def cmd_quit(self, argument):
+        return False
+
+    cmd_exit = cmd_quit
+
+    def cmd_model(self, argument):
+        if not argument:
+            for model in [config.AUTO_MODEL] + config.AVAILABLE_MODELS:
+                self.write(f"{'*' if model == self.session.model else ' '} {model}\n")
+        elif argument == config.AUTO_MODEL or argument in config.AVAILABLE_MODELS:
+            self.session.model = argument
+            self.write(f"Model: {argument}\n")
+        else:
+            self.write(f"Unknown model {argument!r}. Type /model for the list.\n")
+
+    def cmd_template(self, argument):
+        if not argument:
+            for name in config.CONVERSATION_TEMPLATES:
+                self.write(f"{'*' if name == self.session.template else ' '} {name}\n")
+            return
+        name = next((n for n in config.CONVERSATION_TEMPLATES if n.lower() == argument.lower()), None)
+        if name is None:
+            self.write(f"Unknown template {argument!r}. Type /template for the list.\n")
+            return
+        self.session.template = name
+        self.session.system_prompt = config.CONVERSATION_TEMPLATES[name]
+        self.write(f"Template: {name}\n")
+
+    def cmd_system(self, argument):
+        if argument:
+            self.session.system_prompt = argument
+        self.write(f"System prompt: {self.session.system_prompt}\n")
+
+    def cmd_stream(self, argument):
+        if argument in ("on", "off"):
+            self.stream = argument == "on"
+        self.write(f"Streaming {'on' if self.stream else 'off'}\n")
+
+    def cmd_new(self, argument):
+        self._new_session(self.session.model, self.session.template)
+        self.write("New conversation.\n")
+
+    def cmd_usage(self, argument):
+        if not self.session.turn_usage:
+            self.write("No answers yet.\n")
+            return
+        usage = self.session.turn_usage[max(self.session.turn_usage)]
+        tokens = ", ".join(f"{key} {usage[key]}" for key in ("prompt_tokens", "completion_tokens", "total_tokens") if key in usage)
+        self.write(f"{usage['model']}: {usage['latency_ms']} ms{'; ' + tokens if tokens else ''}\n")
+        if self.engine.ledger is not None:
+            month = self.engine.ledger.month(usage["model"])
+            self.write(f"This month on {usage['model']}: {month['requests']:,} requests, ${month['cost']:,.4f}\n")
+
+    def cmd_save(self, argument):
+        if not argument:
+            self.write("Usage: /save PATH\n")
+            return
+        chat_data = self.session.to_chat_data()
+        try:
+            if argument.endswith(".pplxa"):
+                from session_archive import write_archive
+                write_archive(argument, chat_data)
+            else:
+                from persistence import write_json_atomic
+                write_json_atomic(argument, chat_data, indent=2)
+        except OSError as e:
+            self.write(f"❌ Could not save: {e}\n")
+            return
+        self.write(f"Saved {len(self.session.conversation_history)} messages to {argument}\n")
+
+    def cmd_load(self, argument):
+        if not argument:
+            self.write("Usage: /load PATH\n")
+            return
+        try:
+            if argument.endswith(".pplxa"):
+                from session_archive import SessionArchive
+                with SessionArchive(argument) as archive:
+                    chat_data = archive.to_chat_data()
+            else:
+                with open(argument, "r", encoding="utf-8") as f:
+                    chat_data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.write(f"❌ Could not load: {e}\n")
+            return
+        self.session.load_chat_data(chat_data)
+        self.write(f"Loaded {len(self.session.conversation_history)} messages "
+                   f"({self.session.model}, {self.session.template or 'no template'})\n")
+        if self.session.last_ai_response_content:
+            self.write(f"Last answer:\n{self.session.last_ai_response_content}\n")
+
+
+def read_message(prompt="you> "):
+    """One message from stdin; a trailing backslash continues it on the next line."""
+    lines = [input(prompt)]
+    while lines[-1].endswith("\\"):
+        lines[-1] = lines[-1][:-1]
+        lines.append(input("...> "))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chat with Perplexity AI in the terminal.")
+    parser.add_argument("--model", default=config.DEFAULT_MODEL, help="model (default: %(default)s)")
+    parser.add_argument("--template", default="General Assistant", help="conversation template (default: %(default)s)")
+    parser.add_argument("--no-stream", action="store_true", help="wait for complete answers")
+    parser.add_argument("--load", metavar="PATH", help="start from a saved chat")
+    args = parser.parse_args(argv)
+
+    api_key = load_api_key()
+    if not api_key and sys.stdin.isatty():
+        import getpass
+        api_key = getpass.getpass("Perplexity API key: ").strip()
+    if not api_key:
+        print("❌ No API key: save one from the GUI or set PERPLEXITY_API_KEY.")
+        return 1
+
+    try:
+        from usage_ledger import UsageLedger
+        ledger = UsageLedger()
+    except Exception as e:
+        print(f"Usage ledger unavailable: {e}")
+        ledger = None
+    engine = ChatEngine(api_client=PerplexityAPI(api_key), ledger=ledger, source="repl", router=ModelRouter())
+    repl = Repl(engine, args.model, args.template, stream=not args.no_stream)
+    if args.load:
+        repl.cmd_load(args.load)
+    interactive = sys.stdin.isatty()
+    if interactive:
+        print(f"Perplexity AI ({repl.session.model}, {repl.session.template}). Type /help for commands, /quit to exit.")
+    try:
+        while True:
+            try:
+                line = read_message("you> " if interactive else "")
+            except EOFError:
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            if not repl.handle(line):
+                break
+    finally:
+        engine.scheduler.shutdown()
+        if ledger is not None:
+            ledger.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Request scheduler for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Runs API requests on a bounded thread pool instead of a new thread per
+message, and keeps a FIFO of prompts queued behind the request that is
+currently in flight for each session.  A session only ever has one
+request running, because each follow-up needs the previous answer in its
+history.
+
+The scheduler never touches Tk.  Callers snapshot everything a request
+needs (model, parameters, messages) into a plain dict on the UI thread and
+hand it to submit().  submit() gives the dict a "deadline" (a
+time.monotonic() value request_deadline_s away) unless it has one, so time
+spent waiting for a free worker comes out of the request's budget.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+
+class RequestScheduler:
+    def __init__(self, max_workers=None, request_deadline=None):
+        if max_workers is None:
+            max_workers = config.ADVANCED.get("max_concurrent_requests", 4)
+        if request_deadline is None:
+            request_deadline = config.ADVANCED.get("request_deadline_s", 600)
+        self.max_workers = max_workers
+        self.request_deadline = request_deadline  # seconds, 0 for none
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pplx-request")
+        self._lock = threading.Lock()
+        self._pending = {}     # session id -> deque of (item, enqueued_at)
+        self._active = {}      # session id -> Future of the in-flight request
+        self._submitted = 0
+        self._completed = 0
+        self._queued_total = 0
+        self._queue_dispatched = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._last_queue_wait = 0.0
+        self._pool_wait_total = 0.0
+        self._pool_wait_max = 0.0
+
+    def is_busy(self, session_id) -> bool:
+        """True while a request for session_id is running or prompts are queued."""
+        with self._lock:
+            return session_id in self._active or bool(self._pending.get(session_id))
+
+    def enqueue(self, session_id, item) -> int:
+        """Queue item behind the session's in-flight request; returns its position."""
+        with self._lock:
+            pending = self._pending.setdefault(session_id, deque())
+            pending.append((item, time.monotonic()))
+            self._queued_total += 1
+            return len(pending)
+
+    def submit(self, session_id, spec, worker, enqueued_at=None):
+        """Run worker(spec) on the pool and mark the session as in flight."""
+        submitted_at = time.monotonic()
+        if enqueued_at is not None:
+            self._record_queue_wait(submitted_at - enqueued_at)
+        if self.request_deadline and isinstance(spec, dict):
+            spec.setdefault("deadline", submitted_at + self.request_deadline)
+
+        def run():
+            self._record_pool_wait(time.monotonic() - submitted_at)
+            return worker(spec)
+
+        with self._lock:
+            self._submitted += 1
+            future = self.executor.submit(run)
+            self._active[session_id] = future
+        return future
+
+    def finish(self, session_id):
+        """Mark the session's request as done and pop its next queued item.
+
+        Returns (item, enqueued_at) for the caller to build and submit, or
+        None when nothing is waiting.
+        """
+        with self._lock:
+            if self._active.pop(session_id, None) is not None:
+                self._completed += 1
+            pending = self._pending.get(session_id)
+            if not pending:
+                self._pending.pop(session_id, None)
+                return None
+            return pending.popleft()
+
+    def cancel_pending(self, session_id):
+        """Drop every prompt queued for session_id and return them."""
+        with self._lock:
+            pending = self._pending.pop(session_id, None) or ()
+            return [item for item, _ in pending]
+
+    def queue_depth(self, session_id=None) -> int:
+        with self._lock:
+            if session_id is not None:
+                return len(self._pending.get(session_id, ()))
+            return sum(len(pending) for pending in self._pending.values())
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "in_flight": len(self._active),
+                "queue_depth": sum(len(p) for p in self._pending.values()),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "queued_total": self._queued_total,
+                "avg_queue_wait": self._queue_wait_total / self._queue_dispatched if self._queue_dispatched else 0.0,
+                "max_queue_wait": self._queue_wait_max,
+                "last_queue_wait": self._last_queue_wait,
+                "avg_pool_wait": self._pool_wait_total / self._submitted if self._submitted else 0.0,
+                "max_pool_wait": self._pool_wait_max,
+            }
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            self._pending.clear()
+        self.executor.shutdown(wait=wait)
+
+    def _record_queue_wait(self, waited):
+        with self._lock:
+            self._queue_dispatched += 1
+            self._queue_wait_total += waited
+            self._queue_wait_max = max(self._queue_wait_max, waited)
+            self._last_queue_wait = waited
+
+    def _record_pool_wait(self, waited):
+        with self._lock:
+            self._pool_wait_total += waited
+            self._pool_wait_max = max(self._pool_wait_max, waited)
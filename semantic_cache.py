@@ -0,0 +1,160 @@
+"""
+Semantic answer cache for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Offers a stored answer when a new question is worded almost the same as
+one already answered with the same model and template, so repeated
+questions come back instantly and cost nothing.
+
+Questions become vectors via vectorizer.HashingVectorizer and are kept
+in a VectorMatrix (vectors_<dim>.f32), one row per entry.  entries.jsonl
+holds one JSON line per entry with the question, model, template, answer,
+citations and time.  Row i of the matrix is line i of the file.  The vector is
+written first, so a crash between the two writes only leaves a spare
+vector, which the next load drops.  Changing the vector size starts a
+new, empty matrix, and the entries without vectors are dropped with it.
+
+Only a conversation's opening question is worth caching: a follow-up
+depends on the turns before it, which the vectors don't see.  Entries
+older than semantic_cache_max_age_days are never offered.  A cache
+holding more than semantic_cache_entries is compacted to its newest
+entries when it is next loaded.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import config
+from vectorizer import HashingVectorizer, VectorMatrix, numpy
+
+
+class SemanticCache:
+    def __init__(self, directory=None, threshold=None, max_entries=None, max_age_days=None, dim=None):
+        advanced = config.ADVANCED
+        self.directory = directory or config.PATHS.get("semantic_cache_dir", "semantic_cache")
+        self.threshold = advanced.get("semantic_cache_threshold", 0.85) if threshold is None else threshold
+        self.max_entries = max_entries or advanced.get("semantic_cache_entries", 5000)
+        self.max_age_days = advanced.get("semantic_cache_max_age_days", 30) if max_age_days is None else max_age_days
+        self.vectorizer = HashingVectorizer(dim or advanced.get("semantic_cache_dim", 1024))
+        self.matrix = VectorMatrix(os.path.join(self.directory, f"vectors_{self.vectorizer.dim}.f32"), self.vectorizer.dim)
+        self.entries_path = os.path.join(self.directory, "entries.jsonl")
+        self.entries = []  # entry dicts, one per matrix row
+        self.hits = 0
+        self.misses = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        """Read the cache from disk (once); returns the number of entries."""
+        with self._lock:
+            if not self.loaded:
+                self._load()
+                self.loaded = True
+            return len(self.entries)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries, torn = [], False
+        if os.path.exists(self.entries_path):
+            with open(self.entries_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        torn = True  # a write cut short; everything after it is dropped
+                        break
+        rows = self.matrix.load(len(entries))
+        if rows < len(entries) or torn:
+            del entries[rows:]
+            self._write_entries(entries)
+        self.entries = entries
+
+        cutoff = self._cutoff()
+        if len(entries) > self.max_entries or (entries and entries[0]["created_at"] < cutoff):
+            self._compact(cutoff)
+
+    def _cutoff(self):
+        return (datetime.now() - timedelta(days=self.max_age_days)).isoformat(timespec="seconds")
+
+    def _compact(self, cutoff):
+        # Newest entry per question, model and template; then the newest max_entries.
+        keep, seen = [], set()
+        for row in range(len(self.entries) - 1, -1, -1):
+            entry = self.entries[row]
+            key = (entry["prompt"], entry["model"], entry["template"])
+            if entry["created_at"] >= cutoff and key not in seen:
+                seen.add(key)
+                keep.append(row)
+            if len(keep) == self.max_entries:
+                break
+        keep.reverse()
+        self.matrix.rewrite(self.matrix.read_rows(keep))
+        self.entries = [self.entries[row] for row in keep]
+        self._write_entries(self.entries)
+
+    def _write_entries(self, entries):
+        temp_path = self.entries_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.entries_path)
+
+    def lookup(self, prompt, model, template):
+        """The best cached entry for a question, as a dict with its "score", or None.
+
+        Returns None straight away while the cache is still loading, so
+        the UI thread never waits for it.
+        """
+        if not self.loaded:
+            return None
+        vector = self.vectorizer.transform(prompt)
+        if not vector:
+            return None
+        with self._lock:
+            scores = self.matrix.scores(vector)
+            if numpy is None:
+                candidates = [(score, row) for row, score in scores.items() if score >= self.threshold]
+            else:
+                rows = numpy.flatnonzero(scores >= self.threshold)
+                candidates = list(zip(scores[rows].tolist(), rows.tolist()))
+            # Highest score first; between equal scores, the newest entry.
+            candidates.sort(reverse=True)
+            cutoff = self._cutoff()
+            for score, row in candidates:
+                entry = self.entries[row]
+                if entry["model"] == model and entry["template"] == template and entry["created_at"] >= cutoff:
+                    self.hits += 1
+                    return dict(entry, score=min(score, 1.0))
+            self.misses += 1
+            return None
+
+    def add(self, prompt, model, template, answer, citations=None):
+        """Store an answered question; returns False if there was nothing to store."""
+        vector = self.vectorizer.transform(prompt)
+        if not vector or not answer:
+            return False
+        entry = {"prompt": prompt, "model": model, "template": template, "answer": answer,
+                 "created_at": datetime.now().isoformat(timespec="seconds")}
+        if citations:
+            entry["citations"] = list(citations)
+        self.load()
+        with self._lock:
+            self.matrix.append([self.vectorizer.to_bytes(vector)])
+            with open(self.entries_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.entries.append(entry)
+        return True
+
+    def clear(self):
+        """Forget every entry."""
+        self.load()
+        with self._lock:
+            self.matrix.rewrite([])
+            self.entries = []
+            self._write_entries([])
+            self.hits = self.misses = 0
@@ -0,0 +1,342 @@
+"""
+Semantic message search for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Finds stored messages by meaning rather than by exact words, next to the
+ConversationStore's FTS5 keyword search: "speed up my sqlite inserts"
+finds an old answer about batching SQLite writes.
+
+Every message becomes a vector (vectorizer.HashingVectorizer over its
+first MAX_CHARS characters) in a memory-mapped float32 matrix:
+
+    vectors_<dim>.f32  one row per indexed message (VectorMatrix)
+    ids_<dim>.i64      the message id of each row (int64)
+    state_<dim>.json   committed row count, last message id indexed, last
+                       change applied from the store's message_changes
+                       log, and "dead" rows whose message was since
+                       deleted or edited
+    ivf_<dim>.npz      cluster partition, once the index is large
+
+Rows are appended before the state is written, so an update cut short
+is simply redone; files that disagree with the state start a rebuild.
+
+update() is incremental: it indexes messages with an id above the last
+one indexed.  For every message deleted or edited since the last update
+it kills the message's row and re-indexes the message if it still exists
+(SQLite hands a deleted last row's id to the next insert).  The index is
+compacted once a quarter of its rows are dead.
+
+A query is one matrix-vector product over the mapped matrix, then
+argpartition for the top k.  Past semantic_index_ivf_rows rows an IVF
+(inverted file) partition is built: spherical k-means on a sample
+clusters the rows around sqrt(rows) centroids, and a query scores only
+the rows of its semantic_index_nprobe nearest clusters, plus rows added
+since the partition was built.  The partition is rebuilt when those
+reach a quarter of it.  Clustering makes search approximate.
+
+Needs numpy.
+
+    python semantic_index.py "how do I batch sqlite writes" [-k 10]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import config
+from vectorizer import HashingVectorizer, VectorMatrix, numpy
+
+MAX_CHARS = 2000  # a message's opening carries its topic; vectorising more costs time, not recall
+IVF_SAMPLE_PER_LIST = 40  # k-means training rows per cluster
+IVF_ITERATIONS = 8
+IVF_BLOCK = 16384  # rows assigned to clusters per matrix product
+
+
+class SemanticIndex:
+    def __init__(self, store, directory=None, dim=None, ivf_rows=None, nprobe=None):
+        if numpy is None:
+            raise ValueError("semantic search needs the 'numpy' package")
+        advanced = config.ADVANCED
+        self.store = store
+        self.directory = directory or config.PATHS.get("semantic_index_dir", "semantic_index")
+        self.vectorizer = HashingVectorizer(dim or advanced.get("semantic_index_dim", 512))
+        dim = self.vectorizer.dim
+        self.matrix = VectorMatrix(os.path.join(self.directory, f"vectors_{dim}.f32"), dim)
+        self.ids_path = os.path.join(self.directory, f"ids_{dim}.i64")
+        self.state_path = os.path.join(self.directory, f"state_{dim}.json")
+        self.ivf_path = os.path.join(self.directory, f"ivf_{dim}.npz")
+        self.ivf_rows = advanced.get("semantic_index_ivf_rows", 1_000_000) if ivf_rows is None else ivf_rows
+        self.nprobe = nprobe or advanced.get("semantic_index_nprobe", 32)
+        self.ids = numpy.zeros(0, dtype=numpy.int64)
+        self.dead = set()
+        self._dead_rows = None  # sorted numpy array of self.dead, built on demand
+        self.last_id = 0
+        self.last_change = 0
+        self.ivf = None  # {"centroids", "order", "offsets", "rows"}
+        self.loaded = False
+        self._lock = threading.RLock()  # held while rows change or are scored
+        self._update_lock = threading.Lock()  # one update() at a time
+
+    def __len__(self):
+        return len(self.ids) - len(self.dead)
+
+    def load(self):
+        """Open the index files (once); returns the number of live rows."""
+        with self._lock:
+            if not self.loaded:
+                self._load()
+                self.loaded = True
+            return len(self)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Before the first load nothing is indexed, so earlier changes do not matter.
+        self.store.track_message_changes()
+        state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        committed = state.get("rows", 0)
+        with open(self.ids_path, "ab") as f:
+            stored_ids = f.tell() // 8
+            if stored_ids >= committed:
+                f.truncate(committed * 8)
+        if stored_ids < committed or self.matrix.load(committed) < committed:
+            print("Semantic index files are incomplete; rebuilding the index.")
+            state, committed = {}, 0
+            self.matrix.rewrite([])
+            with open(self.ids_path, "wb"):
+                pass
+        self.ids = numpy.fromfile(self.ids_path, dtype=numpy.int64, count=committed)
+        self.dead = set(state.get("dead", ()))
+        self._dead_rows = None
+        self.last_id = state.get("last_id", 0)
+        self.last_change = state.get("last_change", 0)
+        self.ivf = None
+        if committed and os.path.exists(self.ivf_path):
+            with numpy.load(self.ivf_path) as ivf:
+                if int(ivf["rows"]) <= committed:
+                    self.ivf = {key: ivf[key] for key in ("centroids", "order", "offsets")}
+                    self.ivf["rows"] = int(ivf["rows"])
+
+    def _commit(self):
+        state = {"rows": len(self.ids), "last_id": self.last_id, "last_change": self.last_change,
+                 "dead": sorted(self.dead)}
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _vectors(self, rows):
+        """(message ids, row bytes) for [(id, content)], skipping text with no usable words."""
+        ids, data = [], []
+        for message_id, content in rows:
+            vector = self.vectorizer.transform(content[:MAX_CHARS])
+            if vector:
+                ids.append(message_id)
+                data.append(self.vectorizer.to_bytes(vector))
+        return ids, data
+
+    def _append(self, ids, data):
+        # Called with self._lock held.
+        if ids:
+            self.matrix.append(data)
+            with open(self.ids_path, "ab") as f:
+                f.write(numpy.asarray(ids, dtype=numpy.int64).tobytes())
+            self.ids = numpy.concatenate([self.ids, numpy.asarray(ids, dtype=numpy.int64)])
+
+    def update(self, batch_size=1000, progress=None):
+        """Bring the index up to date with the store; returns how many messages were (re)indexed.
+
+        progress(count) is called after every batch.  Queries keep working
+        while an update runs.
+        """
+        self.load()
+        indexed = 0
+        with self._update_lock:
+            last_change, changed = self.store.message_changes(self.last_change)
+            if changed:
+                # Rows of changed messages die; those that still exist are indexed again.
+                ids, data = self._vectors(sorted(
+                    self.store.message_texts(i for i in changed if i <= self.last_id).items()))
+                with self._lock:
+                    stale = numpy.flatnonzero(numpy.isin(self.ids, numpy.fromiter(changed, dtype=numpy.int64)))
+                    self.dead.update(stale.tolist())
+                    self._dead_rows = None
+                    self._append(ids, data)
+                    self.last_change = last_change
+                    self._commit()
+                self.store.prune_message_changes(last_change)
+                indexed += len(ids)
+
+            while True:
+                rows = self.store.messages_after(self.last_id, batch_size)
+                if not rows:
+                    break
+                ids, data = self._vectors(rows)
+                with self._lock:
+                    self._append(ids, data)
+                    self.last_id = rows[-1][0]
+                    self._commit()
+                indexed += len(ids)
+                if progress:
+                    progress(indexed)
+
+            if self.dead and len(self.dead) * 4 >= len(self.ids):
+                self.compact()
+            if self.ivf_rows and len(self.ids) >= self.ivf_rows and (
+                    self.ivf is None or (len(self.ids) - self.ivf["rows"]) * 4 >= self.ivf["rows"]):
+                self.build_ivf()
+        return indexed
+
+    def compact(self):
+        """Drop dead rows from the files."""
+        with self._lock:
+            keep = numpy.setdiff1d(numpy.arange(len(self.ids)), self._dead_array())
+            self.matrix.rewrite(self.matrix.read_rows(keep.tolist()))
+            self.ids = self.ids[keep]
+            temp_path = self.ids_path + ".tmp"
+            self.ids.tofile(temp_path)
+            os.replace(temp_path, self.ids_path)
+            self.dead = set()
+            self._dead_rows = None
+            self.ivf = None  # it numbers rows as they were
+            if os.path.exists(self.ivf_path):
+                os.remove(self.ivf_path)
+            self._commit()
+
+    def _dead_array(self):
+        if self._dead_rows is None:
+            self._dead_rows = numpy.array(sorted(self.dead), dtype=numpy.int64)
+        return self._dead_rows
+
+    def build_ivf(self):
+        """Cluster the rows so queries only score the clusters nearest to them."""
+        with self._lock:
+            data = self.matrix.dense
+        rows = len(data)
+        lists = max(1, int(math.sqrt(rows)))
+        rng = numpy.random.default_rng(0)
+        sample = data[numpy.sort(rng.choice(rows, min(rows, lists * IVF_SAMPLE_PER_LIST), replace=False))]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            centroids = _recentre(sample, _nearest(sample, centroids), centroids)
+        assignment = _nearest(data, centroids)
+        # Stable, so each cluster lists its rows in file order.
+        order = numpy.argsort(assignment, kind="stable")
+        offsets = numpy.zeros(lists + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(assignment, minlength=lists), out=offsets[1:])
+        temp_path = self.ivf_path + ".tmp.npz"
+        numpy.savez(temp_path, centroids=centroids, order=order, offsets=offsets, rows=rows)
+        with self._lock:
+            os.replace(temp_path, self.ivf_path)
+            self.ivf = {"centroids": centroids, "order": order, "offsets": offsets, "rows": rows}
+
+    def _candidates(self, query):
+        """Rows worth scoring for a dense query: its nearest clusters plus rows added since clustering."""
+        ivf = self.ivf
+        closeness = ivf["centroids"] @ query
+        probe = min(self.nprobe, len(closeness))
+        nearest = numpy.argpartition(-closeness, probe - 1)[:probe]
+        offsets, order = ivf["offsets"], ivf["order"]
+        parts = [order[offsets[cluster]:offsets[cluster + 1]] for cluster in nearest.tolist()]
+        parts.append(numpy.arange(ivf["rows"], len(self.ids)))
+        # Ascending rows read the mapped file front to back.
+        return numpy.sort(numpy.concatenate(parts))
+
+    def search(self, text, k=20):
+        """The k stored messages closest in meaning to text, best first.
+
+        Rows in the layout of ConversationStore.search() plus "score"
+        (cosine similarity, 0-1).
+        """
+        vector = self.vectorizer.transform(text)
+        if not vector:
+            return []
+        self.load()
+        with self._lock:
+            if not len(self.ids):
+                return []
+            if self.ivf is not None:
+                rows = self._candidates(self.matrix.dense_query(vector))
+                scores = self.matrix.scores(vector, rows)
+                if self.dead:
+                    scores[numpy.isin(rows, self._dead_array())] = -numpy.inf
+            else:
+                rows = None
+                scores = self.matrix.scores(vector)
+                if self.dead:
+                    scores[self._dead_array()] = -numpy.inf
+            count = min(k, len(scores))
+            if not count:
+                return []
+            top = numpy.argpartition(-scores, count - 1)[:count]
+            top = top[numpy.argsort(-scores[top], kind="stable")]
+            top = top[scores[top] > 0]
+            best = [(int(self.ids[row if rows is None else rows[row]]), float(scores[row])) for row in top]
+        hits = self.store.message_hits(message_id for message_id, _ in best)
+        return [dict(hits[message_id], score=min(score, 1.0)) for message_id, score in best if message_id in hits]
+
+
+def _nearest(data, centroids):
+    """Index of the closest centroid for each row of data, IVF_BLOCK rows at a time."""
+    return numpy.concatenate([numpy.argmax(data[start:start + IVF_BLOCK] @ centroids.T, axis=1)
+                              for start in range(0, len(data), IVF_BLOCK)])
+
+
+def _recentre(sample, assignment, centroids):
+    """New unit-length centroids: the mean direction of the rows assigned to each (spherical k-means)."""
+    sums = numpy.zeros_like(centroids)
+    counts = numpy.bincount(assignment, minlength=len(centroids))
+    filled = counts > 0
+    order = numpy.argsort(assignment, kind="stable")
+    starts = numpy.cumsum(counts) - counts
+    sums[filled] = numpy.add.reduceat(sample[order], starts[filled])
+    norms = numpy.linalg.norm(sums, axis=1)
+    moved = norms > 0
+    result = centroids.copy()  # a cluster that lost every row keeps its centroid
+    result[moved] = sums[moved] / norms[moved, None]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search every stored message by meaning.")
+    parser.add_argument("query", nargs="*", help="what to look for (omit to only update the index)")
+    parser.add_argument("-k", type=int, default=10, help="results to show (default 10)")
+    parser.add_argument("--db", help="conversation database (default: config PATHS['database_file'])")
+    parser.add_argument("--dir", help="index directory (default: config PATHS['semantic_index_dir'])")
+    args = parser.parse_args(argv)
+
+    from conversation_store import ConversationStore
+    store = ConversationStore(args.db)
+    try:
+        try:
+            index = SemanticIndex(store, args.dir)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        started = time.perf_counter()
+        indexed = index.update(progress=lambda count: print(f"\r🔎 Indexing… {count:,} messages", end="", flush=True))
+        if indexed:
+            print(f"\r✅ Indexed {indexed:,} messages in {time.perf_counter() - started:.1f}s ({len(index):,} in the index)")
+        if not args.query:
+            return 0
+        started = time.perf_counter()
+        results = index.search(" ".join(args.query), args.k)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for row in results:
+            title = row["title"] or row["session_id"]
+            snippet = " ".join(row["snippet"].split())
+            print(f"{row['score']:.2f}  {title} [{row['role']} #{row['seq']}]\n      {snippet}")
+        print(f"\n{len(results)} results in {elapsed_ms:.0f} ms")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Compressed session archives for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Save Chat writes uncompressed, pretty-printed JSON that has to be parsed
+in full before anything can be read back.  A session archive (.pplxa)
+stores the same data as compressed frames of messages with an index at
+the end of the file, so headers can be listed, the tail of a session
+opened, or message N read without decompressing the rest.
+
+Layout:
+
+    b"PPLXARC1"
+    frame 0, frame 1, ...    each a compressed block of JSON lines, one message per line
+    footer                   zlib-compressed JSON: codec, meta, message_count,
+                             frames [[offset, length, first_message, count], ...]
+    footer offset (8 bytes), footer length (4 bytes), b"PPLXEND1"
+
+Frames are compressed with zstd when the optional "zstandard" package is
+installed and with zlib (gzip's deflate) otherwise; the codec is recorded
+in the footer.  Converters to and from the Save Chat JSON layout stream
+messages through, so neither side is held in memory as a whole.
+
+    python session_archive.py pack chat.json [chat.pplxa]
+    python session_archive.py unpack chat.pplxa [chat.json]
+    python session_archive.py info chat.pplxa ...
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+
+from chat_loader import iter_chat_file
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_SUFFIX = ".pplxa"
+MAGIC = b"PPLXARC1"
+END_MAGIC = b"PPLXEND1"
+_TRAILER = struct.Struct("<QI8s")
+FRAME_MESSAGES = 64
+
+
+def default_codec():
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def _compressor(codec, level=None):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd archives need the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=level or 9).compress
+    if codec == "zlib":
+        return lambda data: zlib.compress(data, level or 6)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+def _decompressor(codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd archives need the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress
+    if codec == "zlib":
+        return zlib.decompress
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+class ArchiveWriter:
+    """Write messages one at a time; meta can be given when finishing."""
+
+    def __init__(self, path, codec=None, frame_messages=FRAME_MESSAGES, level=None):
+        self.path = path
+        self.codec = codec or default_codec()
+        self.frame_messages = frame_messages
+        self._compress = _compressor(self.codec, level)
+        self._tmp_path = f"{path}.tmp"
+        self._f = open(self._tmp_path, "wb")
+        self._f.write(MAGIC)
+        self._frames = []
+        self._pending = []
+        self.message_count = 0
+
+    def add(self, message):
+        self._pending.append(json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+        self.message_count += 1
+        if len(self._pending) >= self.frame_messages:
+            self._flush_frame()
+
+    def finish(self, meta):
+        """Write the footer and move the archive into place."""
+        self._flush_frame()
+        footer = zlib.compress(json.dumps({
+            "version": 1,
+            "codec": self.codec,
+            "meta": meta,
+            "message_count": self.message_count,
+            "frames": self._frames,
+        }, ensure_ascii=False).encode("utf-8"))
+        offset = self._f.tell()
+        self._f.write(footer)
+        self._f.write(_TRAILER.pack(offset, len(footer), END_MAGIC))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self._tmp_path)
+
+    def _flush_frame(self):
+        if not self._pending:
+            return
+        data = self._compress("\n".join(self._pending).encode("utf-8"))
+        self._frames.append([self._f.tell(), len(data), self.message_count - len(self._pending), len(self._pending)])
+        self._f.write(data)
+        self._pending = []
+
+
+def _read_footer(f):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < len(MAGIC) + _TRAILER.size:
+        raise ValueError("Not a session archive (file too short)")
+    f.seek(size - _TRAILER.size)
+    offset, length, end_magic = _TRAILER.unpack(f.read(_TRAILER.size))
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC or end_magic != END_MAGIC:
+        raise ValueError("Not a session archive")
+    f.seek(offset)
+    return json.loads(zlib.decompress(f.read(length)).decode("utf-8"))
+
+
+class SessionArchive:
+    """Random-access reader; only the frames that are asked for are decompressed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            footer = _read_footer(self._f)
+        except Exception:
+            self._f.close()
+            raise
+        self.codec = footer["codec"]
+        self.meta = footer["meta"]
+        self.frames = footer["frames"]
+        self.message_count = footer["message_count"]
+        self._decompress = _decompressor(self.codec)
+        self._cached = (None, None)  # (frame number, decoded messages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.message_count
+
+    def close(self):
+        self._f.close()
+
+    def message(self, n):
+        """Return message n (negative counts from the end)."""
+        if n < 0:
+            n += self.message_count
+        if not 0 <= n < self.message_count:
+            raise IndexError(n)
+        frame = self._frame_for(n)
+        return self._frame(frame)[n - self.frames[frame][2]]
+
+    def messages(self, start=0, stop=None):
+        """Yield messages start..stop-1 in order."""
+        stop = self.message_count if stop is None else min(stop, self.message_count)
+        if start >= stop:
+            return
+        for frame in range(self._frame_for(start), len(self.frames)):
+            _, _, first, count = self.frames[frame]
+            if first >= stop:
+                break
+            for message in self._frame(frame)[max(start - first, 0):stop - first]:
+                yield message
+
+    def tail(self, count):
+        return list(self.messages(max(0, self.message_count - count)))
+
+    def to_chat_data(self):
+        """The whole session in the Save Chat layout."""
+        return dict(self.meta, conversation_history=list(self.messages()))
+
+    def _frame_for(self, n):
+        low, high = 0, len(self.frames) - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.frames[mid][2] <= n:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    def _frame(self, frame):
+        if self._cached[0] != frame:
+            offset, length, _, _ = self.frames[frame]
+            self._f.seek(offset)
+            lines = self._decompress(self._f.read(length)).decode("utf-8").split("\n")
+            self._cached = (frame, [json.loads(line) for line in lines])
+        return self._cached[1]
+
+
+def read_header(path):
+    """Session meta plus message_count and codec, without touching any frame."""
+    with open(path, "rb") as f:
+        footer = _read_footer(f)
+    return dict(footer["meta"], message_count=footer["message_count"], codec=footer["codec"],
+                size=os.path.getsize(path))
+
+
+def list_archives(directory):
+    """Headers of every archive in directory, newest first."""
+    headers = []
+    for name in os.listdir(directory):
+        if name.endswith(ARCHIVE_SUFFIX):
+            path = os.path.join(directory, name)
+            try:
+                headers.append(dict(read_header(path), path=path))
+            except (OSError, ValueError) as e:
+                print(f"Warning: Skipping {path}: {e}")
+    return sorted(headers, key=lambda header: header.get("saved_at") or "", reverse=True)
+
+
+def write_archive(path, chat_data, codec=None, frame_messages=FRAME_MESSAGES):
+    """Write chat data in the Save Chat layout as an archive."""
+    writer = ArchiveWriter(path, codec, frame_messages)
+    try:
+        for message in chat_data.get("conversation_history", []):
+            writer.add(message)
+    except Exception:
+        writer.abort()
+        raise
+    writer.finish({key: value for key, value in chat_data.items() if key != "conversation_history"})
+
+
+def iter_archive(path):
+    """Same events as chat_loader.iter_chat_file(), read from an archive."""
+    with SessionArchive(path) as archive:
+        total = len(archive)
+        for key, value in archive.meta.items():
+            yield "field", key, value
+        for n, message in enumerate(archive.messages(), 1):
+            yield "message", None, message
+            if n % 1000 == 0:
+                yield "progress", None, (n, total)
+        yield "progress", None, (total, total)
+
+
+def json_to_archive(json_path, archive_path, codec=None):
+    """Convert a Save Chat JSON file, streaming messages straight through."""
+    writer = ArchiveWriter(archive_path, codec)
+    meta = {}
+    try:
+        for kind, key, value in iter_chat_file(json_path):
+            if kind == "message":
+                writer.add(value)
+            elif kind == "field":
+                meta[key] = value
+    except Exception:
+        writer.abort()
+        raise
+    writer.finish(meta)
+    return writer.message_count
+
+
+def archive_to_json(archive_path, json_path):
+    """Write an archive back out in the layout _save_chat_history produces."""
+    tmp_path = f"{json_path}.tmp"
+    with SessionArchive(archive_path) as archive, open(tmp_path, "w", encoding="utf-8") as f:
+        f.write('{\n  "conversation_history": [')
+        for n, message in enumerate(archive.messages()):
+            f.write(",\n    " if n else "\n    ")
+            f.write(json.dumps(message, indent=2).replace("\n", "\n    "))
+        f.write("\n  ]" if len(archive) else "]")
+        for key, value in archive.meta.items():
+            f.write(f",\n  {json.dumps(key)}: " + json.dumps(value, indent=2).replace("\n", "\n  "))
+        f.write("\n}")
+    os.replace(tmp_path, json_path)
+    return len(archive)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] not in ("pack", "unpack", "info"):
+        print("usage: python session_archive.py pack|unpack|info PATH [OUT]")
+        return 2
+    command, path = argv[0], argv[1]
+    if command == "pack":
+        out = argv[2] if len(argv) > 2 else os.path.splitext(path)[0] + ARCHIVE_SUFFIX
+        count = json_to_archive(path, out)
+        print(f"✅ {count} messages: {os.path.getsize(path):,} -> {os.path.getsize(out):,} bytes ({out})")
+    elif command == "unpack":
+        out = argv[2] if len(argv) > 2 else os.path.splitext(path)[0] + ".json"
+        count = archive_to_json(path, out)
+        print(f"✅ {count} messages written to {out}")
+    else:
+        for archive_path in argv[1:]:
+            header = read_header(archive_path)
+            print(f"{archive_path}: {header.get('session_id')} | {header.get('model')} | "
+                  f"{header['message_count']} messages | {header['codec']} | {header['size']:,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Append-only auto-save journal for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Each session is saved in the auto-save directory as:
+
+    a snapshot                   deduplicated manifest in the snapshot store
+                                 (see snapshot_store.py); older versions wrote
+                                 <session_id>.snapshot.json, which is still read
+    <session_id>.journal.jsonl   one compact JSON record per change since then
+
+Auto-save only appends the turns that changed since the previous save, so
+a session costs O(n) bytes on disk instead of rewriting the whole history
+every time.  A journal is only ever used from the persistence writer
+thread (see persistence.py), with a snapshot of the history list.  Compaction folds the journal back into the snapshot.  A
+journal that does not end with a "close" record belongs to a session that
+was still open when the application stopped; recover_sessions() replays
+those on startup.
+
+Record types:
+    {"op": "base", "length": n, "compaction": id}   first line, ties the journal to its snapshot
+    {"op": "meta", "model": ..., "template": ..., "system_prompt": ...}
+    {"op": "append", "message": {...}}
+    {"op": "truncate", "length": n}
+    {"op": "close"}
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime
+
+import config
+from persistence import common_prefix
+from snapshot_store import SnapshotStore
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+SNAPSHOT_SUFFIX = ".snapshot.json"
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+class SessionJournal:
+    def __init__(self, session_id, directory=None, snapshots=None):
+        self.session_id = session_id
+        self.directory = directory or config.PATHS["auto_save_dir"]
+        self.snapshots = snapshots or SnapshotStore(self.directory)
+        self.journal_path = os.path.join(self.directory, f"{session_id}{JOURNAL_SUFFIX}")
+        self.legacy_snapshot_path = os.path.join(self.directory, f"{session_id}{SNAPSHOT_SUFFIX}")
+        # None until the first save: whatever is on disk for this id was not
+        # written by us, so the first save is a full compaction.
+        self._journaled = None
+        self.records_since_compact = 0
+        self._last_meta = None
+
+    @property
+    def started(self) -> bool:
+        """True once this journal has written anything."""
+        return self._journaled is not None
+
+    def sync(self, history, meta):
+        """Append whatever changed in history since the last sync."""
+        if self._journaled is None:
+            self.compact(history, meta)
+            return
+
+        records = []
+        if meta != self._last_meta:
+            records.append(dict(meta, op="meta"))
+        start = common_prefix(self._journaled, history)
+        if start < len(self._journaled):
+            records.append({"op": "truncate", "length": start})
+        for message in history[start:]:
+            records.append({"op": "append", "message": message})
+        if records:
+            self._append(records)
+        self._journaled = list(history)
+        self._last_meta = dict(meta)
+
+        if self.records_since_compact >= config.ADVANCED.get("journal_compact_records", 500):
+            self.compact(history, meta)
+
+    def compact(self, history, meta):
+        """Fold the journal into a fresh snapshot and start an empty journal."""
+        os.makedirs(self.directory, exist_ok=True)
+        compaction_id = uuid.uuid4().hex[:12]
+        snapshot = dict(meta)
+        snapshot.update({
+            "conversation_history": history,
+            "session_id": self.session_id,
+            "auto_saved_at": datetime.now().isoformat(),
+            "compaction": compaction_id,
+        })
+        self.snapshots.write_snapshot(self.session_id, snapshot)
+        # If we crash before the journal below is rewritten, the old journal's
+        # base record names a different compaction and replay() ignores it.
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            f.write(_dumps({"op": "base", "length": len(history), "compaction": compaction_id}) + "\n")
+        self.snapshots.apply_retention(self.session_id)
+        if os.path.exists(self.legacy_snapshot_path):
+            os.remove(self.legacy_snapshot_path)
+        self._journaled = list(history)
+        self.records_since_compact = 0
+        self._last_meta = dict(meta)
+
+    def close(self, history, meta):
+        """Compact and mark the session as cleanly closed."""
+        self.compact(history, meta)
+        self.mark_closed()
+
+    def mark_closed(self):
+        """Mark the session closed without saving anything new."""
+        self._append([{"op": "close"}])
+
+    def _append(self, records):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(_dumps(record) + "\n" for record in records))
+        self.records_since_compact += len(records)
+
+
+def _load_snapshot(session_id, directory, snapshots):
+    try:
+        chat_data = snapshots.load_snapshot(session_id)
+        if chat_data is not None:
+            return chat_data
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read snapshot for {session_id}: {e}")
+    legacy_path = os.path.join(directory, f"{session_id}{SNAPSHOT_SUFFIX}")
+    if os.path.exists(legacy_path):
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read snapshot {legacy_path}: {e}")
+    return None
+
+
+def replay(session_id, directory=None, snapshots=None):
+    """Rebuild a session from its latest snapshot plus journal.
+
+    Returns (chat_data, closed) where chat_data has the same keys as a saved
+    chat, or (None, False) if the session has neither.
+    """
+    directory = directory or config.PATHS["auto_save_dir"]
+    snapshots = snapshots or SnapshotStore(directory)
+    journal_path = os.path.join(directory, f"{session_id}{JOURNAL_SUFFIX}")
+    chat_data = _load_snapshot(session_id, directory, snapshots)
+    if chat_data is None:
+        if not os.path.exists(journal_path):
+            return None, False
+        chat_data = {"conversation_history": []}
+
+    history = chat_data.setdefault("conversation_history", [])
+    closed = False
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write.
+                    break
+                op = record.get("op")
+                closed = op == "close"
+                if op == "base":
+                    if record.get("compaction") != chat_data.get("compaction"):
+                        # Stale journal left over from before the snapshot.
+                        break
+                elif op == "append":
+                    history.append(record["message"])
+                elif op == "truncate":
+                    del history[record["length"]:]
+                elif op == "meta":
+                    for key in ("model", "template", "system_prompt"):
+                        if key in record:
+                            chat_data[key] = record[key]
+    return chat_data, closed
+
+
+def recover_sessions(directory=None):
+    """Return chat data for every session that was not closed cleanly."""
+    directory = directory or config.PATHS["auto_save_dir"]
+    if not os.path.isdir(directory):
+        return []
+
+    snapshots = SnapshotStore(directory)
+    recovered = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(JOURNAL_SUFFIX):
+            continue
+        session_id = name[:-len(JOURNAL_SUFFIX)]
+        chat_data, closed = replay(session_id, directory, snapshots)
+        if chat_data is None or closed or not chat_data["conversation_history"]:
+            continue
+        chat_data["session_id"] = session_id
+        recovered.append(chat_data)
+    return recovered
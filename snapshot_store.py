@@ -0,0 +1,181 @@
+"""
+Content-addressed snapshot storage for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Auto-save snapshots used to be full copies of the conversation, so every
+compaction of a long session rewrote every earlier message.  Snapshots are
+now small manifests that list message hashes; each message is stored once
+as a zlib-compressed blob named by the SHA-256 of its canonical JSON, and
+blobs are shared between snapshots and sessions.
+
+Layout inside the auto-save directory:
+
+    objects/ab/cdef...          compressed message blob
+    manifests/<session_id>/<timestamp>-<compaction>.json
+
+A manifest holds the snapshot's meta fields (model, template, system
+prompt, compaction id, ...) and "messages": [hash, ...].  apply_retention()
+prunes old manifests per session (keep the newest N plus one per day for
+the last D days) and gc() deletes blobs no manifest references.  All
+methods are meant to run on the persistence writer thread.
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+
+import config
+from persistence import write_json_atomic
+
+OBJECTS_DIR = "objects"
+MANIFESTS_DIR = "manifests"
+
+
+def _canonical(message) -> bytes:
+    return json.dumps(message, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def message_hash(message) -> str:
+    return hashlib.sha256(_canonical(message)).hexdigest()
+
+
+class SnapshotStore:
+    def __init__(self, directory=None):
+        self.directory = directory or config.PATHS["auto_save_dir"]
+        self.objects_dir = os.path.join(self.directory, OBJECTS_DIR)
+        self.manifests_dir = os.path.join(self.directory, MANIFESTS_DIR)
+
+    # Writing
+    def put_message(self, message) -> str:
+        """Store message once and return its hash."""
+        data = _canonical(message)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data, 6))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return digest
+
+    def write_snapshot(self, session_id, snapshot) -> str:
+        """Store snapshot (the Save Chat layout) as a manifest; returns its path."""
+        manifest = {key: value for key, value in snapshot.items() if key != "conversation_history"}
+        manifest["session_id"] = session_id
+        manifest["messages"] = [self.put_message(message) for message in snapshot.get("conversation_history", [])]
+        session_dir = os.path.join(self.manifests_dir, session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S_%f')}-{manifest.get('compaction', 'snapshot')}.json"
+        path = os.path.join(session_dir, name)
+        write_json_atomic(path, manifest)
+        return path
+
+    # Reading
+    def manifests(self, session_id):
+        """Manifest paths for session_id, oldest first."""
+        session_dir = os.path.join(self.manifests_dir, session_id)
+        if not os.path.isdir(session_dir):
+            return []
+        return [os.path.join(session_dir, name) for name in sorted(os.listdir(session_dir)) if name.endswith(".json")]
+
+    def sessions(self):
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        return sorted(name for name in os.listdir(self.manifests_dir)
+                      if os.path.isdir(os.path.join(self.manifests_dir, name)))
+
+    def load_snapshot(self, session_id, manifest_path=None):
+        """Rebuild a snapshot (latest by default); None if the session has none."""
+        if manifest_path is None:
+            paths = self.manifests(session_id)
+            if not paths:
+                return None
+            manifest_path = paths[-1]
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        hashes = manifest.pop("messages", [])
+        manifest["conversation_history"] = [self.get_message(digest) for digest in hashes]
+        return manifest
+
+    def get_message(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+    # Pruning
+    def apply_retention(self, session_id, keep_last=None, keep_daily=None):
+        """Delete manifests outside the retention policy; returns how many went."""
+        if keep_last is None:
+            keep_last = config.ADVANCED.get("snapshot_keep_last", 5)
+        if keep_daily is None:
+            keep_daily = config.ADVANCED.get("snapshot_keep_daily", 7)
+        paths = self.manifests(session_id)
+        keep = set(paths[-max(keep_last, 1):])
+        # Newest manifest of each of the last keep_daily days (names start with the date).
+        days = {}
+        for path in paths:
+            days[os.path.basename(path)[:8]] = path
+        for day in sorted(days)[-keep_daily:] if keep_daily > 0 else []:
+            keep.add(days[day])
+        removed = 0
+        for path in paths:
+            if path not in keep:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def delete_session(self, session_id):
+        for path in self.manifests(session_id):
+            os.remove(path)
+        session_dir = os.path.join(self.manifests_dir, session_id)
+        if os.path.isdir(session_dir):
+            os.rmdir(session_dir)
+
+    def gc(self):
+        """Delete blobs no manifest references; returns (blobs removed, bytes freed)."""
+        live = set()
+        for session_id in self.sessions():
+            for path in self.manifests(session_id):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        live.update(json.load(f).get("messages", []))
+                except (OSError, json.JSONDecodeError) as e:
+                    # Never sweep on a partial view of what is referenced.
+                    print(f"Warning: Snapshot GC skipped, could not read {path}: {e}")
+                    return 0, 0
+        removed = freed = 0
+        for digest, path in self._objects():
+            if digest not in live:
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        return removed, freed
+
+    def stats(self) -> dict:
+        blobs = blob_bytes = manifests = manifest_bytes = 0
+        for _, path in self._objects():
+            blobs += 1
+            blob_bytes += os.path.getsize(path)
+        sessions = self.sessions()
+        for session_id in sessions:
+            for path in self.manifests(session_id):
+                manifests += 1
+                manifest_bytes += os.path.getsize(path)
+        return {"sessions": len(sessions), "manifests": manifests, "blobs": blobs,
+                "blob_bytes": blob_bytes, "manifest_bytes": manifest_bytes}
+
+    def _objects(self):
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if not name.endswith(".tmp"):
+                    yield prefix + name, os.path.join(prefix_dir, name)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
@@ -90,6 +90,1497 @@ def test_configuration():
         print(f"  ❌ Configuration test failed: {e}")
         return False
 
+def test_ui_scheduler():
+    """Test that UI bookkeeping requests are coalesced and debounced."""
+    print("\n🧪 Testing UI scheduler...")
+    
+    try:
+        from App1 import UIScheduler, estimate_tokens
+        
+        class FakeWidget:
+            def __init__(self):
+                self.jobs = {}
+                self.next_id = 0
+            def after(self, delay, func, *args):
+                self.next_id += 1
+                self.jobs[self.next_id] = (func, args)
+                return self.next_id
+            def after_idle(self, func, *args):
+                return self.after(0, func, *args)
+            def after_cancel(self, job):
+                self.jobs.pop(job, None)
+            def run_pending(self):
+                jobs, self.jobs = self.jobs, {}
+                for func, args in jobs.values():
+                    func(*args)
+        
+        widget = FakeWidget()
+        scheduler = UIScheduler(widget)
+        calls = []
+        for _ in range(100):
+            scheduler.coalesce("scroll", lambda: calls.append("scroll"))
+            scheduler.debounce("count", 150, lambda: calls.append("count"))
+        widget.run_pending()
+        
+        if calls.count("scroll") != 1 or calls.count("count") != 1:
+            print(f"  ❌ Expected one call per key, got {calls}")
+            return False
+        print("  ✅ 100 requests per key coalesced into one update")
+        
+        if estimate_tokens("") != 0 or estimate_tokens("a" * 400) != 100:
+            print("  ❌ Token estimate is off")
+            return False
+        print("  ✅ Token estimate works")
+        
+        # A same-length edit (typing over a selection) still recounts words.
+        import types
+        import App1
+        
+        class FakeInput:
+            text = "one two"
+            def count(self, start, end, unit):
+                return (len(self.text),)
+            def get(self, start, end):
+                return self.text
+        
+        class FakeLabel:
+            text = ""
+            def config(self, text):
+                self.text = text
+        
+        gui = types.SimpleNamespace(user_input=FakeInput(), char_count_label=FakeLabel(), _last_input_char_count=0)
+        App1.PerplexityGUI._update_char_count(gui)
+        gui.user_input.text = "one_two"
+        App1.PerplexityGUI._update_char_count(gui)
+        if gui.char_count_label.text != "7 chars, 1 words, ~2 tokens":
+            print(f"  ❌ Same-length edit left the counts stale: {gui.char_count_label.text}")
+            return False
+        print("  ✅ Same-length edits update the word count")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ UI scheduler test failed: {e}")
+        return False
+
+def test_request_scheduler():
+    """Test the bounded request pool and per-session prompt queue."""
+    print("\n🧪 Testing request scheduler...")
+    
+    try:
+        from request_scheduler import RequestScheduler
+        
+        scheduler = RequestScheduler(max_workers=2)
+        future = scheduler.submit("s1", {"value": 21}, lambda spec: spec["value"] * 2)
+        if future.result(timeout=5) != 42 or not scheduler.is_busy("s1"):
+            print("  ❌ Submitted request did not run or session not marked busy")
+            return False
+        print("  ✅ Request ran on the worker pool")
+        
+        scheduler.enqueue("s1", "follow-up 1")
+        scheduler.enqueue("s1", "follow-up 2")
+        if scheduler.queue_depth("s1") != 2:
+            print("  ❌ Queue depth should be 2")
+            return False
+        
+        item, enqueued_at = scheduler.finish("s1")
+        scheduler.submit("s1", {}, lambda spec: None, enqueued_at=enqueued_at).result(timeout=5)
+        metrics = scheduler.metrics()
+        if item != "follow-up 1" or metrics["queue_depth"] != 1 or metrics["completed"] != 1:
+            print(f"  ❌ Unexpected queue state: {item}, {metrics}")
+            return False
+        print("  ✅ Queued prompts dispatch in order with metrics")
+        
+        scheduler.finish("s1")
+        scheduler.finish("s1")
+        if scheduler.is_busy("s1"):
+            print("  ❌ Session should be idle after draining the queue")
+            return False
+        scheduler.shutdown(wait=True)
+        print("  ✅ Session idle after queue drained")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Request scheduler test failed: {e}")
+        return False
+
+def test_snapshot_store():
+    """Test deduplicated snapshot storage, retention and garbage collection."""
+    print("\n🧪 Testing snapshot store...")
+    
+    try:
+        import tempfile
+        from snapshot_store import SnapshotStore
+        
+        history = [{"role": "user", "content": f"Question {i} " + "x" * 500} for i in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            store = SnapshotStore(directory)
+            # Ten growing snapshots of one session plus a forked second session.
+            for length in range(11, 21):
+                store.write_snapshot("s1", {"model": "sonar", "conversation_history": history[:length]})
+            store.write_snapshot("s2", {"model": "sonar", "conversation_history": history[:5] + [{"role": "user", "content": "Fork"}]})
+            
+            stats = store.stats()
+            if stats["blobs"] != 21:
+                print(f"  ❌ Expected 21 unique blobs, found {stats['blobs']}")
+                return False
+            if store.load_snapshot("s1")["conversation_history"] != history:
+                print("  ❌ Latest snapshot did not round-trip")
+                return False
+            print("  ✅ Snapshots share blobs and store each message once")
+            
+            store.apply_retention("s1", keep_last=2, keep_daily=0)
+            store.delete_session("s2")
+            removed, _ = store.gc()
+            if len(store.manifests("s1")) != 2 or removed != 1:
+                print(f"  ❌ Retention/GC kept {len(store.manifests('s1'))} manifests, removed {removed} blobs")
+                return False
+            if store.load_snapshot("s1")["conversation_history"] != history:
+                print("  ❌ GC removed a blob that is still referenced")
+                return False
+            print("  ✅ Retention prunes manifests and GC only frees unreferenced blobs")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Snapshot store test failed: {e}")
+        return False
+
+def test_session_journal():
+    """Test the append-only auto-save journal and crash recovery."""
+    print("\n🧪 Testing session journal...")
+    
+    try:
+        import tempfile
+        from session_journal import SessionJournal, recover_sessions
+        
+        meta = {"model": "sonar", "template": "General Assistant", "system_prompt": "Be brief."}
+        with tempfile.TemporaryDirectory() as directory:
+            journal = SessionJournal("s1", directory)
+            history = [{"role": "user", "content": "Hi"}]
+            journal.sync(history, meta)
+            history.append({"role": "assistant", "content": "Hello!"})
+            journal.sync(history, meta)
+            
+            # Regenerate: the answer is popped and replaced.
+            history.pop()
+            history.append({"role": "assistant", "content": "Hey there!"})
+            journal.sync(history, meta)
+            
+            with open(journal.journal_path, encoding="utf-8") as f:
+                appended = [line for line in f if '"op":"append"' in line]
+            if len(appended) != 2:
+                print(f"  ❌ Expected only new turns in the journal, found {len(appended)} appends")
+                return False
+            print("  ✅ Auto-save appends only new turns")
+            
+            recovered = recover_sessions(directory)
+            if len(recovered) != 1 or recovered[0]["conversation_history"] != history:
+                print(f"  ❌ Recovery did not replay the journal: {recovered}")
+                return False
+            print("  ✅ Unclosed session recovered by replaying the journal")
+            
+            journal.close(history, meta)
+            if recover_sessions(directory):
+                print("  ❌ Closed session should not be recovered")
+                return False
+            print("  ✅ Closed session compacted into a snapshot and not recovered")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Session journal test failed: {e}")
+        return False
+
+def test_persistence_writer():
+    """Test coalescing and flushing in the background persistence writer."""
+    print("\n🧪 Testing persistence writer...")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        import threading
+        from persistence import PersistenceWriter, write_json_atomic
+        
+        writer = PersistenceWriter(delay_ms=200)
+        written = []
+        main_thread = threading.current_thread()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "settings.json")
+            for value in range(5):
+                def job(value=value):
+                    written.append((value, threading.current_thread() is main_thread))
+                    write_json_atomic(path, {"value": value})
+                writer.submit("settings", job)
+            
+            if not writer.flush(timeout=5):
+                print("  ❌ Flush timed out")
+                return False
+            if [value for value, _ in written] != [4]:
+                print(f"  ❌ Expected one coalesced write of the last value, got {written}")
+                return False
+            if written[0][1]:
+                print("  ❌ Job ran on the calling thread")
+                return False
+            with open(path, encoding="utf-8") as f:
+                if json.load(f) != {"value": 4} or os.path.exists(path + ".tmp"):
+                    print("  ❌ Atomic write left the wrong content behind")
+                    return False
+            print("  ✅ Five saves coalesced into one background write")
+            
+            writer.submit("late", lambda: written.append(("late", False)))
+            writer.shutdown(timeout=5)
+            if written[-1][0] != "late":
+                print("  ❌ Shutdown did not flush pending writes")
+                return False
+            print("  ✅ Shutdown flushes pending writes")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Persistence writer test failed: {e}")
+        return False
+
+def test_chat_loader():
+    """Test the streaming saved-chat parser against json.load."""
+    print("\n🧪 Testing streaming chat loader...")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        from chat_loader import iter_chat_file
+        
+        chat_data = {
+            "conversation_history": [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i} ✓ " + "\"quoted\" " * 50}
+                                     for i in range(200)],
+            "system_prompt": "Be brief.",
+            "model": "sonar",
+            "max_tokens": 1024,
+            "session_id": "session_1",
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chat.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(chat_data, f, indent=2, ensure_ascii=False)
+            
+            # A tiny chunk size forces values to straddle chunk boundaries.
+            messages, fields, progress = [], {}, []
+            for kind, key, value in iter_chat_file(path, chunk_size=16, progress_every=4096):
+                if kind == "message":
+                    messages.append(value)
+                elif kind == "field":
+                    fields[key] = value
+                else:
+                    progress.append(value)
+            
+            if messages != chat_data["conversation_history"] or fields.get("max_tokens") != 1024 or fields.get("session_id") != "session_1":
+                print("  ❌ Streamed messages or fields differ from json.load")
+                return False
+            print("  ✅ Messages streamed out of conversation_history match json.load")
+            
+            if len(progress) < 2 or progress[-1][0] != progress[-1][1]:
+                print(f"  ❌ Unexpected progress events: {progress}")
+                return False
+            print("  ✅ Progress reported while reading")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Chat loader test failed: {e}")
+        return False
+
+def test_session_archive():
+    """Test the compressed session archive and its JSON converters."""
+    print("\n🧪 Testing session archive...")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        from session_archive import SessionArchive, archive_to_json, json_to_archive, read_header
+        
+        chat_data = {
+            "conversation_history": [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Turn {i}: " + "lorem ipsum " * 40}
+                                     for i in range(300)],
+            "system_prompt": "Be brief.",
+            "model": "sonar",
+            "template": "General Assistant",
+            "session_id": "session_1",
+            "saved_at": "2024-01-01T00:00:00",
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, "chat.json")
+            archive_path = os.path.join(directory, "chat.pplxa")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(chat_data, f, indent=2)
+            
+            json_to_archive(json_path, archive_path)
+            header = read_header(archive_path)
+            if header["message_count"] != 300 or header["session_id"] != "session_1":
+                print(f"  ❌ Unexpected header: {header}")
+                return False
+            if os.path.getsize(archive_path) >= os.path.getsize(json_path) // 4:
+                print("  ❌ Archive is not meaningfully smaller than the JSON")
+                return False
+            print("  ✅ Archive header readable and archive much smaller than JSON")
+            
+            with SessionArchive(archive_path) as archive:
+                if archive.message(150) != chat_data["conversation_history"][150] or archive.tail(2) != chat_data["conversation_history"][-2:]:
+                    print("  ❌ Random access returned the wrong messages")
+                    return False
+            print("  ✅ Random access to message N and the tail")
+            
+            round_trip = os.path.join(directory, "round_trip.json")
+            archive_to_json(archive_path, round_trip)
+            with open(json_path, encoding="utf-8") as a, open(round_trip, encoding="utf-8") as b:
+                if a.read() != b.read():
+                    print("  ❌ Converting back did not reproduce the Save Chat JSON")
+                    return False
+            print("  ✅ Converting back reproduces the Save Chat JSON exactly")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Session archive test failed: {e}")
+        return False
+
+def test_conversation_store():
+    """Test the SQLite conversation store and full-text search."""
+    print("\n🧪 Testing conversation store...")
+    
+    try:
+        import os
+        import tempfile
+        from conversation_store import ConversationStore
+        
+        chat_data = {
+            "session_id": "s1",
+            "model": "sonar",
+            "template": "Code Helper",
+            "system_prompt": "Be brief.",
+            "conversation_history": [
+                {"role": "user", "content": "How do I reverse a list in Python?"},
+                {"role": "assistant", "content": "Use slicing: items[::-1]"},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            store = ConversationStore(os.path.join(directory, "conversations.db"))
+            store.import_session(chat_data)
+            
+            hits = store.search("revers")
+            if not hits or hits[0]["session_id"] != "s1" or hits[0]["seq"] != 0:
+                print(f"  ❌ Prefix search did not find the message: {hits}")
+                return False
+            print("  ✅ Full-text search finds messages across sessions")
+            
+            # Regenerate: the answer is replaced from seq 1 onwards.
+            store.replace_messages("s1", 1, [{"role": "assistant", "content": "Call reversed(items)",
+                                              "citations": ["https://docs.python.org/3/library/functions.html"]}],
+                                   usage={1: {"total_tokens": 12, "latency_ms": 840}})
+            if store.search("slicing"):
+                print("  ❌ Replaced message is still in the search index")
+                return False
+            loaded = store.load_session("s1")
+            if loaded["conversation_history"][1]["content"] != "Call reversed(items)" or loaded["title"] is None \
+                    or not loaded["conversation_history"][1].get("citations") or len(loaded["conversation_history"][0]) != 2:
+                print(f"  ❌ Loaded session does not match: {loaded}")
+                return False
+            print("  ✅ Replaced turns are re-indexed and sessions load back")
+            
+            # The change log only fills once an index follows it.
+            if store.message_changes() != (0, set()):
+                print("  ❌ Changes logged with no index to read them")
+                return False
+            store.track_message_changes()
+            store.delete_session("s1")
+            if len(store.message_changes()[1]) != 2:
+                print(f"  ❌ Deleted messages not logged: {store.message_changes()}")
+                return False
+            print("  ✅ Message changes are logged only once tracked")
+            store.close()
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Conversation store test failed: {e}")
+        return False
+
+def test_exporters():
+    """Test streaming exporters and the parallel bulk export."""
+    print("\n🧪 Testing exporters...")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        from conversation_store import ConversationStore
+        from exporters import export_all
+        
+        history = [{"role": "user", "content": "<script>alert('x')</script> & more"},
+                   {"role": "assistant", "content": "Line one\nLine two"}]
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "conversations.db")
+            store = ConversationStore(db_path)
+            for i in range(3):
+                store.import_session({"session_id": f"session_{i}", "model": "sonar", "conversation_history": history})
+            store.close()
+            
+            progress = []
+            out_dir = os.path.join(directory, "export")
+            results = export_all(db_path, out_dir, "html", workers=2,
+                                 progress=lambda done, total, session_id, error: progress.append((done, total, error)))
+            if len(results) != 3 or progress[-1] != (3, 3, None):
+                print(f"  ❌ Bulk export incomplete: {results} {progress}")
+                return False
+            with open(os.path.join(out_dir, "session_0.html"), encoding="utf-8") as f:
+                page = f.read()
+            if "<script>" in page or "&lt;script&gt;" not in page:
+                print("  ❌ HTML export does not escape message content")
+                return False
+            print("  ✅ Every stored session exported in parallel with escaped HTML")
+            
+            export_all(db_path, out_dir, "jsonl", workers=1, session_ids=["session_1"])
+            with open(os.path.join(out_dir, "session_1.jsonl"), encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            if records[0]["type"] != "meta" or [r["content"] for r in records[1:]] != [m["content"] for m in history]:
+                print(f"  ❌ Unexpected JSONL export: {records}")
+                return False
+            print("  ✅ JSONL export has a meta record and one line per message")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Exporters test failed: {e}")
+        return False
+
+def test_import_auto_saves():
+    """Test parallel, resumable import of legacy auto-save files."""
+    print("\n🧪 Testing auto-save import...")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        from conversation_store import ConversationStore
+        from import_auto_saves import import_auto_saves
+        
+        with tempfile.TemporaryDirectory() as directory:
+            auto_saves = os.path.join(directory, "auto_saves")
+            os.makedirs(auto_saves)
+            for session in range(3):
+                session_id = f"session_20240101_00000{session}"
+                for turns in range(1, 5):
+                    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"{session_id} turn {i}"} for i in range(turns * 2)]
+                    path = os.path.join(auto_saves, f"auto_save_{session_id}_20240101_00000{turns}.json")
+                    with open(path, "w", encoding="utf-8") as f:
+                        json.dump({"conversation_history": history, "model": "sonar", "session_id": session_id}, f, indent=2)
+            db_path = os.path.join(directory, "conversations.db")
+            
+            stats = import_auto_saves(auto_saves, db_path, workers=2)
+            store = ConversationStore(db_path)
+            lengths = sorted(len(store.load_session(row["id"])["conversation_history"]) for row in store.list_sessions())
+            store.close()
+            if stats["files_done"] != 12 or lengths != [8, 8, 8]:
+                print(f"  ❌ Expected 3 sessions of 8 messages from 12 files, got {lengths} from {stats['files_done']}")
+                return False
+            print(f"  ✅ 12 overlapping snapshots deduplicated to 3 sessions ({stats['files_per_sec']:.0f} files/sec)")
+            
+            stats = import_auto_saves(auto_saves, db_path, workers=2)
+            if stats["files_done"] != 0 or stats["files_skipped"] != 12:
+                print(f"  ❌ Re-run should skip imported files: {stats}")
+                return False
+            print("  ✅ Re-running skips files that were already imported")
+            
+            # Unrelated conversations the app auto-saved under the same id.
+            for stamp, question in (("20240102_090000", "How tall is Everest?"), ("20240102_093000", "Best sourdough flour?")):
+                with open(os.path.join(auto_saves, f"auto_save_default_{stamp}.json"), "w", encoding="utf-8") as f:
+                    json.dump({"conversation_history": [{"role": "user", "content": question},
+                                                        {"role": "assistant", "content": "An answer."}]}, f)
+            stats = import_auto_saves(auto_saves, db_path, workers=1)
+            store = ConversationStore(db_path)
+            imported = {session_id: store.load_session(session_id) for session_id in ("default", "default-2")}
+            store.close()
+            if stats["sessions_written"] != 2 or None in imported.values() \
+                    or imported["default-2"]["conversation_history"][0]["content"] != "Best sourdough flour?" \
+                    or imported["default-2"]["title"] != "Best sourdough flour? (2024-01-02 09:30:00)":
+                print(f"  ❌ Conversations sharing an id were not kept apart: {imported}")
+                return False
+            print("  ✅ Conversations saved under one id are imported separately")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Auto-save import test failed: {e}")
+        return False
+
+def test_chat_engine():
+    """Test the headless chat engine with a fake API client."""
+    print("\n🧪 Testing ChatEngine...")
+    
+    try:
+        import subprocess
+        from chat_engine import ChatEngine, ChatEngineError, parse_parameters
+        
+        class FakeClient:
+            def __init__(self):
+                self.calls = []
+            
+            def chat_completion(self, model, messages, stream=False, **params):
+                self.calls.append((model, messages, stream, params))
+                if messages[-1]["content"] == "fail":
+                    raise RuntimeError("boom")
+                if messages[-1]["content"] == "cite":
+                    return iter([{"choices": [{"delta": {"content": "Cut"}}], "citations": ["https://a.example"]},
+                                 {"choices": [{"delta": {}, "finish_reason": "length"}], "citations": ["https://a.example"]},
+                                 {"choices": [], "usage": {"prompt_tokens": 9, "completion_tokens": 1, "total_tokens": 10}},
+                                 {"done": True}])
+                if not stream:
+                    return {"choices": [{"message": {"content": "plain"}}], "usage": {"total_tokens": 7}}
+                return iter([{"choices": [{"delta": {"content": "Hel"}}]},
+                             {"choices": [{"delta": {"content": "lo"}}]}, {"done": True}])
+        
+        probe = "import sys, chat_engine; print('tkinter' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, timeout=60,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.stdout.strip() != "False":
+            print(f"  ❌ chat_engine imports Tk: {result.stdout.strip() or result.stderr.strip()}")
+            return False
+        print("  ✅ chat_engine runs without Tk")
+        
+        params, invalid = parse_parameters({"max_tokens": "64", "temperature": "hot", "top_k": " "})
+        if params != {"max_tokens": 64} or invalid != ["temperature='hot'"]:
+            print(f"  ❌ Parameter parsing wrong: {params} {invalid}")
+            return False
+        print("  ✅ Parameters parsed")
+        
+        client = FakeClient()
+        engine = ChatEngine(api_client=client)
+        events = []
+        engine.subscribe(events.append)
+        session = engine.open_session("s1", "sonar", system_prompt="Be brief.")
+        chunks = []
+        answer = engine.ask(session, "Hi", on_event=lambda e: chunks.append(e.get("stream_chunk")))
+        if answer != "Hello" or chunks[:2] != ["Hel", "lo"]:
+            print(f"  ❌ Streamed answer wrong: {answer!r} {chunks}")
+            return False
+        if client.calls[0][1][0] != {"role": "system", "content": "Be brief."} or session.turn_usage[1]["model"] != "sonar" \
+                or session.last_sent != ("sonar", ""):
+            print("  ❌ Request or usage bookkeeping wrong")
+            return False
+        answer = engine.ask(session, "Again", settings=session.settings(stream=False))
+        if answer != "plain" or session.turn_usage[3]["total_tokens"] != 7 or len(session.conversation_history) != 4:
+            print("  ❌ Non-streamed answer not recorded")
+            return False
+        print("  ✅ ask() records answers and usage")
+        
+        try:
+            engine.ask(session, "fail")
+            print("  ❌ Failed request should raise")
+            return False
+        except ChatEngineError:
+            pass
+        if len(session.conversation_history) != 4 or events:
+            print("  ❌ Failed prompt left in history or events leaked to subscribers")
+            return False
+        print("  ✅ Failed request raises and rolls back the prompt")
+        
+        engine.ask(session, "cite")
+        answer = session.conversation_history[-1]
+        if answer.get("citations") != ["https://a.example"] or answer.get("finish_reason") != "length" \
+                or session.turn_usage[5].get("total_tokens") != 10:
+            print(f"  ❌ Stream metadata not kept: {answer} {session.turn_usage.get(5)}")
+            return False
+        engine.ask(session, "Next")
+        if any(set(m) != {"role", "content"} for m in client.calls[-1][1]):
+            print("  ❌ Citations were sent back to the API")
+            return False
+        session.pop_message()
+        session.pop_message()
+        print("  ✅ Streamed usage, citations and finish_reason are kept on the answer")
+        
+        session.append_message({"role": "user", "content": "Queued"})
+        engine.submit(session).result(timeout=10)
+        done = [e for e in events if "stream_done" in e]
+        if len(done) != 1 or done[0]["full_content"] != "Hello" or done[0]["session_id"] != "s1":
+            print(f"  ❌ submit() events wrong: {events}")
+            return False
+        engine.scheduler.shutdown()
+        print("  ✅ submit() reports events to subscribers")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ ChatEngine test failed: {e}")
+        return False
+
+def test_session_tabs():
+    """Test per-tab stream routing and prompt queues without a window."""
+    print("\n🧪 Testing session tabs...")
+    
+    try:
+        import functools
+        import types
+        import tempfile
+        from App1 import ChatSession, PerplexityGUI
+        from chat_engine import ChatEngine
+        from conversation_store import ConversationStore
+        from persistence import PersistenceWriter
+        from session_journal import SessionJournal
+        
+        engine = ChatEngine(session_factory=ChatSession, source="gui")
+        shown, written = engine.open_session("shown", "sonar"), engine.open_session("hidden", "sonar")
+        notes = []
+        gui = types.SimpleNamespace(
+            engine=engine, request_scheduler=engine.scheduler, conversation_sessions=engine.sessions,
+            active_session=shown, _schedule_scroll_position=lambda: None,
+            _append_to_message=lambda message_id, text, tag, session: written.append_message(
+                {"role": "assistant", "content": f"{message_id}:{text}"}),
+            _add_message_to_display=lambda sender, text, tag, session: notes.append((session.session_id, text)),
+            _update_tab_title=lambda session: None, _update_send_button=lambda: None,
+            _refresh_model_health=lambda: None)
+        gui._flush_stream_backlog = functools.partial(PerplexityGUI._flush_stream_backlog, gui)
+        written.streaming_message_id = 7
+        
+        for chunk in ("Hel", "lo"):
+            PerplexityGUI._append_stream_chunk_to_display(gui, written, chunk, False)
+        if written.stream_backlog != {7: ["Hel", "lo"]} or shown.stream_backlog or written.conversation_history:
+            print(f"  ❌ Chunks for a hidden tab not held in its backlog: {written.stream_backlog}")
+            return False
+        gui._flush_stream_backlog(written)
+        if written.stream_backlog or [m["content"] for m in written.conversation_history] != ["7:Hello"]:
+            print(f"  ❌ Backlog not written in one insert: {written.conversation_history}")
+            return False
+        print("  ✅ Hidden tabs collect streamed text and write it in one go")
+        
+        # A failed answer drops the follow-ups typed against it.
+        engine.scheduler.submit("shown", {}, lambda spec: None).result(timeout=5)
+        engine.scheduler.enqueue("shown", {"prompt": "and then?"})
+        PerplexityGUI._on_request_finished(gui, shown, failed=True)
+        if engine.scheduler.queue_depth("shown") or engine.scheduler.is_busy("shown") \
+                or notes != [("shown", "1 queued message(s) were not sent.")]:
+            print(f"  ❌ Queued prompt survived a failed answer: {notes}")
+            return False
+        
+        # Closing a busy tab cancels its queue; the late answer finds no tab.
+        engine.scheduler.submit("hidden", {}, lambda spec: None).result(timeout=5)
+        engine.scheduler.enqueue("hidden", {"prompt": "one more"})
+        engine.close_session("hidden")
+        if "hidden" in gui.conversation_sessions or engine.scheduler.queue_depth("hidden") \
+                or engine.scheduler.finish("hidden") is not None or engine.scheduler.is_busy("hidden"):
+            print("  ❌ Closed tab kept its queued prompts")
+            return False
+        print("  ✅ Failed answers and closed tabs cancel queued prompts")
+        engine.scheduler.shutdown(wait=True)
+        
+        # Closing a tab right after an answer still stores that answer.
+        with tempfile.TemporaryDirectory() as directory:
+            store = ConversationStore(os.path.join(directory, "conversations.db"))
+            writer = PersistenceWriter(delay_ms=60000)
+            saving = types.SimpleNamespace(
+                auto_save_var=types.SimpleNamespace(get=lambda: True), persistence=writer,
+                conversation_store=store, active_session=None)
+            for name in ("_save_job", "_store_session", "_session_meta"):
+                setattr(saving, name, functools.partial(getattr(PerplexityGUI, name), saving))
+            session = ChatSession("closing", "sonar", "", "")
+            session.journal = SessionJournal("closing", os.path.join(directory, "auto_saves"))
+            session.append_message({"role": "user", "content": "Is the last turn kept?"})
+            session.append_message({"role": "assistant", "content": "Yes."})
+            PerplexityGUI._auto_save_conversation(saving, session)
+            PerplexityGUI._close_session_journal(saving, session)
+            writer.flush()
+            stored = store.load_session("closing")
+            if not stored or [m["content"] for m in stored["conversation_history"]] != ["Is the last turn kept?", "Yes."]:
+                print(f"  ❌ Close dropped the pending save from the store: {stored}")
+                return False
+            print("  ✅ Closing a tab stores the save it replaces")
+            
+            # Renaming a tab makes its pending save, then moves the stored rows.
+            saving.conversation_sessions = {"closing": session}
+            saving._unique_session_id = lambda base: base
+            saving._update_tab_title = lambda session: None
+            session.append_message({"role": "user", "content": "And after a rename?"})
+            PerplexityGUI._auto_save_conversation(saving, session)
+            PerplexityGUI._rename_session(saving, session, "renamed")
+            writer.shutdown()
+            stored = store.load_session("renamed")
+            left_behind = store.load_session("closing")
+            store.close()
+            if left_behind or not stored or len(stored["conversation_history"]) != 3 \
+                    or list(saving.conversation_sessions) != ["renamed"]:
+                print(f"  ❌ Rename lost the pending save or left the old id stored: {stored}, {left_behind}")
+                return False
+        print("  ✅ Renaming a tab moves its stored conversation")
+        return True
+    except Exception as e:
+        print(f"  ❌ Session tabs test failed: {e}")
+        return False
+
+def test_model_health():
+    """Test the per-model circuit breaker, fallbacks and fail-fast requests."""
+    print("\n🧪 Testing model health...")
+    
+    try:
+        from chat_engine import ChatEngine
+        from model_health import ModelHealth, ModelUnavailableError
+        from perplexity_api import PerplexityAPI
+        
+        now = [1000.0]
+        health = ModelHealth(window=60, failures=3, error_rate=0.5, min_requests=4, cooldown=10,
+                             max_cooldown=40, clock=lambda: now[0])
+        fallbacks = {"sonar-pro": "sonar"}
+        for _ in range(3):
+            health.record("sonar-pro", False)
+        if health.state("sonar-pro") != "open" or health.route("sonar-pro", fallbacks) != "sonar":
+            print("  ❌ Breaker did not open after failures in a row")
+            return False
+        try:
+            health.route("sonar-pro", {})
+            print("  ❌ Open breaker without a fallback did not fail fast")
+            return False
+        except ModelUnavailableError:
+            pass
+        print("  ✅ Opens after failures and routes to the fallback")
+        
+        now[0] += 11
+        if not health.allows("sonar-pro") or health.allows("sonar-pro") or health.route("sonar-pro", fallbacks) != "sonar":
+            print("  ❌ Half-open breaker let more than one probe through at a time")
+            return False
+        health.record("sonar-pro", False)  # a failed probe doubles the pause
+        now[0] += 11
+        if health.state("sonar-pro") != "open":
+            print("  ❌ Failed probe did not reopen the breaker")
+            return False
+        now[0] += 10
+        health.allows("sonar-pro")
+        health.release("sonar-pro")  # the probe ended without an outcome, e.g. a 400
+        if not health.allows("sonar-pro"):
+            print("  ❌ Released probe still blocks the next one")
+            return False
+        health.record("sonar-pro", True, 1.5)
+        status = health.status("sonar-pro")
+        if status["state"] != "closed" or status["errors"] or status["latency"] != 1.5:
+            print(f"  ❌ Successful probe did not close the breaker: {status}")
+            return False
+        print("  ✅ Half-open lets one probe through at a time; it reopens on failure and closes on success")
+        
+        for ok in (True, False, True, False):
+            health.record("sonar", ok, 0.5)
+        if health.state("sonar") != "open":
+            print("  ❌ Breaker ignored a 50% error rate")
+            return False
+        print("  ✅ Opens on a sustained error rate")
+        
+        # Connection refused: three quick failures, then fail fast without a request.
+        api = PerplexityAPI("test-key", base_url="http://127.0.0.1:9")
+        for _ in range(3):
+            try:
+                api.chat_completion("sonar-pro", [{"role": "user", "content": "hi"}], timeout=2)
+            except ModelUnavailableError:
+                print("  ❌ Failed fast too early")
+                return False
+            except Exception:
+                pass
+        sent = api.request_count
+        try:
+            api.chat_completion("sonar-pro", [{"role": "user", "content": "hi"}], timeout=2)
+            print("  ❌ Request sent to an open breaker")
+            return False
+        except ModelUnavailableError:
+            pass
+        if api.request_count != sent or api.route("sonar-pro") != "sonar":
+            print("  ❌ Fail-fast still counted a request, or no fallback")
+            return False
+        print("  ✅ PerplexityAPI fails fast once a model keeps failing")
+        
+        class FakeClient:
+            def __init__(self):
+                self.health = ModelHealth(failures=1)
+                self.health.record("sonar-pro", False)
+            
+            def route(self, model):
+                return self.health.route(model, {"sonar-pro": "sonar"})
+            
+            def chat_completion(self, model, messages, stream=False, **params):
+                return {"choices": [{"message": {"content": f"{model} answered"}}]}
+        
+        engine = ChatEngine(api_client=FakeClient())
+        session = engine.open_session("s", "sonar-pro")
+        events = []
+        answer = engine.ask(session, "hi", session.settings(stream=False), on_event=events.append)
+        if answer != "sonar answered" or events[-1].get("rerouted_from") != "sonar-pro" or events[-1]["model"] != "sonar":
+            print(f"  ❌ Reroute not reported: {events[-1]}")
+            return False
+        print("  ✅ Chat engine reports answers from a fallback")
+        return True
+    except Exception as e:
+        print(f"  ❌ Model health test failed: {e}")
+        return False
+
+def test_model_router():
+    """Test automatic model routing by prompt kind and observed speed."""
+    print("\n🧪 Testing model router...")
+    
+    try:
+        import os
+        import tempfile
+        from chat_engine import ChatEngine
+        from model_health import ModelHealth
+        from model_router import ModelRouter, classify
+        
+        if classify("capital of france?")[0] != "quick" or classify("Prove that there are infinitely many primes")[0] != "reasoning":
+            print("  ❌ Prompts classified wrongly")
+            return False
+        print("  ✅ Classifies quick and reasoning prompts")
+        
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, "routing.jsonl")
+            router = ModelRouter(log_path=log_path)
+            general = [{"role": "user", "content": "Explain how TCP congestion control works on a busy home "
+                                                   "network with several people streaming video"}]
+            if router.choose(general)[0] != "sonar":
+                print(f"  ❌ General prompt not sent to the fast model: {router.choose(general)}")
+                return False
+            for _ in range(10):
+                router.observe("sonar", 20.0, 30.0, 100)
+            if router.choose(general)[0] != "sonar-pro":
+                print(f"  ❌ Slow model still chosen: {router.speed('sonar')}")
+                return False
+            health = ModelHealth(failures=1)
+            health.record("sonar-pro", False)
+            if router.choose(general, health)[0] == "sonar-pro":
+                print("  ❌ Paused model chosen")
+                return False
+            if ModelRouter(log_path=log_path).speed("sonar")[0] < 10:
+                print("  ❌ Observed speeds not replayed from the log")
+                return False
+            print("  ✅ Picks the fastest healthy model and remembers speeds")
+            
+            class FakeClient:
+                def chat_completion(self, model, messages, stream=False, **params):
+                    return iter([{"choices": [{"delta": {"content": f"{model} answered"}}]}])
+            
+            engine = ChatEngine(api_client=FakeClient(), router=router)
+            session = engine.open_session("s", "auto")
+            events = []
+            answer = engine.ask(session, "Prove that 2 + 2 = 4", session.settings(stream=True), on_event=events.append)
+            if answer != "sonar-reasoning answered" or not events[-1].get("auto_reason") or events[-1].get("ttft_ms") is None:
+                print(f"  ❌ Auto model not routed: {events[-1]}")
+                return False
+            if router.speeds.get("sonar-reasoning", {}).get("answers") != 1:
+                print("  ❌ Answer speed not passed to the router")
+                return False
+        print("  ✅ Chat engine routes the auto model and reports its speed")
+        return True
+    except Exception as e:
+        print(f"  ❌ Model router test failed: {e}")
+        return False
+
+def test_request_timeouts():
+    """Test the stream watchdog, first byte timeout and request deadlines against a stalling server."""
+    print("\n🧪 Testing request timeouts...")
+    
+    try:
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from chat_engine import ChatEngine
+        from perplexity_api import PerplexityAPI, RequestTimeoutError
+        from request_scheduler import RequestScheduler
+        
+        class StallingHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                if "silent" not in self.path:
+                    data = b'data: {"choices": [{"delta": {"content": "Half an answer"}}]}\n\n'
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                time.sleep(5)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StallingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            api = PerplexityAPI("test-key", base_url=f"http://127.0.0.1:{server.server_address[1]}")
+            api.idle_timeout = 0.5
+            engine = ChatEngine(api_client=api, scheduler=RequestScheduler(max_workers=1))
+            session = engine.open_session("s", "sonar")
+            session.append_message({"role": "user", "content": "hi"})
+            events = []
+            started = time.monotonic()
+            spec = engine.build_request(session, session.settings(stream=True))
+            engine.scheduler.submit("s", spec, lambda spec: engine.run(spec, events.append)).result(timeout=10)
+            elapsed = time.monotonic() - started
+            final = events[-1]
+            if final.get("timeout") != "idle" or final.get("partial_content") != "Half an answer" or elapsed > 4:
+                print(f"  ❌ Stalled stream not cut off with its partial answer ({elapsed:.1f}s): {final}")
+                return False
+            print(f"  ✅ Stalled stream cut off after {elapsed:.1f}s with its partial answer")
+            
+            api.base_url += "/silent"
+            chunks = list(api.chat_completion("sonar", [{"role": "user", "content": "hi"}], stream=True, timeout=0.5))
+            if chunks[-1].get("timeout") != "first_byte":
+                print(f"  ❌ Silent stream not cut off: {chunks}")
+                return False
+            chunks = list(api.chat_completion("sonar", [{"role": "user", "content": "hi"}], stream=True,
+                                              deadline=time.monotonic() + 0.5))
+            if chunks[-1].get("timeout") != "deadline":
+                print(f"  ❌ Deadline not enforced on a stream: {chunks}")
+                return False
+            try:
+                api.chat_completion("sonar", [{"role": "user", "content": "hi"}], deadline=time.monotonic() - 1)
+                print("  ❌ Request sent past its deadline")
+                return False
+            except RequestTimeoutError as e:
+                if e.kind != "deadline":
+                    raise
+            print("  ✅ First byte timeout and deadlines enforced")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        spec = {}
+        RequestScheduler(max_workers=1, request_deadline=30).submit("s", spec, lambda spec: None).result()
+        if not 0 < spec.get("deadline", 0) - time.monotonic() <= 30:
+            print(f"  ❌ Scheduler did not set a deadline: {spec}")
+            return False
+        print("  ✅ Scheduler gives each request a deadline")
+        return True
+    except Exception as e:
+        print(f"  ❌ Request timeouts test failed: {e}")
+        return False
+
+def test_proxy_server():
+    """Test the local API proxy against a fake upstream client."""
+    print("\n🧪 Testing proxy server...")
+    
+    try:
+        import json
+        import urllib.error
+        import urllib.request
+        from proxy_server import ProxyServer
+        
+        class FakeClient:
+            def __init__(self):
+                self.calls = 0
+            
+            def chat_completion(self, model, messages, stream=False, **params):
+                self.calls += 1
+                if not stream:
+                    return {"choices": [{"message": {"role": "assistant", "content": "hi"}}], "usage": {"total_tokens": 5}}
+                return iter([{"choices": [{"delta": {"content": "h"}}]},
+                             {"choices": [{"delta": {"content": "i"}}], "usage": {"total_tokens": 3}}, {"done": True}])
+        
+        def post(body, headers=None):
+            request = urllib.request.Request(proxy.url + "/chat/completions", data=json.dumps(body).encode("utf-8"),
+                                             headers=dict({"Content-Type": "application/json", "X-Client": "test"}, **(headers or {})))
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.headers.get("X-Cache"), response.read().decode("utf-8")
+        
+        client = FakeClient()
+        proxy = ProxyServer(client, port=0, rate=0, cache_ttl=60).start()
+        try:
+            body = {"model": "sonar", "messages": [{"role": "user", "content": "hello"}], "max_tokens": 10}
+            first, second = post(body), post(body)
+            if first[0] != "MISS" or second[0] != "HIT" or json.loads(second[1])["choices"][0]["message"]["content"] != "hi" or client.calls != 1:
+                print(f"  ❌ Non-streamed caching wrong: {first} {second} calls={client.calls}")
+                return False
+            post(body, {"Cache-Control": "no-cache"})
+            if client.calls != 2:
+                print("  ❌ Cache-Control: no-cache did not bypass the cache")
+                return False
+            print("  ✅ Non-streamed requests proxied and cached")
+            
+            cache, text = post(dict(body, stream=True))
+            events = [line[len("data: "):] for line in text.split("\n") if line.startswith("data: ")]
+            if cache != "MISS" or events[-1] != "[DONE]" or [json.loads(e)["choices"][0]["delta"]["content"] for e in events[:-1]] != ["h", "i"]:
+                print(f"  ❌ Streamed response wrong: {text!r}")
+                return False
+            if post(dict(body, stream=True))[0] != "HIT":
+                print("  ❌ Streamed response not replayed from cache")
+                return False
+            print("  ✅ Streaming relayed as server-sent events")
+            
+            try:
+                post({"messages": []})
+                print("  ❌ Invalid body should be rejected")
+                return False
+            except urllib.error.HTTPError as e:
+                if e.code != 400:
+                    print(f"  ❌ Invalid body returned {e.code}")
+                    return False
+            with urllib.request.urlopen(proxy.url + "/usage", timeout=10) as response:
+                usage = json.loads(response.read())
+            if usage["clients"]["test"]["requests"] != 5 or usage["models"]["sonar"]["total_tokens"] != 13 or usage["cache_hits"] != 2:
+                print(f"  ❌ Usage tally wrong: {usage}")
+                return False
+            print("  ✅ Bad requests rejected and usage tallied")
+        finally:
+            proxy.shutdown()
+        
+        limited = ProxyServer(FakeClient(), port=0, rate=1, burst=1, cache_ttl=0)
+        limited.queue_timeout = 0
+        try:
+            limited.start()
+            proxy = limited
+            post(body)
+            try:
+                post(body)
+                print("  ❌ Second request inside the burst should be rate limited")
+                return False
+            except urllib.error.HTTPError as e:
+                if e.code != 429:
+                    print(f"  ❌ Rate limit returned {e.code}")
+                    return False
+            print("  ✅ Rate limit returns 429 once the queue timeout is exceeded")
+        finally:
+            limited.shutdown()
+        
+        import threading
+        
+        class StallingClient(FakeClient):
+            def __init__(self):
+                super().__init__()
+                self.streaming, self.release = threading.Event(), threading.Event()
+            
+            def chat_completion(self, model, messages, stream=False, **params):
+                if not stream:
+                    return super().chat_completion(model, messages, stream, **params)
+                def chunks():
+                    yield {"choices": [{"delta": {"content": "h"}}]}
+                    self.streaming.set()
+                    self.release.wait(10)
+                    yield {"done": True}
+                return chunks()
+        
+        stalling = StallingClient()
+        busy = ProxyServer(stalling, port=0, rate=0, cache_ttl=0, max_concurrent=1)
+        busy.queue_timeout = 0.2
+        holder = threading.Thread(target=lambda: post(dict(body, stream=True)), daemon=True)
+        try:
+            busy.start()
+            proxy = busy
+            holder.start()
+            stalling.streaming.wait(10)
+            try:
+                post(body)
+                print("  ❌ Request waited for a held upstream connection instead of a 429")
+                return False
+            except urllib.error.HTTPError as e:
+                if e.code != 429:
+                    print(f"  ❌ Busy upstream returned {e.code}")
+                    return False
+            stalling.release.set()
+            holder.join(10)
+            if post(body)[0] != "MISS":
+                print("  ❌ Upstream connection not released after the stream ended")
+                return False
+            print("  ✅ Waits for a busy upstream connection give up with a 429")
+        finally:
+            stalling.release.set()
+            busy.shutdown()
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Proxy server test failed: {e}")
+        return False
+
+def test_repl():
+    """Test the terminal client with a fake API client."""
+    print("\n🧪 Testing terminal REPL...")
+    
+    try:
+        import io
+        import json
+        import tempfile
+        import config
+        from chat_engine import ChatEngine
+        from repl import Repl
+        
+        class FakeClient:
+            def chat_completion(self, model, messages, stream=False, **params):
+                if not stream:
+                    return {"choices": [{"message": {"content": f"{model} says hi"}}]}
+                return iter([{"choices": [{"delta": {"content": "Hel"}}]}, {"choices": [{"delta": {"content": "lo"}}]}, {"done": True}])
+        
+        out = io.StringIO()
+        engine = ChatEngine(api_client=FakeClient())
+        repl = Repl(engine, out=out)
+        for line in ["Hi there", "/model sonar-pro", "/template code helper", "/stream off", "Again"]:
+            repl.handle(line)
+        text = out.getvalue()
+        if "Hello\n" not in text or "sonar-pro says hi\n" not in text:
+            print(f"  ❌ Answers not written: {text!r}")
+            return False
+        if repl.session.system_prompt != config.CONVERSATION_TEMPLATES["Code Helper"] or len(repl.session.conversation_history) != 4:
+            print("  ❌ Template or history wrong")
+            return False
+        print("  ✅ Prompts answered, streamed output written as it arrives")
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chat.json")
+            repl.handle(f"/save {path}")
+            with open(path, "r", encoding="utf-8") as f:
+                chat_data = json.load(f)
+            if set(chat_data) != {"conversation_history", "system_prompt", "model", "template", "session_id", "saved_at"}:
+                print(f"  ❌ Saved layout differs from Save Chat: {sorted(chat_data)}")
+                return False
+            repl.handle("/new")
+            repl.handle(f"/load {path}")
+            if len(repl.session.conversation_history) != 4 or repl.session.model != "sonar-pro" or repl.session.template != "Code Helper":
+                print("  ❌ /load did not restore the chat")
+                return False
+        print("  ✅ /save and /load use the GUI's chat layout")
+        
+        if repl.handle("/quit") is not False:
+            print("  ❌ /quit should end the session")
+            return False
+        engine.scheduler.shutdown()
+        return True
+    except Exception as e:
+        print(f"  ❌ REPL test failed: {e}")
+        return False
+
+def test_conversation_stats():
+    """Test that conversation statistics stay in step with the history."""
+    print("\n🧪 Testing conversation statistics...")
+    
+    try:
+        import time
+        from chat_engine import Conversation
+        from conversation_stats import estimate_tokens
+        
+        def recount(history):
+            words = sum(len((m.get("content") or "").split()) for m in history)
+            tokens = sum(estimate_tokens(m.get("content") or "") for m in history)
+            return len(history), words, tokens
+        
+        def check(session, label):
+            stats = session.stats
+            if (stats.messages, stats.words, stats.estimated_tokens) != recount(session.conversation_history):
+                print(f"  ❌ Totals out of step after {label}")
+                return False
+            return True
+        
+        session = Conversation("s", "sonar")
+        session.append_message({"role": "user", "content": "one two three"})
+        session.append_message({"role": "assistant", "content": "four five"})
+        session.record_usage({"model": "sonar", "latency_ms": 400}, {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})
+        if not check(session, "append") or session.stats.role("user")["words"] != 3 or session.stats.usage["total_tokens"] != 15:
+            return False
+        
+        # Regenerate: pop the answer, then record a new one.
+        session.pop_message()
+        if not check(session, "pop") or session.stats.usage["total_tokens"] != 0 or session.stats.answered_turns != 0:
+            print("  ❌ Usage not removed with its answer")
+            return False
+        session.append_message({"role": "assistant", "content": "six seven eight"})
+        session.record_usage({"model": "sonar", "latency_ms": 200}, {"total_tokens": 9})
+        if not check(session, "regenerate") or session.stats.usage["total_tokens"] != 9 or session.stats.last_latency_ms != 200:
+            return False
+        print("  ✅ Append, pop and regenerate keep totals and usage in step")
+        
+        session.extend_messages([{"role": "user", "content": "a b"}, {"role": "assistant", "content": None}])
+        if not check(session, "extend"):
+            return False
+        session.conversation_history = [{"role": "user", "content": "replaced history"}]
+        if not check(session, "assignment") or session.stats.answered_turns != 0:
+            return False
+        session.clear()
+        if session.stats.messages or session.stats.by_role or not check(session, "clear"):
+            return False
+        print("  ✅ Extend, assignment and clear recount correctly")
+        
+        big = Conversation("big", "sonar")
+        big.extend_messages({"role": "user" if i % 2 else "assistant", "content": "word " * 50} for i in range(100000))
+        start = time.perf_counter()
+        for _ in range(1000):
+            big.append_message({"role": "user", "content": "another message"})
+            big.pop_message()
+        per_op_us = (time.perf_counter() - start) / 2000 * 1e6
+        if not check(big, "large history") or per_op_us > 100:
+            print(f"  ❌ Updates too slow on a large history: {per_op_us:.1f} µs")
+            return False
+        print(f"  ✅ Updates on a 100,000-message history take {per_op_us:.1f} µs")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Conversation stats test failed: {e}")
+        return False
+
+def test_usage_ledger():
+    """Test the usage ledger's rollups, pricing, engine recording and CSV export."""
+    print("\n🧪 Testing usage ledger...")
+    
+    try:
+        import csv
+        import tempfile
+        import time
+        from datetime import datetime
+        from chat_engine import ChatEngine
+        from usage_ledger import UsageLedger
+        
+        prices = {"sonar": {"input": 1.0, "output": 2.0, "request": 0.01}, "default": {"input": 0, "output": 0}}
+        with tempfile.TemporaryDirectory() as directory:
+            ledger = UsageLedger(os.path.join(directory, "usage.db"), prices=prices)
+            oct1 = datetime(2026, 10, 1, 12).timestamp()
+            nov1 = datetime(2026, 11, 1, 12).timestamp()
+            ledger.record("sonar", {"prompt_tokens": 1000000, "completion_tokens": 500000}, 800, timestamp=oct1)
+            ledger.record("sonar", {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30}, 200, timestamp=oct1)
+            ledger.record("sonar-pro", {"prompt_tokens": 5, "completion_tokens": 5}, 100, timestamp=oct1)
+            ledger.record("sonar", {"prompt_tokens": 1, "completion_tokens": 1}, 100, timestamp=nov1)
+            october = ledger.month("sonar", "2026-10")
+            if october["requests"] != 2 or october["total_tokens"] != 1500030 or abs(october["cost"] - 2.02005) > 1e-9:
+                print(f"  ❌ Wrong October totals for sonar: {october}")
+                return False
+            if set(ledger.by_model("2026-10-01", "2026-10-31")) != {"sonar", "sonar-pro"} or len(ledger.rollups()) != 3:
+                print("  ❌ Rollups don't match the entries")
+                return False
+            print("  ✅ Per-model, per-day rollups answer monthly queries")
+            
+            ledger.reprice({"default": {"input": 0, "output": 0, "request": 1.0}})
+            if ledger.totals()["cost"] != 4.0 or ledger.month("sonar", "2026-10")["requests"] != 2:
+                print("  ❌ Repricing did not rebuild the rollups")
+                return False
+            print("  ✅ Repricing recomputes costs and rollups")
+            
+            class FakeClient:
+                def chat_completion(self, model, messages, stream=False, **params):
+                    if stream:
+                        return iter([{"choices": [{"delta": {"content": "streamed answer"}}]}, {"done": True}])
+                    return {"choices": [{"message": {"content": "answer"}}], "usage": {"prompt_tokens": 7, "completion_tokens": 3}}
+            
+            engine = ChatEngine(api_client=FakeClient(), ledger=ledger, source="test")
+            session = engine.open_session("s", "sonar")
+            engine.ask(session, "first question", session.settings(stream=False))
+            engine.ask(session, "second question", session.settings(stream=True))
+            today = ledger.totals(None, datetime.now().strftime("%Y-%m-%d"), datetime.now().strftime("%Y-%m-%d"))
+            if today["requests"] != 2 or today["estimated"] != 1 or today["prompt_tokens"] <= 7:
+                print(f"  ❌ Engine answers not recorded: {today}")
+                return False
+            engine.scheduler.shutdown()
+            print("  ✅ Streamed and non-streamed answers are recorded (streams with estimated tokens)")
+            
+            base = time.time()
+            ledger.record_many({"model": "sonar", "usage": {"prompt_tokens": i % 500, "completion_tokens": 50},
+                                "latency_ms": 300, "timestamp": base + i} for i in range(100000))
+            out = os.path.join(directory, "usage.csv")
+            start = time.perf_counter()
+            count = ledger.export_csv(out)
+            elapsed = time.perf_counter() - start
+            with open(out, newline="", encoding="utf-8") as f:
+                rows = sum(1 for _ in csv.reader(f)) - 1
+            ledger.close()
+            if count != rows or count != 100006:
+                print(f"  ❌ Exported {count} entries, file has {rows}")
+                return False
+            print(f"  ✅ Exported {count:,} entries to CSV in {elapsed:.2f}s")
+        return True
+    except Exception as e:
+        print(f"  ❌ Usage ledger test failed: {e}")
+        return False
+
+def test_semantic_cache():
+    """Test near-duplicate matching, persistence and compaction of the semantic cache."""
+    print("\n🧪 Testing semantic cache...")
+    
+    try:
+        import json
+        import subprocess
+        import tempfile
+        from semantic_cache import SemanticCache
+        from vectorizer import HashingVectorizer, cosine
+        
+        # Vectors are stored on disk, so hashing must not change between runs.
+        probe = "from vectorizer import HashingVectorizer; print(sorted(HashingVectorizer().transform('stable hashing')))"
+        runs = {subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, timeout=60,
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout for _ in range(2)}
+        vectorizer = HashingVectorizer()
+        if len(runs) != 1 or runs.pop().strip() != str(sorted(vectorizer.transform("stable hashing"))):
+            print("  ❌ Vectors differ between processes")
+            return False
+        same = cosine(vectorizer.transform("How do I reverse a list in Python?"), vectorizer.transform("how to reverse a python list"))
+        other = cosine(vectorizer.transform("How do I reverse a list in Python?"), vectorizer.transform("How do I sort a list in Python?"))
+        if not same > 0.85 > other:
+            print(f"  ❌ Rewording scored {same:.2f}, a different question {other:.2f}")
+            return False
+        print(f"  ✅ Reworded question scores {same:.2f}, a different one {other:.2f}")
+        
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SemanticCache(directory, threshold=0.85)
+            cache.load()
+            cache.add("How do I reverse a list in Python?", "sonar", "Code Helper", "Use items[::-1]", ["https://docs.python.org"])
+            hit = cache.lookup("how to reverse a python list", "sonar", "Code Helper")
+            if hit is None or hit["answer"] != "Use items[::-1]" or hit["citations"] != ["https://docs.python.org"]:
+                print(f"  ❌ Near-duplicate not answered: {hit}")
+                return False
+            if cache.lookup("how to reverse a python list", "sonar-pro", "Code Helper") \
+                    or cache.lookup("how to reverse a python list", "sonar", "General Assistant") \
+                    or cache.lookup("How do I sort a list in Python?", "sonar", "Code Helper"):
+                print("  ❌ Answer offered for another model, template or question")
+                return False
+            print("  ✅ Offered only for the same model and template")
+            
+            # The GUI files answers under the conversation's chosen model, so
+            # "auto" conversations hit even though the router picked sonar.
+            import types
+            import config
+            from App1 import PerplexityGUI
+            from chat_engine import Conversation
+            
+            class Var:
+                def __init__(self, value):
+                    self.value = value
+                
+                def get(self):
+                    return self.value
+            
+            gui_cache = SemanticCache(os.path.join(directory, "gui"), threshold=0.85)
+            gui_cache.load()
+            gui = types.SimpleNamespace(
+                semantic_cache=gui_cache, semantic_cache_var=Var(True), auto_save_var=Var(False),
+                model_var=Var(config.AUTO_MODEL), template_var=Var("Code Helper"),
+                persistence=types.SimpleNamespace(submit=lambda key, job, delay=True: job()),
+                _add_message_to_display=lambda *args, **kwargs: None, _append_sources=lambda *args: None,
+                _append_history=lambda message, display_id, session: session.append_message(message))
+            asked = gui.active_session = Conversation("asked", config.AUTO_MODEL, "Code Helper")
+            asked.append_message({"role": "user", "content": "What does a Python context manager do?"})
+            asked.last_sent = (config.AUTO_MODEL, "Code Helper")
+            # The dropdowns change while the answer streams in.
+            gui.model_var, gui.template_var = Var("sonar"), Var("General Assistant")
+            answer = {"role": "assistant", "content": "It runs setup and cleanup around a block.", "model": "sonar"}
+            asked.append_message(answer)
+            PerplexityGUI._remember_answer(gui, asked, answer)
+            gui.model_var, gui.template_var = Var(config.AUTO_MODEL), Var("Code Helper")
+            again = gui.active_session = Conversation("again", config.AUTO_MODEL, "Code Helper")
+            again.append_message({"role": "user", "content": "what does a python context manager do"})
+            if not PerplexityGUI._answer_from_semantic_cache(gui, again, "what does a python context manager do") \
+                    or again.conversation_history[-1]["content"] != answer["content"]:
+                print("  ❌ Answer to an auto conversation not offered to the next one")
+                return False
+            print("  ✅ Round trip through the GUI with the auto model")
+            
+            # A crash after the vector was written but before its entry line.
+            with open(cache.entries_path, "a", encoding="utf-8") as f:
+                f.write('{"prompt": "torn')
+            cache.matrix.append([cache.vectorizer.to_bytes(cache.vectorizer.transform("spare vector"))])
+            reopened = SemanticCache(directory, threshold=0.85)
+            if reopened.load() != 1 or reopened.matrix.rows != 1 or not reopened.lookup("reverse a list in python", "sonar", "Code Helper"):
+                print("  ❌ Torn write not recovered on load")
+                return False
+            print("  ✅ Reloads from disk and drops a torn write")
+            
+            for i in range(30):
+                reopened.add(f"question number {i} about topic {i * 7}", "sonar", "", f"answer {i}")
+            with open(reopened.entries_path, "r", encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            lines[0]["created_at"] = "2000-01-01T00:00:00"
+            with open(reopened.entries_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(line) + "\n" for line in lines)
+            compacted = SemanticCache(directory, threshold=0.85, max_entries=10)
+            if compacted.load() != 10 or compacted.matrix.rows != 10 \
+                    or compacted.lookup("question number 29 about topic 203", "sonar", "")["answer"] != "answer 29":
+                print("  ❌ Compaction did not keep the newest entries")
+                return False
+            print("  ✅ Compacts to the newest entries")
+        return True
+    except Exception as e:
+        print(f"  ❌ Semantic cache test failed: {e}")
+        return False
+
+def test_semantic_index():
+    """Test incremental indexing and search by meaning over stored messages."""
+    print("\n🧪 Testing semantic index...")
+    
+    try:
+        import tempfile
+        from conversation_store import ConversationStore
+        from semantic_index import SemanticIndex
+        from vectorizer import numpy
+        
+        with tempfile.TemporaryDirectory() as directory:
+            store = ConversationStore(os.path.join(directory, "conversations.db"))
+            if numpy is None:
+                try:
+                    SemanticIndex(store, os.path.join(directory, "index"))
+                except ValueError as e:
+                    print(f"  ✅ Reported as unavailable without numpy: {e}")
+                    store.close()
+                    return True
+                print("  ❌ Index opened without numpy")
+                return False
+            for session_id, question, answer in (
+                    ("sqlite", "How can I speed up many small inserts into SQLite?",
+                     "Wrap the inserts in one transaction and use executemany."),
+                    ("bread", "Recommend a recipe for banana bread", "Mash ripe bananas, mix with flour and bake."),
+                    ("python", "How do I reverse a list in Python?", "Use items.reverse() or items[::-1].")):
+                store.import_session({"session_id": session_id, "model": "sonar", "conversation_history": [
+                    {"role": "user", "content": question}, {"role": "assistant", "content": answer}]})
+            index = SemanticIndex(store, os.path.join(directory, "index"))
+            if index.update() != 6:
+                print("  ❌ Not every message was indexed")
+                return False
+            best = index.search("batch sqlite writes faster", 3)
+            if not best or best[0]["session_id"] != "sqlite" or not 0 < best[0]["score"] <= 1:
+                print(f"  ❌ Wrong best match: {best[:1]}")
+                return False
+            print(f"  ✅ Found by meaning (score {best[0]['score']:.2f})")
+            
+            # Regenerating the newest answer reuses its message id.
+            store.replace_messages("python", 1, [{"role": "assistant", "content": "Iterate backwards with reversed()."}])
+            store.delete_session("bread")
+            if index.update() != 1 or len(index) != 4:
+                print(f"  ❌ Edits and deletions not applied ({len(index)} messages indexed)")
+                return False
+            if any(row["session_id"] == "bread" for row in index.search("banana recipe", 10)) \
+                    or index.search("iterate backwards", 1)[0]["snippet"] != "Iterate backwards with reversed().":
+                print("  ❌ Search returned a deleted or outdated message")
+                return False
+            print("  ✅ Follows edits and deletions")
+            
+            reopened = SemanticIndex(store, os.path.join(directory, "index"), ivf_rows=2, nprobe=1)
+            if reopened.load() != 4 or reopened.update() != 0 or reopened.ivf is None:
+                print("  ❌ Index not reloaded from disk or not clustered")
+                return False
+            clustered = reopened.search("sqlite inserts", 1)
+            if not clustered or clustered[0]["session_id"] != "sqlite":
+                print(f"  ❌ Clustered search missed: {clustered}")
+                return False
+            print("  ✅ Reloads from disk and searches clusters")
+            store.close()
+        return True
+    except Exception as e:
+        print(f"  ❌ Semantic index test failed: {e}")
+        return False
+
+def test_lazy_imports():
+    """Test that slow dependencies are not imported at startup."""
+    print("\n🧪 Testing lazy imports...")
+    
+    try:
+        import subprocess
+        probe = "import sys, App1; print(sorted(m for m in ('requests', 'multiprocessing') if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, timeout=60,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0 or result.stdout.strip() != "[]":
+            print(f"  ❌ Imported at startup: {result.stdout.strip() or result.stderr.strip()}")
+            return False
+        print("  ✅ requests and multiprocessing are not imported with App1")
+        
+        from App1 import PerplexityAPI
+        api = PerplexityAPI("test-key-123")
+        if api._http is not None:
+            print("  ❌ HTTP session created before the first request")
+            return False
+        if api.http is not api.http:
+            print("  ❌ HTTP session not reused")
+            return False
+        print("  ✅ HTTP session created on first use and reused")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ Lazy import test failed: {e}")
+        return False
+
 def test_gui_creation():
     """Test GUI creation without showing it."""
     print("\n🧪 Testing GUI creation...")
@@ -126,6 +1617,28 @@ def main():
         ("Import Test", test_imports),
         ("API Class Test", test_api_class),
         ("Configuration Test", test_configuration),
+        ("UI Scheduler Test", test_ui_scheduler),
+        ("Request Scheduler Test", test_request_scheduler),
+        ("Persistence Writer Test", test_persistence_writer),
+        ("Snapshot Store Test", test_snapshot_store),
+        ("Session Journal Test", test_session_journal),
+        ("Conversation Store Test", test_conversation_store),
+        ("Chat Loader Test", test_chat_loader),
+        ("Session Archive Test", test_session_archive),
+        ("Exporters Test", test_exporters),
+        ("Auto-save Import Test", test_import_auto_saves),
+        ("Chat Engine Test", test_chat_engine),
+        ("Session Tabs Test", test_session_tabs),
+        ("Conversation Stats Test", test_conversation_stats),
+        ("Usage Ledger Test", test_usage_ledger),
+        ("Semantic Cache Test", test_semantic_cache),
+        ("Semantic Index Test", test_semantic_index),
+        ("Model Health Test", test_model_health),
+        ("Model Router Test", test_model_router),
+        ("Request Timeouts Test", test_request_timeouts),
+        ("Proxy Server Test", test_proxy_server),
+        ("REPL Test", test_repl),
+        ("Lazy Imports Test", test_lazy_imports),
         ("GUI Creation Test", test_gui_creation)
     ]
     
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Usage and cost ledger for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Every completion (GUI, terminal client or local proxy) is appended to a
+small SQLite database with its model, token usage, latency, timestamp and
+cost.  A trigger folds each new row into a per-day, per-model rollup in
+the same transaction, so "what did we spend this month on sonar-pro" sums
+at most 31 rows however long the ledger grows.
+
+Tables:
+    entries  one row per completion, in the order they finished
+    daily    totals per (day, model), kept in step by the entries_rollup trigger
+
+Cost is worked out from config.MODEL_PRICES when a row is recorded.  After
+editing the price table, reprice() recomputes every row and the rollups.
+Turns whose usage the API did not report are recorded with estimated
+token counts and flagged as such.
+
+    python usage_ledger.py [--month 2026-10] [--model sonar-pro] [--csv usage.csv] [--reprice]
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+import config
+from conversation_stats import estimate_tokens
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    source TEXT,
+    session_id TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms INTEGER,
+    estimated INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    latency_ms INTEGER NOT NULL,
+    estimated INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (day, model)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_day ON entries(day);
+CREATE TRIGGER IF NOT EXISTS entries_rollup AFTER INSERT ON entries BEGIN
+    INSERT INTO daily (day, model, requests, prompt_tokens, completion_tokens, total_tokens,
+                       latency_ms, estimated, cost)
+    VALUES (new.day, new.model, 1, new.prompt_tokens, new.completion_tokens, new.total_tokens,
+            coalesce(new.latency_ms, 0), new.estimated, new.cost)
+    ON CONFLICT (day, model) DO UPDATE SET
+        requests = requests + 1,
+        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = completion_tokens + excluded.completion_tokens,
+        total_tokens = total_tokens + excluded.total_tokens,
+        latency_ms = latency_ms + excluded.latency_ms,
+        estimated = estimated + excluded.estimated,
+        cost = cost + excluded.cost;
+END;
+"""
+
+TOTAL_FIELDS = ("requests", "prompt_tokens", "completion_tokens", "total_tokens", "latency_ms", "estimated", "cost")
+CSV_FIELDS = ("timestamp", "day", "model", "source", "session_id", "prompt_tokens", "completion_tokens",
+              "total_tokens", "latency_ms", "estimated", "cost")
+
+
+def model_price(model, prices=None):
+    """The price entry for a model, falling back to the "default" entry."""
+    prices = config.MODEL_PRICES if prices is None else prices
+    return prices.get(model) or prices.get("default") or {}
+
+
+def completion_cost(model, prompt_tokens, completion_tokens, prices=None):
+    """Cost in USD of one completion under the price table."""
+    price = model_price(model, prices)
+    return (prompt_tokens * price.get("input", 0) + completion_tokens * price.get("output", 0)) / 1_000_000 \
+        + price.get("request", 0)
+
+
+def estimate_usage(messages, completion):
+    """Usage-shaped token estimate for a turn the API reported no usage for."""
+    prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+    completion_tokens = estimate_tokens(completion)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _day(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def month_range(month=None):
+    """(first day, last day) of "YYYY-MM", or of the current month."""
+    first = datetime.strptime(month, "%Y-%m").date() if month else date.today().replace(day=1)
+    following = first.replace(year=first.year + first.month // 12, month=first.month % 12 + 1)
+    return first.isoformat(), date.fromordinal(following.toordinal() - 1).isoformat()
+
+
+class UsageLedger:
+    def __init__(self, path=None, prices=None):
+        self.path = path or config.PATHS.get("usage_ledger_file", "usage_ledger.db")
+        self.prices = prices
+        # Shared under a lock: the GUI records from request worker threads,
+        # the proxy from its handler threads.
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Writing
+    def _row(self, model, usage=None, latency_ms=None, session_id=None, source=None, timestamp=None, estimated=False):
+        usage = usage or {}
+        timestamp = time.time() if timestamp is None else timestamp
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        total_tokens = usage.get("total_tokens") or prompt_tokens + completion_tokens
+        cost = completion_cost(model, prompt_tokens, completion_tokens, self.prices)
+        return (timestamp, datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d"), model, source, session_id,
+                prompt_tokens, completion_tokens, total_tokens, latency_ms, int(bool(estimated)), cost)
+
+    def record(self, model, usage=None, latency_ms=None, session_id=None, source=None, timestamp=None, estimated=False):
+        """Append one completion; returns its cost."""
+        row = self._row(model, usage, latency_ms, session_id, source, timestamp, estimated)
+        self._insert([row])
+        return row[-1]
+
+    def record_many(self, entries):
+        """Append completions given as dicts of record() arguments, in one transaction."""
+        return self._insert([self._row(**entry) for entry in entries])
+
+    def _insert(self, rows):
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO entries (ts, day, model, source, session_id, prompt_tokens, completion_tokens,"
+                    " total_tokens, latency_ms, estimated, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def reprice(self, prices=None):
+        """Recompute every entry's cost from the price table, then rebuild the rollups."""
+        if prices is not None:
+            self.prices = prices
+        with self.lock:
+            with self.conn:
+                models = [row[0] for row in self.conn.execute("SELECT DISTINCT model FROM entries")]
+                for model in models:
+                    price = model_price(model, self.prices)
+                    self.conn.execute(
+                        "UPDATE entries SET cost = (prompt_tokens * ? + completion_tokens * ?) / 1000000.0 + ?"
+                        " WHERE model = ?",
+                        (price.get("input", 0), price.get("output", 0), price.get("request", 0), model))
+                self.conn.execute("DELETE FROM daily")
+                self.conn.execute(
+                    "INSERT INTO daily SELECT day, model, count(*), sum(prompt_tokens), sum(completion_tokens),"
+                    " sum(total_tokens), sum(coalesce(latency_ms, 0)), sum(estimated), sum(cost)"
+                    " FROM entries GROUP BY day, model")
+        return len(models)
+
+    # Reading (rollups only)
+    def _where(self, model=None, start=None, end=None):
+        clauses, args = [], []
+        for clause, value in (("model = ?", model), ("day >= ?", _day(start)), ("day <= ?", _day(end))):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    def totals(self, model=None, start=None, end=None):
+        """Summed usage and cost, optionally for one model and an inclusive day range."""
+        where, args = self._where(model, start, end)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT " + ", ".join(f"coalesce(sum({field}), 0)" for field in TOTAL_FIELDS) + " FROM daily" + where,
+                args).fetchone()
+        return dict(zip(TOTAL_FIELDS, row))
+
+    def month(self, model=None, month=None):
+        """totals() for a calendar month ("YYYY-MM", default the current one)."""
+        return self.totals(model, *month_range(month))
+
+    def by_model(self, start=None, end=None):
+        """{model: totals} over an inclusive day range, costliest first."""
+        where, args = self._where(None, start, end)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT model, " + ", ".join(f"sum({field})" for field in TOTAL_FIELDS) + " FROM daily" + where
+                + " GROUP BY model ORDER BY sum(cost) DESC", args).fetchall()
+        return {row[0]: dict(zip(TOTAL_FIELDS, tuple(row)[1:])) for row in rows}
+
+    def rollups(self, model=None, start=None, end=None):
+        """The per-day, per-model rows, oldest first."""
+        where, args = self._where(model, start, end)
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM daily" + where + " ORDER BY day, model", args).fetchall()
+        return [dict(row) for row in rows]
+
+    def export_csv(self, out, start=None, end=None, model=None):
+        """Write entries to a CSV file path or text stream; returns the row count.
+
+        Rows are streamed from a separate read connection, so an export
+        of millions of entries neither loads them into memory nor holds
+        the lock that recording needs.
+        """
+        where, args = self._where(model, start, end)
+        reader = sqlite3.connect(self.path)
+        f = open(out, "w", newline="", encoding="utf-8") if isinstance(out, str) else out
+        try:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            cursor = reader.execute(
+                "SELECT datetime(ts, 'unixepoch', 'localtime'), day, model, source, session_id, prompt_tokens,"
+                " completion_tokens, total_tokens, latency_ms, estimated, round(cost, 6) FROM entries"
+                + where + " ORDER BY id", args)
+            count = 0
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+            return count
+        finally:
+            if f is not out:
+                f.close()
+            reader.close()
+
+
+def format_totals(name, totals):
+    """One aligned report line for a totals() dict."""
+    average = totals["latency_ms"] / totals["requests"] / 1000 if totals["requests"] else 0
+    estimated = f"  ({totals['estimated']:,} estimated)" if totals["estimated"] else ""
+    return (f"{name:<24}{totals['requests']:>9,} req {totals['total_tokens']:>13,} tok "
+            f"{average:>7.2f}s ${totals['cost']:>10,.4f}{estimated}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report token usage and cost from the usage ledger.")
+    parser.add_argument("--month", help="calendar month YYYY-MM (default: this month)")
+    parser.add_argument("--model", help="only this model")
+    parser.add_argument("--csv", metavar="PATH", help="export the month's entries as CSV ('-' for stdout)")
+    parser.add_argument("--reprice", action="store_true", help="recompute costs from config.MODEL_PRICES first")
+    parser.add_argument("--db", help="ledger file (default: config PATHS['usage_ledger_file'])")
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = month_range(args.month)
+    except ValueError:
+        parser.error(f"--month must look like 2026-10, not {args.month!r}")
+    ledger = UsageLedger(args.db)
+    try:
+        if args.reprice:
+            ledger.reprice()
+        if args.csv:
+            count = ledger.export_csv(sys.stdout if args.csv == "-" else args.csv, start, end, args.model)
+            if args.csv != "-":
+                print(f"✅ Exported {count:,} entries to {args.csv}")
+            return 0
+        models = ledger.by_model(start, end)
+        if args.model:
+            models = {args.model: ledger.totals(args.model, start, end)}
+        print(f"📊 Usage {start} to {end}\n")
+        for model, totals in models.items():
+            print(format_totals(model, totals))
+        if len(models) != 1:
+            print(format_totals("total", ledger.totals(None, start, end)))
+    finally:
+        ledger.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
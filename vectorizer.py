@@ -0,0 +1,203 @@
+"""
+Text vectors for Perplexity AI GUI Client
+Enhanced Edition v2.0
+
+Similarity search without a model, a vocabulary or any training.
+
+HashingVectorizer turns text into a sparse vector of dim buckets (the
+hashing trick).  Its features are:
+- lowercased words, minus a short stopword list and with a plural "s"
+  dropped, and adjacent word pairs
+- character 4-grams of each word, so "colour"/"color" or "France's" and
+  "France" still overlap
+
+Counts are damped (1 + log tf).  Each feature gets a sign from its hash,
+so colliding features tend to cancel rather than add up.  The vector is
+L2-normalised, so a dot product is the cosine similarity.  Hashes come
+from zlib.crc32, which is stable across runs; the builtin hash() is
+salted per process and would scramble vectors stored on disk.
+
+VectorMatrix keeps one vector per row in a flat float32 file that only
+grows by appending.  With numpy installed the file is memory-mapped and
+scored with one matrix-vector product.  Without numpy, rows are loaded
+into an inverted index (bucket -> rows), so a query only touches rows
+that share a bucket with it.  Both read the same file.
+"""
+
+import math
+import os
+import re
+import zlib
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_DIM = 1024
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be because been but by can could did do does
+for from had has have how i if in into is it its just me my no not of on or our so some than
+that the their them then there these they this to up us was we were what when where which
+who why will with would you your s t d ll re ve m
+""".split())
+
+_WORD = re.compile(r"\w+")
+WORD_WEIGHT, PAIR_WEIGHT, NGRAM_WEIGHT = 1.0, 0.4, 0.35
+NGRAM = 4
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _bucket(feature, dim):
+    """(bucket, sign) of a feature."""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return (h >> 1) % dim, (1.0 if h & 1 else -1.0)
+
+
+class HashingVectorizer:
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def transform(self, text):
+        """{bucket: weight}, L2-normalised; empty for text with no usable words."""
+        words = [_stem(w) for w in _WORD.findall(text.lower()) if w not in STOPWORDS] or _WORD.findall(text.lower())
+        counts = {}
+        for word in words:
+            counts[("w", word)] = counts.get(("w", word), 0) + 1
+            padded = f"<{word}>"
+            for i in range(max(1, len(padded) - NGRAM + 1)):
+                gram = ("c", padded[i:i + NGRAM])
+                counts[gram] = counts.get(gram, 0) + 1
+        for first, second in zip(words, words[1:]):
+            counts[("p", first + " " + second)] = counts.get(("p", first + " " + second), 0) + 1
+
+        weights = {"w": WORD_WEIGHT, "p": PAIR_WEIGHT, "c": NGRAM_WEIGHT}
+        vector = {}
+        for (kind, feature), count in counts.items():
+            bucket, sign = _bucket(kind + feature, self.dim)
+            vector[bucket] = vector.get(bucket, 0.0) + sign * weights[kind] * (1.0 + math.log(count))
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if not norm:
+            return {}
+        return {bucket: value / norm for bucket, value in vector.items() if value}
+
+    def to_bytes(self, vector):
+        """The vector as one dense float32 row."""
+        row = array("f", bytes(4 * self.dim))
+        for bucket, value in vector.items():
+            row[bucket] = value
+        return row.tobytes()
+
+
+def cosine(a, b):
+    """Cosine similarity of two normalised sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(bucket, 0.0) for bucket, value in a.items())
+
+
+class VectorMatrix:
+    """Append-only float32 matrix on disk, one row per vector."""
+
+    def __init__(self, path, dim=DEFAULT_DIM):
+        self.path = path
+        self.dim = dim
+        self.row_bytes = 4 * dim
+        self.rows = 0
+        self._matrix = None  # numpy memmap of the first self.rows rows
+        self._postings = None  # without numpy: bucket -> [(row, value)]
+
+    def load(self, rows=None):
+        """Open the file, keeping only the first rows rows if given (drops a torn tail)."""
+        with open(self.path, "ab") as f:  # creates the file; positioned at its end
+            size = f.tell()
+            complete = size // self.row_bytes
+            self.rows = complete if rows is None else min(rows, complete)
+            if size != self.rows * self.row_bytes:
+                f.truncate(self.rows * self.row_bytes)
+        self._matrix = self._postings = None
+        if numpy is None:
+            self._postings = {}
+            with open(self.path, "rb") as f:
+                for row in range(self.rows):
+                    self._index_row(row, array("f", f.read(self.row_bytes)))
+        else:
+            self._remap()
+        return self.rows
+
+    def _remap(self):
+        self._matrix = (numpy.memmap(self.path, dtype=numpy.float32, mode="r", shape=(self.rows, self.dim))
+                        if self.rows else numpy.zeros((0, self.dim), dtype=numpy.float32))
+
+    def _index_row(self, row, values):
+        for bucket, value in enumerate(values):
+            if value:
+                self._postings.setdefault(bucket, []).append((row, value))
+
+    def append(self, rows_bytes):
+        """Append dense float32 rows (bytes from HashingVectorizer.to_bytes); returns the first new row."""
+        first = self.rows
+        with open(self.path, "ab") as f:
+            for data in rows_bytes:
+                f.write(data)
+                if self._postings is not None:
+                    self._index_row(self.rows, array("f", data))
+                self.rows += 1
+        if numpy is not None:
+            self._remap()
+        return first
+
+    def read_rows(self, rows):
+        """Dense float32 bytes of the given rows, in order."""
+        with open(self.path, "rb") as f:
+            for row in rows:
+                f.seek(row * self.row_bytes)
+                yield f.read(self.row_bytes)
+
+    def rewrite(self, rows_bytes):
+        """Replace the whole file with rows_bytes (atomically) and reload it."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            for data in rows_bytes:
+                f.write(data)
+        # Drop the memory map first: a mapped file can't be replaced on Windows.
+        self._matrix = self._postings = None
+        os.replace(temp_path, self.path)
+        return self.load()
+
+    @property
+    def dense(self):
+        """The rows as a (memory-mapped) numpy array; numpy only."""
+        return self._matrix
+
+    def dense_query(self, vector):
+        """A normalised sparse vector as a dense float32 numpy row."""
+        query = numpy.zeros(self.dim, dtype=numpy.float32)
+        for bucket, weight in vector.items():
+            query[bucket] = weight
+        return query
+
+    def scores(self, vector, rows=None):
+        """Cosine score of every row against a normalised sparse vector.
+
+        A numpy array of self.rows scores, or {row: score} for the rows
+        that share a bucket with the vector when numpy is missing.  With
+        numpy, rows (an array of row numbers) scores only those rows.
+        """
+        if numpy is None:
+            scores = {}
+            for bucket, weight in vector.items():
+                for row, value in self._postings.get(bucket, ()):
+                    scores[row] = scores.get(row, 0.0) + weight * value
+            return scores
+        query = self.dense_query(vector)
+        return (self._matrix if rows is None else self._matrix[rows]) @ query